@@ -1,10 +1,134 @@
+import collections
+import hashlib
 import json
+import re
+import threading
+import time
 import requests
-from database import get_user, update_user_facts
+import http_client
+from search_cache import SearchCache
+from prompt_builder import PromptBuilder
+from model_client import ModelClient, retry_after
+from key_pool import KeyPool
+from model_router import MockBackend, RouteStats, generation_config, route_for
+from database import get_user, get_user_facts, touch_user_facts, update_user_facts
+
+SEARCH_CACHE = SearchCache()
+
+def configure_search_cache(settings):
+    SEARCH_CACHE.configure(settings)
+
+def search_cache_stats():
+    return SEARCH_CACHE.stats()
+
+MODEL_CLIENT = ModelClient()
+
+def configure_model_client(settings):
+    MODEL_CLIENT.configure(settings)
+
+def model_client_stats():
+    return MODEL_CLIENT.stats()
+
+# ---------------- MODEL ROUTING ----------------
+API_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+MOCK_BACKEND = MockBackend()
+ROUTE_STATS = RouteStats()
+
+KEY_POOL = KeyPool()
+
+def model_url(model, method):
+    # The key goes in the x-goog-api-key header, so URLs (which end up in exception text) never carry it.
+    return f"{API_BASE}/{model}:{method}"
+
+def route_stats():
+    return ROUTE_STATS.stats()
+
+def configure_key_pool(settings):
+    KEY_POOL.configure(settings)
+
+def key_pool_stats():
+    return KEY_POOL.stats()
+
+def api_keys(config):
+    """[(key, rpm or None), ...] from config "gemini_api_keys" (strings or {"key", "rpm"}) plus gemini_api_key."""
+    keys = []
+    for entry in config.get("gemini_api_keys") or []:
+        key, rpm = (entry.get("key"), entry.get("rpm")) if isinstance(entry, dict) else (entry, None)
+        key = (key or "").strip('\'" \n')
+        if key and key not in dict(keys):
+            keys.append((key, rpm))
+    single = (config.get("gemini_api_key") or "").strip('\'" \n')
+    if single and single not in dict(keys):
+        keys.insert(0, (single, None))
+    return keys
+
+def _lease_target(route, method, config):
+    """Callable for MODEL_CLIENT.post: each attempt leases a key and model from the pool."""
+    KEY_POOL.set_keys(api_keys(config))
+    models = [route["model"]] + [m for m in route.get("fallbacks", []) if m != route["model"]]
+
+    def target():
+        lease = KEY_POOL.acquire(models)
+        lease.url = model_url(lease.model, method)
+        lease.headers = {"x-goog-api-key": lease.key}
+        return lease
+    return target
+
+def send_model_request(task, route, payload, config):
+    """POST a generateContent payload for task to its routed model (or the mock backend). Returns the JSON body."""
+    started = time.monotonic()
+    ok = False
+    try:
+        if config.get("model_backend") == "mock":
+            resp = MOCK_BACKEND.respond(task, route["model"], payload)
+        else:
+            resp = MODEL_CLIENT.post(_lease_target(route, "generateContent", config), payload,
+                                     {"Content-Type": "application/json"})
+        ok = True
+        return resp
+    finally:
+        ROUTE_STATS.record(task, route["model"], time.monotonic() - started, ok)
+
+def run_task(task, prompt, config, schema=None):
+    """Lean request for a utility task: just the routed template, no personality or chat context.
+
+    JSON routes return the parsed value (or None on failure); text routes
+    return the text ("" on failure).
+    """
+    route = route_for(task, config)
+    structured = bool(route.get("json") or schema)
+    payload = {
+        "contents": [{"parts": [{"text": route["template"].format(prompt=prompt).strip()}]}],
+        "generationConfig": generation_config(route, schema),
+    }
+    try:
+        text = _response_text(send_model_request(task, route, payload, config))
+        return json.loads(_strip_code_fence(text)) if structured else text
+    except Exception as e:
+        print(f"[ERROR] Gemini {task} request failed: {e}")
+        return None if structured else ""
+
+def summarize_captions(text, max_chars, config):
+    """Condense caption text (or earlier summaries) for CaptionMemory; "" on failure."""
+    prompt = (
+        f"Below is a transcript of what {config['channels'][0] if config.get('channels') else 'a Twitch streamer'} "
+        f"said on stream, or earlier summaries of it, oldest first. Summarize what happened and what was said "
+        f"in at most {max_chars} characters, keeping names, games and topics. Reply with the summary only.\n\n{text}"
+    )
+    summary = run_task("condense", prompt, config)
+    # The model overshoots length limits now and then; the context block must stay bounded.
+    return summary if len(summary) <= max_chars * 2 else _cut_at_boundary(summary[:max_chars * 2])
 
 def perform_google_search(query, api_key, engine_id):
     if not api_key or not engine_id:
         return "Search configuration missing."
+    # Identical queries (after normalization) share one cached or in-flight request.
+    def fetch():
+        results = _google_search(query, api_key, engine_id)
+        return results, not results.startswith("Search failed:")
+    return SEARCH_CACHE.get(query, fetch, scope=engine_id)
+
+def _google_search(query, api_key, engine_id):
 
     url = "https://www.googleapis.com/customsearch/v1"
     params = {
@@ -14,7 +138,7 @@ def perform_google_search(query, api_key, engine_id):
         "num": 3
     }
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -43,110 +167,404 @@ def perform_google_search(query, api_key, engine_id):
         print(f"[ERROR] Response: {e.response.text if e.response is not None else 'No response'}")
         return error_msg
     except Exception as e:
-        print(f"[ERROR] Search failed: {e}")
-        return f"Search failed: {e}"
+        print(f"[ERROR] Search failed: {http_client.redact(e)}")
+        return f"Search failed: {http_client.redact(e)}"
 
 def extract_user_facts(message, user, config):
-    prompt = f"Analyze the following message from user '{user}'. Identify if there are any permanent or semi-permanent facts about the user (e.g., location, profession, age, pets, hobbies, hardware specs, recurring problems). Ignore transient states or opinions. Return a JSON object with a key 'facts' containing a list of strings, or an empty list if no facts are found. ONLY return the JSON object, no other text. Message: {message}"
+    facts = extract_facts_batch([(user, message)], config)[0]
+    if facts:
+        update_user_facts(user, facts, source_message=message)
+        print(f"[FACTS] Updated facts for {user}: {facts}")
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={config['gemini_api_key']}"
-    headers = {"Content-Type": "application/json"}
-    data = {"contents":[{"parts":[{"text": prompt}]}]}
+def _strip_code_fence(text):
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
 
-    try:
-        r = requests.post(url, headers=headers, json=data, timeout=10)
-        r.raise_for_status()
-        resp = r.json()
-
-        text_parts = []
-        if "candidates" in resp:
-            content = resp["candidates"][0].get("content", {})
-            parts = content.get("parts", [])
-            for part in parts:
-                if "text" in part:
-                    text_parts.append(part["text"])
-
-        response_text = " ".join(text_parts).strip()
-
-        # Strip markdown code blocks if present
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-
-        response_json = json.loads(response_text.strip())
-        facts = response_json.get("facts", [])
-        if facts:
-            update_user_facts(user, facts)
-            print(f"[FACTS] Updated facts for {user}: {facts}")
-    except Exception as e:
-        # It's expected that many messages won't have facts or won't parse correctly, so just log debug
-        print(f"[DEBUG] Fact extraction failed or no facts: {e}")
+SENTIMENT_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "index": {"type": "INTEGER"},
+            "sentiment": {"type": "STRING", "enum": ["positive", "negative", "neutral"]},
+            "topics": {"type": "ARRAY", "items": {"type": "STRING"}},
+        },
+        "required": ["index", "sentiment", "topics"],
+    },
+}
 
-def generate_ai_response(prompt: str, user, config, context_monitor=None) -> str:
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={config['gemini_api_key']}"
-    headers = {
-        "Content-Type": "application/json",
-    }
+def classify_sentiment_batch(messages, config):
+    """Classify [(user, message), ...] in one request.
 
-    user_data = get_user(user)
-    favouritism_score = user_data["favouritism_score"] if user_data else 0
+    Returns a list aligned with messages holding {"sentiment", "topics"} dicts,
+    or None for any message the model skipped.
+    """
+    if not messages:
+        return []
+    lines = "\n".join(f"{i}. {text}" for i, (_, text) in enumerate(messages))
+    prompt = (
+        "For each numbered Twitch chat message below, give its sentiment (positive, negative or neutral) "
+        "and its main topics (short lowercase nouns, empty list if none). "
+        "Return a JSON array with one object per message: {\"index\", \"sentiment\", \"topics\"}.\n\n"
+        f"{lines}"
+    )
+    response = run_task("classify", prompt, config, SENTIMENT_BATCH_SCHEMA)
+    results = [None] * len(messages)
+    if not isinstance(response, list):
+        return results
+    for item in response:
+        try:
+            index = int(item["index"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(messages) and item.get("sentiment") in ("positive", "negative", "neutral"):
+            results[index] = {"sentiment": item["sentiment"], "topics": [str(t) for t in item.get("topics") or []]}
+    return results
+
+FACT_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "index": {"type": "INTEGER"},
+            "facts": {"type": "ARRAY", "items": {"type": "STRING"}},
+        },
+        "required": ["index", "facts"],
+    },
+}
+
+def extract_facts_batch(messages, config):
+    """Extract durable facts from [(user, message), ...] in one request.
 
-    # Get user facts
-    user_facts = []
-    if user_data and user_data["facts"]:
+    Returns a list of fact lists aligned with messages.
+    """
+    if not messages:
+        return []
+    lines = "\n".join(f"{i}. {user}: {text}" for i, (user, text) in enumerate(messages))
+    prompt = (
+        "For each numbered Twitch chat message below, list any permanent or semi-permanent facts the author "
+        "states about themselves (e.g., location, profession, age, pets, hobbies, hardware specs, recurring problems). "
+        "Ignore transient states, opinions and facts about other people. Write each fact as a short phrase. "
+        "Return a JSON array with one object per message that has facts: {\"index\", \"facts\"}.\n\n"
+        f"{lines}"
+    )
+    response = run_task("extract", prompt, config, FACT_BATCH_SCHEMA)
+    results = [[] for _ in messages]
+    if not isinstance(response, list):
+        return results
+    for item in response:
         try:
-            user_facts = json.loads(user_data["facts"])
-        except:
-            pass
+            index = int(item["index"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(messages):
+            results[index] = [str(fact) for fact in item.get("facts") or [] if str(fact).strip()]
+    return results
+
+# ---------------- RESPONSE CACHE ----------------
+_PUNCTUATION_RE = re.compile(r"[^\w\s@#]+")
+
+def normalize_prompt(text):
+    """Case, punctuation and spacing don't change the question being asked."""
+    return " ".join(_PUNCTUATION_RE.sub(" ", text.lower()).split())
+
+class ResponseCache:
+    """TTL + LRU cache of model replies, bounded by total UTF-8 size.
+
+    Keys combine the call site, the normalized user-visible prompt, the
+    personality and a version that invalidate() bumps, so a dashboard change
+    to the personality or traits retires every earlier answer.
+    """
 
-    facts_str = ""
-    if user_facts:
-        facts_str = f"\nKnown facts about {user}: {', '.join(user_facts)}"
+    def __init__(self, max_bytes=1_000_000):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (expires_at, text, size)
+        self.size = 0
+        self.version = 0
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def key(self, site, prompt, config):
+        personality = hashlib.sha1(config.get("personality", "").encode("utf-8")).hexdigest()[:12]
+        return (site, normalize_prompt(prompt), personality, self.version)
+
+    def get(self, key):
+        site = key[0]
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses[site] = self.misses.get(site, 0) + 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits[site] = self.hits.get(site, 0) + 1
+            return entry[1]
+
+    def put(self, key, text, ttl):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + ttl, text, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.version += 1
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            lookups = hits + sum(self.misses.values())
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "version": self.version,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+RESPONSE_CACHE = ResponseCache()
+
+def invalidate_response_cache():
+    RESPONSE_CACHE.invalidate()
+
+def configure_response_cache(settings):
+    RESPONSE_CACHE.max_bytes = settings.get("max_bytes", RESPONSE_CACHE.max_bytes)
+
+def response_cache_stats():
+    return RESPONSE_CACHE.stats()
+
+def _cache_ttl(site, config):
+    settings = config.get("response_cache", {})
+    if not settings.get("enabled", True) or site is None:
+        return 0
+    return settings.get("sites", {}).get(site, 0)
+
+PROMPT_BUILDER = PromptBuilder()
+
+def prompt_stats():
+    return PROMPT_BUILDER.stats()
+
+def _build_request(prompt, user, config, context_monitor, history, site, route, related=None):
+    prompt = route["template"].format(prompt=prompt)
+    user_data = get_user(user)
+    favouritism_score = user_data["favouritism_score"] if user_data else 0
+
+    # Only the most relevant facts go into the prompt, however many are stored
+    user_facts = get_user_facts(user, limit=config.get("max_prompt_facts", 8), query=prompt)
 
     # Get spoken context from monitor
-    spoken_context = ""
-    if context_monitor:
-         streamer_name = config["channels"][0] if config.get("channels") else "the streamer"
-         spoken_context = f"\nRecent spoken context (spoken by {streamer_name}):\n{context_monitor.get_context()}\n"
-
-    personality_prompt = f"Respond in personality: {config['personality']}. Keep your response concise (ideally under 450 characters) so it fits in Twitch chat, unless asked otherwise."
-    if "personality_traits" in config:
-        likes = ", ".join(config["personality_traits"].get("likes", []))
-        if likes:
-            personality_prompt += f"\nLikes: {likes}"
-        dislikes = ", ".join(config["personality_traits"].get("dislikes", []))
-        if dislikes:
-            personality_prompt += f"\nDislikes: {dislikes}"
-
-    prompt_with_context = f"{personality_prompt}{spoken_context}\nUser '{user}' has a favouritism score of {favouritism_score}.{facts_str}\n{prompt}"
-    data = {"contents":[{"parts":[{"text": prompt_with_context}]}]}
+    captions = context_monitor.get_context().splitlines() if context_monitor else []
+    streamer_name = config["channels"][0] if config.get("channels") else "the streamer"
+    chat_lines = [f"{m['user']}: {m['message']}" for m in history or []]
+
+    built = PROMPT_BUILDER.build(prompt, user, config, favouritism_score, facts=user_facts, captions=captions,
+                                 history=chat_lines, streamer_name=streamer_name, site=site, related=related or ())
+    # Facts are kept in order, so the first sections["facts"] are the ones the model sees.
+    touch_user_facts(user, user_facts[:built.sections["facts"]])
+    return {
+        "contents": [{"parts": [{"text": built.text}]}],
+        "generationConfig": generation_config(route, maxOutputTokens=built.max_output_tokens),
+    }
+
+def _cached_response(cache_key, cache_site, config):
+    """Returns (key, ttl, cached text or None); ttl is 0 when the site doesn't cache."""
+    # Call sites opt in with the user-visible part of the request as cache_key.
+    cache_ttl = _cache_ttl(cache_site, config) if cache_key is not None else 0
+    if not cache_ttl:
+        return None, 0, None
+    key = RESPONSE_CACHE.key(cache_site, cache_key, config)
+    return key, cache_ttl, RESPONSE_CACHE.get(key)
+
+def _response_text(resp):
+    # Parse Gemini Flash response
+    text_parts = []
+    candidates = resp.get("candidates", [])
+    if candidates:
+        content = candidates[0].get("content", {})
+        parts = content.get("parts", [])
+        for part in parts:
+            if "text" in part:
+                text_parts.append(part["text"])
+    return " ".join(text_parts).strip()
+
+def generate_ai_response(prompt: str, user, config, context_monitor=None, cache_key=None, cache_site=None,
+                         history=None, site=None, task="reply", related=None) -> str:
+    # history: recent chat as {"user", "message"} dicts, trimmed to the prompt budget.
+    # related: earlier lines retrieved for this request (see retrieval.RetrievalIndex).
+    # task picks the model route (see model_router.DEFAULT_ROUTES).
+    key, cache_ttl, cached = _cached_response(cache_key, cache_site, config)
+    if cached is not None:
+        return cached
+
+    route = route_for(task, config)
+    if route.get("lean"):
+        return run_task(task, prompt, config) or ""
+    data = _build_request(prompt, user, config, context_monitor, history, site or cache_site or "other", route,
+                          related)
 
     try:
-        r = requests.post(url, headers=headers, json=data, timeout=10)
-        r.raise_for_status()
-        resp = r.json()
-
-        # Parse Gemini Flash response
-        text_parts = []
-        candidates = resp.get("candidates", [])
-        if candidates:
-            content = candidates[0].get("content", {})
-            parts = content.get("parts", [])
-            for part in parts:
-                if "text" in part:
-                    text_parts.append(part["text"])
-        text = " ".join(text_parts).strip()
+        resp = send_model_request(task, route, data, config)
+
+        text = _response_text(resp)
         if not text:
             print("[ERROR] Gemini response empty, full JSON:", resp)
-            return "Hmm… I couldn't come up with a response!"
+            return ""
 
         # Removed hard truncation to prevent cutting off sentences.
         # The bot's message sender handles chunking long messages.
 
+        if cache_ttl:
+            RESPONSE_CACHE.put(key, text, cache_ttl)
         return text
     except Exception as e:
-        print(f"[ERROR] Gemini API call failed: {e}, full response: {r.text if 'r' in locals() else 'no response'}")
-        return "Hmm… I couldn't come up with a response!"
+        # Callers treat "" as "nothing to say" rather than posting an apology to chat.
+        print(f"[ERROR] Gemini API call failed: {e}")
+        return ""
+
+# ---------------- STREAMING ----------------
+_STREAM_LOCK = threading.Lock()
+_STREAM_STATS = {"streams": 0, "cutoffs": 0, "errors": 0, "first_delta_ms_last": 0.0, "first_delta_ms_avg": 0.0}
+
+def stream_stats():
+    with _STREAM_LOCK:
+        return dict(_STREAM_STATS)
+
+def _record_stream(first_delta, cut_off, failed):
+    with _STREAM_LOCK:
+        stats = _STREAM_STATS
+        stats["streams"] += 1
+        stats["cutoffs"] += cut_off
+        stats["errors"] += failed
+        if first_delta is not None:
+            ms = round(first_delta * 1000, 1)
+            stats["first_delta_ms_avg"] = ms if stats["streams"] == 1 else round(stats["first_delta_ms_avg"] * 0.9 + ms * 0.1, 1)
+            stats["first_delta_ms_last"] = ms
+
+def _sse_text(line):
+    """Text carried by one "data: {...}" line of a streamGenerateContent response."""
+    if not line or not line.startswith("data:"):
+        return ""
+    try:
+        event = json.loads(line[5:])
+    except ValueError:
+        return ""
+    parts = []
+    for candidate in event.get("candidates", [])[:1]:
+        for part in candidate.get("content", {}).get("parts", []):
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+def _cut_at_boundary(text):
+    """Shortens text to its last sentence end, or failing that its last space (or to nothing)."""
+    end = max(text.rfind(mark) for mark in ".!?…")
+    if end >= len(text) // 2:
+        return text[:end + 1]
+    space = text.rfind(" ")
+    return text[:space] if space > 0 else ""
+
+def stream_ai_response(prompt: str, user, config, context_monitor=None, cache_key=None, cache_site=None,
+                       history=None, site=None, task="reply", related=None):
+    """Like generate_ai_response, but yields the reply as text deltas while it is generated.
+
+    Generation is abandoned (the connection closed) once max_response_length
+    characters have been produced, with the final delta cut back to a
+    sentence or word boundary. If the stream fails before producing
+    anything, the request is retried once through MODEL_CLIENT.post (with its
+    retries and backoff); if that fails too, nothing is yielded.
+    """
+    key, cache_ttl, cached = _cached_response(cache_key, cache_site, config)
+    if cached is not None:
+        yield cached
+        return
+    if not MODEL_CLIENT.allow_stream():
+        print("[MODEL] Skipping streamed reply: model API unhealthy")
+        return
+
+    route = route_for(task, config)
+    data = _build_request(prompt, user, config, context_monitor, history, site or cache_site or "other", route,
+                          related)
+    if config.get("model_backend") == "mock":
+        text = _response_text(send_model_request(task, route, data, config))
+        if text:
+            yield text
+        return
+    max_chars = config.get("max_response_length", 450)
+
+    started = time.monotonic()
+    first_delta = None
+    produced = []
+    length = 0
+    cut_off = failed = False
+    lines = lease = response = None
+    status = 200
+    try:
+        lease = _lease_target(route, "streamGenerateContent", config)()
+        lines = http_client.stream_lines("POST", lease.url + "?alt=sse",
+                                         headers={"Content-Type": "application/json", **lease.headers}, json=data)
+        for line in lines:
+            text = _sse_text(line)
+            if not text:
+                continue
+            if first_delta is None:
+                first_delta = time.monotonic() - started
+            if length + len(text) >= max_chars:
+                text = _cut_at_boundary(text[:max_chars - length])
+                cut_off = True
+            produced.append(text)
+            length += len(text)
+            if text:
+                yield text
+            if cut_off:
+                break
+    except Exception as e:
+        failed = True
+        response = getattr(e, "response", None)
+        status = getattr(response, "status_code", None)
+        print(f"[ERROR] Gemini streaming call failed: {http_client.redact(e)}")
+    finally:
+        if lines is not None:
+            lines.close()
+        rotated = False
+        if lease is not None:
+            lease.report(status, retry_after(response) if status == 429 else None)
+            rotated = status == 429 and KEY_POOL.available(lease.models)
+        _record_stream(first_delta, cut_off, failed)
+        MODEL_CLIENT.record_stream(not failed or rotated)
+
+    if failed and not length:
+        try:
+            text = _response_text(send_model_request(task, route, data, config))
+        except Exception as e:
+            print(f"[ERROR] Gemini fallback call failed: {e}")
+            return
+        if text:
+            produced.append(text)
+            failed = False
+            yield text
+    if produced and cache_ttl and not failed:
+        RESPONSE_CACHE.put(key, "".join(produced).strip(), cache_ttl)
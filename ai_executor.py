@@ -0,0 +1,175 @@
+import threading
+import time
+import traceback
+
+from workqueue import PriorityWorkQueue
+
+PRIORITY_REPLY = 0       # direct replies: !ai, mentions, commands
+PRIORITY_EVENT = 1       # sub/raid welcomes, BRB and ad summaries
+PRIORITY_AUTO = 2        # auto-chat, conversation starters
+PRIORITY_BACKGROUND = 3  # sentiment, fact extraction
+
+PRIORITY_NAMES = {
+    PRIORITY_REPLY: "reply",
+    PRIORITY_EVENT: "event",
+    PRIORITY_AUTO: "auto",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Seconds from submission after which a result is no longer worth posting.
+DEFAULT_DEADLINES = {
+    "reply": 30,
+    "event": 60,
+    "auto": 60,
+    "background": 300,
+}
+
+# The job running on the current worker thread, so callees can see its priority and deadline.
+_CURRENT = threading.local()
+
+def current_job():
+    """(priority, deadline) of the AI job running on this thread, or (None, None) outside the executor."""
+    job = getattr(_CURRENT, "job", None)
+    return (job.priority, job.deadline) if job is not None else (None, None)
+
+class _Job:
+    __slots__ = ("priority", "fn", "args", "kwargs", "deadline", "on_result", "submitted_at", "on_expired")
+
+    def __init__(self, priority, fn, args, kwargs, deadline, on_result, submitted_at, on_expired=None):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.on_result = on_result
+        self.submitted_at = submitted_at
+        self.on_expired = on_expired
+
+class AIExecutor:
+    """Runs model calls with a global concurrency cap, priorities and deadlines.
+
+    Every call site submits here instead of starting its own thread, so a
+    burst of raid welcomes queues behind direct replies rather than
+    competing with them. A job whose deadline passes while it waits is
+    skipped, and a result that arrives after its deadline is dropped instead
+    of being handed to on_result.
+    """
+
+    def __init__(self, max_concurrency=3, max_queue=200, deadlines=None):
+        self.max_concurrency = max_concurrency
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        self.deadlines.update(deadlines or {})
+        self.queue = PriorityWorkQueue(max_depth=max_queue, workers=max_concurrency, name="ai", names=PRIORITY_NAMES)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.in_flight = 0
+        self.completed = {}
+        self.expired = {}
+        self.failed = {}
+        self.wait_last = 0.0
+        self.wait_avg = 0.0
+        self.wait_max = 0.0
+        self.started_jobs = 0
+
+    def start(self):
+        self.queue.start()
+
+    def stop(self):
+        self.queue.stop()
+
+    def _deadline(self, priority, deadline):
+        if deadline is None:
+            deadline = self.deadlines.get(PRIORITY_NAMES.get(priority), DEFAULT_DEADLINES["background"])
+        return time.monotonic() + deadline
+
+    def submit(self, priority, fn, *args, deadline=None, on_result=None, on_expired=None, **kwargs):
+        """Queue fn(*args, **kwargs). Returns False if the job was shed because the queue is full.
+
+        on_expired() is called if the job is skipped because its deadline passed before it started.
+        """
+        job = _Job(priority, fn, args, kwargs, self._deadline(priority, deadline), on_result, time.monotonic(),
+                   on_expired)
+        return self.queue.put(priority, self._run, job)
+
+    def call(self, priority, fn, *args, deadline=None, **kwargs):
+        """Run fn through the executor and wait for it. Returns None if it missed its deadline."""
+        if getattr(self.local, "in_job", False):
+            # Already on an executor worker; waiting for another worker could deadlock.
+            return fn(*args, **kwargs)
+        done = threading.Event()
+        box = []
+
+        def deliver(result):
+            box.append(result)
+            done.set()
+
+        job = _Job(priority, fn, args, kwargs, self._deadline(priority, deadline), deliver, time.monotonic())
+        if not self.queue.put(priority, self._run, job):
+            return None
+        done.wait(timeout=max(0.0, job.deadline - time.monotonic()))
+        return box[0] if box else None
+
+    def _count(self, counter, priority):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        counter[name] = counter.get(name, 0) + 1
+
+    def _run(self, job):
+        started = time.monotonic()
+        with self.lock:
+            expired = started > job.deadline
+            if expired:
+                self._count(self.expired, job.priority)
+            else:
+                wait = started - job.submitted_at
+                self.wait_last = wait
+                self.wait_avg = wait if not self.started_jobs else self.wait_avg * 0.9 + wait * 0.1
+                self.wait_max = max(self.wait_max, wait)
+                self.started_jobs += 1
+                self.in_flight += 1
+        if expired:
+            if job.on_expired is not None:
+                job.on_expired()
+            return
+        self.local.in_job = True
+        _CURRENT.job = job
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except Exception as e:
+            with self.lock:
+                self._count(self.failed, job.priority)
+            print(f"[ERROR] AI task {getattr(job.fn, '__name__', job.fn)} failed: {e}")
+            traceback.print_exc()
+            return
+        finally:
+            self.local.in_job = False
+            _CURRENT.job = None
+            with self.lock:
+                self.in_flight -= 1
+
+        with self.lock:
+            if time.monotonic() > job.deadline:
+                self._count(self.expired, job.priority)
+                print(f"[AI] Dropped late {PRIORITY_NAMES.get(job.priority)} result from {getattr(job.fn, '__name__', job.fn)}")
+                return
+            self._count(self.completed, job.priority)
+        if job.on_result is not None:
+            job.on_result(result)
+
+    def stats(self):
+        queue_stats = self.queue.stats()
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "queued": queue_stats["queued"],
+                "depth": queue_stats["depth"],
+                "completed": dict(self.completed),
+                "expired": dict(self.expired),
+                "failed": dict(self.failed),
+                "shed": queue_stats["dropped"],
+                "queue_wait_ms": {
+                    "last": round(self.wait_last * 1000, 1),
+                    "avg": round(self.wait_avg * 1000, 1),
+                    "max": round(self.wait_max * 1000, 1),
+                },
+            }
@@ -0,0 +1,98 @@
+import threading
+import time
+import traceback
+
+class MicroBatcher:
+    """Collects items and hands them to handler(batch) by size or age.
+
+    A batch is released as soon as it holds max_batch items, or once its
+    oldest item has waited max_wait seconds. The handler runs on the
+    batcher's own thread, so add() never blocks on it.
+    """
+
+    def __init__(self, handler, max_batch=25, max_wait=10.0, name="batcher"):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.items = []
+        self.oldest = None
+        self.cond = threading.Condition()
+        self.running = False
+        self.batches = 0
+        self.batched_items = 0
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def add(self, item):
+        with self.cond:
+            if not self.items:
+                self.oldest = time.monotonic()
+            self.items.append(item)
+            # Wake the worker to start the age timer, or to release a full batch.
+            if len(self.items) == 1 or len(self.items) >= self.max_batch:
+                self.cond.notify()
+
+    def flush(self, handler=None):
+        """Hand the next batch to the handler (or the one given) on the calling thread."""
+        with self.cond:
+            batch = self._take()
+        if batch:
+            self._handle(batch, handler)
+        return len(batch)
+
+    def pending(self):
+        with self.cond:
+            return len(self.items)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "pending": len(self.items),
+                "batches": self.batches,
+                "items": self.batched_items,
+                "avg_batch": round(self.batched_items / self.batches, 1) if self.batches else 0,
+            }
+
+    def _take(self):
+        batch, self.items = self.items[:self.max_batch], self.items[self.max_batch:]
+        self.oldest = time.monotonic() if self.items else None
+        if batch:
+            self.batches += 1
+            self.batched_items += len(batch)
+        return batch
+
+    def _handle(self, batch, handler=None):
+        try:
+            (handler or self.handler)(batch)
+        except Exception as e:
+            print(f"[ERROR] {self.name} batch of {len(batch)} failed: {e}")
+            traceback.print_exc()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    if len(self.items) >= self.max_batch:
+                        break
+                    if self.items:
+                        remaining = self.oldest + self.max_wait - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.cond.wait(timeout=remaining)
+                    else:
+                        self.cond.wait()
+                if not self.running:
+                    return
+                batch = self._take()
+            self._handle(batch)
@@ -0,0 +1,63 @@
+"""Chat log: append throughput, time-range reads and startup rehydration.
+
+Writes synthetic chat across a few channels into a temporary directory with
+the default segment size, then times a one-minute range read in the middle
+of the log and the per-channel tail read the bot does at startup.
+
+Run from the repo root: python benchmarks/bench_chat_log.py [messages]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_log import ChatLog
+
+CHANNELS = ["main", "second", "third"]
+WORDS = "gg pog lol the boss is so hard right now what build are you running nice clutch".split()
+
+def main(count):
+    rng = random.Random(7)
+    directory = tempfile.mkdtemp()
+    try:
+        log = ChatLog(directory=directory)
+        start = 1_700_000_000.0
+        started = time.perf_counter()
+        for i in range(count):
+            text = " ".join(rng.choices(WORDS, k=rng.randint(3, 15)))
+            log.append("chat", CHANNELS[i % len(CHANNELS)], f"viewer{rng.randrange(5000)}", text, timestamp=start + i * 0.1)
+        queued = time.perf_counter() - started
+        log.flush(timeout=None)
+        written = time.perf_counter() - started
+        stats = log.stats()
+        log.close()
+
+        reopened_at = time.perf_counter()
+        log = ChatLog(directory=directory)
+        reopen = time.perf_counter() - reopened_at
+
+        middle = start + count * 0.05
+        started = time.perf_counter()
+        entries = log.read_range(middle, middle + 60)
+        range_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        recent = log.tail(100, channels=CHANNELS)
+        tail_ms = (time.perf_counter() - started) * 1000
+        log.close()
+
+        print(f"messages: {count} in {stats['segments']} segments, {stats['bytes_on_disk'] / 2**20:.1f} MiB")
+        print(f"append: {count / queued:,.0f} messages/s queued, {count / written:,.0f} messages/s written "
+              f"({stats['fsyncs']} fsyncs)")
+        print(f"reopen: {reopen * 1000:.1f} ms")
+        print(f"range read (60 s, {len(entries)} messages): {range_ms:.2f} ms")
+        print(f"startup tail (100 per channel, {sum(map(len, recent.values()))} messages): {tail_ms:.2f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,62 @@
+"""Per-call latency of database.py: connect-per-call (rollback journal) vs the pooled WAL engine.
+
+Run from the repo root: python benchmarks/bench_database.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Connect-per-call helpers matching the pre-engine code, kept here only as the baseline.
+def legacy_connection():
+    conn = sqlite3.connect(database.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def legacy_get_user(username):
+    conn = legacy_connection()
+    user = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    conn.close()
+    return user
+
+def legacy_set_favouritism_score(username, score):
+    conn = legacy_connection()
+    conn.execute("UPDATE users SET favouritism_score = ? WHERE username = ?", (score, username))
+    conn.commit()
+    conn.close()
+
+def timed(call, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        call(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+def seed(path, journal_mode):
+    database.ENGINE.close_all()
+    database.DB_FILE = path
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("CREATE TABLE users (username TEXT PRIMARY KEY, message_count INTEGER NOT NULL DEFAULT 0, is_subscriber BOOLEAN NOT NULL DEFAULT 0, favouritism_score INTEGER NOT NULL DEFAULT 0, last_seen TIMESTAMP, facts TEXT)")
+    conn.executemany("INSERT INTO users (username, message_count, last_seen, facts) VALUES (?, 10, datetime('now'), '[]')", [(f"viewer{i}",) for i in range(1000)])
+    conn.commit()
+    conn.close()
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmpdir:
+        seed(os.path.join(tmpdir, "legacy.db"), "delete")
+        legacy_read = timed(lambda i: legacy_get_user(f"viewer{i % 1000}"), 5000)
+        legacy_write = timed(lambda i: legacy_set_favouritism_score(f"viewer{i % 1000}", i), 500)
+
+        seed(os.path.join(tmpdir, "engine.db"), "wal")
+        database.create_tables()
+        engine_read = timed(lambda i: database.get_user(f"viewer{i % 1000}"), 5000)
+        engine_write = timed(lambda i: database.set_favouritism_score(f"viewer{i % 1000}", i), 500)
+        database.ENGINE.close_all()
+
+    print(f"get_user:              legacy {legacy_read:>8.1f} us/call   engine {engine_read:>8.1f} us/call")
+    print(f"set_favouritism_score: legacy {legacy_write:>8.1f} us/call   engine {engine_write:>8.1f} us/call")
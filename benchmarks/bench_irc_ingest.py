@@ -0,0 +1,67 @@
+"""Lines/sec for the IRC ingest path: legacy str-split loop vs LineFramer + parse_message.
+
+Run from the repo root: python benchmarks/bench_irc_ingest.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from irc import LineFramer, parse_message
+
+def make_lines(n):
+    lines = []
+    for i in range(n):
+        user = f"viewer{i % 500}"
+        text = random.choice(["Kappa hello there", "PogChamp that was insane", "!ai what game is this", "lol 😂 gg", "bot are you awake?"])
+        lines.append(
+            f"@badge-info=subscriber/12;badges=subscriber/12,premium/1;color=#1E90FF;display-name={user};"
+            f"emotes=25:0-4;id=a1b2c3d4-{i};mod=0;room-id=123;subscriber=1;tmi-sent-ts=1700000000{i % 1000:03d};turbo=0;user-id={i} "
+            f":{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #streamer :{text}"
+        )
+    return lines
+
+# The pre-framer ingest loop, kept here only as the baseline.
+def legacy_ingest(chunks):
+    buffer = ""
+    count = 0
+    for chunk in chunks:
+        buffer += chunk.decode("utf-8", errors="ignore")
+        while "\r\n" in buffer:
+            line, buffer = buffer.split("\r\n", 1)
+            if "PRIVMSG" in line:
+                parts = line.split(":", 2)
+                if len(parts) < 3: continue
+                user = parts[1].split("!")[0]
+                message = parts[2]
+                lowered = message.lower()
+                count += 1
+    return count
+
+def framed_ingest(chunks):
+    framer = LineFramer()
+    count = 0
+    for chunk in chunks:
+        for line in framer.feed(chunk):
+            msg = parse_message(line)
+            if msg.command == "PRIVMSG":
+                lowered = msg.text_lower
+                count += 1
+    return count
+
+def run(label, fn, chunks, n):
+    start = time.perf_counter()
+    fn(chunks)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {n / elapsed:>12,.0f} lines/sec")
+
+if __name__ == "__main__":
+    random.seed(1)
+    for n, chunk_size in [(20000, 1024), (20000, 4096), (20000, 4 * 1024 * 1024)]:
+        blob = ("\r\n".join(make_lines(n)) + "\r\n").encode("utf-8")
+        chunks = [blob[i:i + chunk_size] for i in range(0, len(blob), chunk_size)]
+        print(f"{n} lines, {chunk_size}-byte reads:")
+        run("legacy", legacy_ingest, chunks, n)
+        run("framer", framed_ingest, chunks, n)
@@ -0,0 +1,63 @@
+"""Retrieval index: build time, query latency and memory for a chat-sized corpus.
+
+Messages are synthetic: words drawn from a Zipf-like vocabulary, 3-15 words
+each, spread over a few channels, so term statistics resemble real chat.
+
+Run from the repo root: python benchmarks/bench_retrieval.py [messages]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import RetrievalIndex
+
+VOCABULARY = 20000
+CHANNELS = ["main", "second", "third"]
+
+def make_messages(count, rng):
+    words = [f"w{i}" for i in range(VOCABULARY)]
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY)]
+    messages = []
+    for i in range(count):
+        text = " ".join(rng.choices(words, weights, k=rng.randint(3, 15)))
+        messages.append((f"viewer{rng.randrange(5000)}: {text}", CHANNELS[i % len(CHANNELS)]))
+    return messages, words, weights
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def main(count):
+    rng = random.Random(7)
+    messages, words, weights = make_messages(count, rng)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    index = RetrievalIndex(max_docs=count)
+    started = time.perf_counter()
+    for text, channel in messages:
+        index.add(text, channel)
+    build = time.perf_counter() - started
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    latencies = []
+    for _ in range(200):
+        query = " ".join(rng.choices(words, weights, k=rng.randint(2, 8)))
+        started = time.perf_counter()
+        index.search(query, rng.choice(CHANNELS), k=5, budget=250)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    per_100k = 100000 / count
+    print(f"messages: {count} ({index.stats()['postings']} postings)")
+    print(f"build: {build:.2f}s ({count / build:,.0f} messages/s)")
+    print(f"query: p50 {percentile(latencies, 0.5):.2f} ms, p95 {percentile(latencies, 0.95):.2f} ms")
+    print(f"memory: {traced / 2**20:.1f} MiB traced, {index.nbytes() / 2**20:.1f} MiB estimated; "
+          f"{traced * per_100k / 2**20:.1f} MiB per 100k messages")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
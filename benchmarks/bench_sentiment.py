@@ -0,0 +1,81 @@
+"""Local lexicon sentiment: messages/sec, and agreement with model labels on a labelled sample.
+
+The bundled sample (benchmarks/data/sentiment_sample.jsonl) carries reference
+labels. With GEMINI_API_KEY set, the sample is relabelled live through
+ai_client.classify_sentiment_batch first, so agreement is measured against
+the model itself.
+
+Run from the repo root: python benchmarks/bench_sentiment.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment import SentimentAnalyzer
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sentiment_sample.jsonl")
+ESCALATE_BELOW = 0.35
+MIN_WORDS_TO_ESCALATE = 4
+
+def load_sample():
+    with open(SAMPLE_FILE) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if api_key:
+        from ai_client import classify_sentiment_batch
+        results = classify_sentiment_batch([("viewer", row["text"]) for row in rows], {"gemini_api_key": api_key})
+        for row, result in zip(rows, results):
+            if result:
+                row["label"] = result["sentiment"]
+        print("labels: live model")
+    else:
+        print("labels: bundled reference")
+    return rows
+
+def bench_throughput(analyzer, texts, rounds=200):
+    messages = texts * rounds
+    started = time.perf_counter()
+    for text in messages:
+        analyzer.score(text)
+    elapsed = time.perf_counter() - started
+    return len(messages) / elapsed, elapsed / len(messages) * 1e6
+
+def main():
+    analyzer = SentimentAnalyzer()
+    rows = load_sample()
+    texts = [row["text"] for row in rows]
+
+    rate, per_message = bench_throughput(analyzer, texts)
+    print(f"throughput: {rate:,.0f} msg/s ({per_message:.1f} us/message)")
+
+    agree = 0
+    confident = confident_agree = 0
+    escalated = 0
+    confusion = {}
+    for row in rows:
+        result = analyzer.score(row["text"])
+        key = (row["label"], result.label)
+        confusion[key] = confusion.get(key, 0) + 1
+        agree += result.label == row["label"]
+        if result.confidence < ESCALATE_BELOW and len(row["text"].split()) >= MIN_WORDS_TO_ESCALATE:
+            escalated += 1
+        elif result.confidence >= ESCALATE_BELOW:
+            confident += 1
+            confident_agree += result.label == row["label"]
+
+    total = len(rows)
+    print(f"agreement: {agree}/{total} ({agree / total:.0%})")
+    if confident:
+        print(f"agreement on confident (applied locally): {confident_agree}/{confident} ({confident_agree / confident:.0%})")
+    print(f"escalated to model: {escalated}/{total} ({escalated / total:.0%})")
+    labels = ("positive", "neutral", "negative")
+    print("confusion (rows = reference, cols = lexicon):")
+    print("            " + "".join(f"{label:>10}" for label in labels))
+    for expected in labels:
+        print(f"{expected:>10}  " + "".join(f"{confusion.get((expected, got), 0):>10}" for got in labels))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Messages/sec through create_or_update_user: per-message read-modify-write vs write-behind upserts.
+
+Run from the repo root: python benchmarks/bench_user_stats.py
+"""
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# The pre-aggregator implementation, kept here only as the baseline.
+def legacy_create_or_update_user(username, message_count_increment=0, is_subscriber=None, favouritism_score_increment=0):
+    conn = database.get_db_connection()
+    check = database.get_db_connection()
+    user = check.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    check.close()
+    now = datetime.datetime.now()
+    if user is None:
+        conn.execute(
+            "INSERT INTO users (username, message_count, is_subscriber, favouritism_score, last_seen, facts) VALUES (?, ?, ?, ?, ?, ?)",
+            (username, message_count_increment, 1 if is_subscriber else 0, favouritism_score_increment, now, json.dumps([]))
+        )
+    else:
+        conn.execute(
+            "UPDATE users SET message_count = ?, is_subscriber = ?, favouritism_score = ?, last_seen = ? WHERE username = ?",
+            (user["message_count"] + message_count_increment, 1 if user["is_subscriber"] else 0, user["favouritism_score"] + favouritism_score_increment, now, username)
+        )
+    conn.commit()
+    conn.close()
+
+def fresh_db(tmpdir, name):
+    database.DB_FILE = os.path.join(tmpdir, name)
+    database.create_tables()
+
+def run(chatters, messages, tmpdir):
+    users = [f"viewer{random.randrange(chatters)}" for _ in range(messages)]
+
+    fresh_db(tmpdir, f"legacy_{chatters}.db")
+    legacy_n = min(messages, 2000)
+    start = time.perf_counter()
+    for user in users[:legacy_n]:
+        legacy_create_or_update_user(user, message_count_increment=1)
+    legacy_rate = legacy_n / (time.perf_counter() - start)
+
+    fresh_db(tmpdir, f"aggregated_{chatters}.db")
+    database.USER_STATS.started = True  # flush explicitly, as the background thread would
+    flush_every = max(1, messages // 10)
+    start = time.perf_counter()
+    for i, user in enumerate(users, 1):
+        database.create_or_update_user(user, message_count_increment=1)
+        if i % flush_every == 0:
+            database.flush_user_stats()
+    database.flush_user_stats()
+    aggregated_rate = messages / (time.perf_counter() - start)
+
+    print(f"{chatters:>6} chatters: legacy {legacy_rate:>10,.0f} msg/s   write-behind {aggregated_rate:>10,.0f} msg/s")
+
+if __name__ == "__main__":
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for chatters in (1000, 10000):
+            run(chatters, 50000, tmpdir)
@@ -1,8 +1,22 @@
-import os, sys, json, ssl, socket, asyncio, random, threading, requests, time, textwrap, traceback
+import os, sys, json, ssl, asyncio, random, threading, requests, time, traceback
 import websocket
-from database import create_tables, create_or_update_user, get_user, get_random_active_user, update_user_facts
-from ai_client import generate_ai_response, perform_google_search, extract_user_facts
+import http_client
+from database import create_tables, create_or_update_user, get_user, get_users, update_user_facts, update_user_facts_bulk
+from ai_client import generate_ai_response, perform_google_search, extract_facts_batch, classify_sentiment_batch, configure_response_cache, response_cache_stats, configure_search_cache, search_cache_stats, prompt_stats, stream_ai_response, stream_stats, configure_model_client, model_client_stats, run_task, route_stats, configure_key_pool, key_pool_stats, summarize_captions
 from games import GameManager
+from chatters import ActiveChatterIndex, by_favouritism
+from chat_history import ChatHistory, FLAG_BOT, FLAG_COMMAND, FLAG_MENTION
+from retrieval import RetrievalIndex
+from chat_log import ChatLog
+from batching import MicroBatcher
+from sentiment import SentimentAnalyzer
+from facts import FactPipeline
+from irc import IRCConnection, channel_key, parse_message
+from outbound import OutboundScheduler, SentenceChunker, chunk_message
+from captions import CaptionRing, TailReader, make_watcher
+from caption_memory import CaptionMemory
+from ai_executor import AIExecutor, PRIORITY_REPLY, PRIORITY_EVENT, PRIORITY_AUTO, PRIORITY_BACKGROUND
+from workqueue import ShardedWorkQueue, PRIORITY_MODERATION, PRIORITY_COMMAND, PRIORITY_MENTION, PRIORITY_ANALYTICS
 import hashlib
 
 # ---------------- HELPERS ----------------
@@ -10,7 +24,7 @@ def validate_token(token):
     try:
         url = "https://id.twitch.tv/oauth2/validate"
         headers = {"Authorization": f"OAuth {token.replace('oauth:', '')}"}
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = http_client.get(url, headers=headers)
         resp.raise_for_status()
         data = resp.json()
         client_id = data.get("client_id")
@@ -35,7 +49,7 @@ def get_broadcaster_id(username, client_id, token):
             "Client-ID": client_id,
             "Authorization": f"Bearer {token.replace('oauth:', '')}"
         }
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = http_client.get(url, headers=headers)
         resp.raise_for_status()
         data = resp.json()
         if data["data"]:
@@ -46,7 +60,9 @@ def get_broadcaster_id(username, client_id, token):
 
 # ---------------- CONFIG ----------------
 CONFIG_FILE = "bot_config.json"
-MEMORY = {"chat_history": []}
+MEMORY = ChatHistory()
+RETRIEVAL = None  # RetrievalIndex over past chat and captions, set up by IRCBot
+CHAT_LOG = None   # ChatLog on disk, set up by IRCBot when enabled
 
 def prompt_missing_config(config):
     required = ["bot_username", "bot_token", "gemini_api_key", "personality", "auto_chat_freq"]
@@ -145,9 +161,127 @@ def load_or_create_config():
     if "max_response_length" not in config:
         config["max_response_length"] = 450
 
+    if "rate_limit" not in config:
+        # "moderator" if the bot account is a mod/VIP in its channels.
+        config["rate_limit"] = "regular"
+
     if "conversation_starter_interval" not in config:
         config["conversation_starter_interval"] = 900
 
+    if "active_chatter_window" not in config:
+        config["active_chatter_window"] = 3600
+
+    if "work_queue" not in config:
+        config["work_queue"] = {
+            "max_depth": 500,
+            "workers": 4
+        }
+
+    if "sentiment" not in config:
+        # Local scores at or above apply_above move favouritism directly; below escalate_below they go to the model.
+        config["sentiment"] = {
+            "apply_above": 0.7,
+            "escalate_below": 0.35,
+            "min_words_to_escalate": 4,
+            "extra_words": {},
+            "extra_emotes": {}
+        }
+
+    if "response_cache" not in config:
+        # Seconds to keep answers per call site; 0 disables caching there.
+        # Direct conversational replies (ai, mention) are off by default.
+        config["response_cache"] = {
+            "enabled": True,
+            "max_bytes": 1000000,
+            "sites": {"gemini": 1800, "roast": 900, "raidmsg": 300, "ai": 0, "mention": 0}
+        }
+
+    if "model_client" not in config:
+        # Retries, hedging of reply-priority calls and the circuit breaker for Gemini; see model_client.DEFAULT_SETTINGS.
+        # hedge_workers 0 sizes the hedge pool from ai_executor.max_concurrency.
+        config["model_client"] = {"max_retries": 3, "base_delay": 0.5, "max_delay": 8.0, "hedge": True,
+                                  "hedge_workers": 0, "failure_threshold": 5, "reset_timeout": 30.0}
+
+    if "model_backend" not in config:
+        # "gemini", or "mock" for canned offline responses (see model_router.MockBackend).
+        config["model_backend"] = "gemini"
+
+    if "gemini_api_keys" not in config:
+        # Extra Gemini keys, as strings or {"key": ..., "rpm": ...}; requests are spread over these and gemini_api_key.
+        config["gemini_api_keys"] = []
+
+    if "model_pool" not in config:
+        # Default per-key, per-model requests per minute, and how long a key sits out after a 429.
+        config["model_pool"] = {"rpm": 60, "cooldown": 60.0}
+
+    if "retrieval" not in config:
+        # Local BM25 index over past chat and captions; the k best matches go into !ai and mention prompts.
+        config["retrieval"] = {"enabled": True, "k": 5, "max_docs": 100000, "min_score": 1.0}
+
+    if "chat_log" not in config:
+        # Append-only log of chat and events on disk; each channel's recent history is restored from it at startup.
+        config["chat_log"] = {"enabled": True, "directory": "chat_log", "segment_bytes": 8388608,
+                              "flush_interval": 1.0, "max_segments": 64}
+
+    if "chat_history" not in config:
+        # Messages remembered per channel; "channels" overrides the capacity for individual channels.
+        config["chat_history"] = {"capacity": 100, "channels": {}}
+
+    if "caption_memory" not in config:
+        # Older captions are condensed into summaries so prompts cover the whole stream at a fixed size.
+        config["caption_memory"] = {"enabled": True, "recent_lines": 12, "window_chars": 1500,
+                                    "summary_chars": 100, "fanout": 3, "levels": 3}
+
+    if "model_routes" not in config:
+        # Per-task overrides of model_router.DEFAULT_ROUTES, e.g. {"classify": {"model": "gemini-2.0-flash"}}.
+        config["model_routes"] = {}
+
+    if "streaming" not in config:
+        # Sites whose replies are streamed: the first sentence is posted while the rest is generated.
+        config["streaming"] = {"enabled": True, "sites": ["mention", "ai", "gemini"],
+                               "first_min_chars": 20, "min_chars": 150, "max_chars": 400}
+
+    if "prompt_budget" not in config:
+        # Approximate tokens per prompt section; see prompt_builder.DEFAULT_BUDGET.
+        config["prompt_budget"] = {"total": 2000, "personality": 250, "facts": 150, "captions": 500, "history": 600,
+                                  "related": 250}
+
+    if "search_cache" not in config:
+        # daily_quota matches the free Custom Search tier; 0 means unlimited.
+        # Persisted rows are pruned once they have been expired for keep_stale seconds.
+        config["search_cache"] = {"ttl": 21600, "max_entries": 500, "persist": True, "daily_quota": 100,
+                                  "keep_stale": 86400}
+
+    if "fact_extraction" not in config:
+        config["fact_extraction"] = {
+            "max_batch": 20,
+            "max_wait": 30
+        }
+
+    if "sentiment_batch" not in config:
+        config["sentiment_batch"] = {
+            "max_batch": 25,
+            "max_wait": 10
+        }
+
+    if "ai_executor" not in config:
+        config["ai_executor"] = {
+            "max_concurrency": 3,
+            "max_queue": 200,
+            "deadlines": {"reply": 30, "event": 60, "auto": 60, "background": 300}
+        }
+
+    if "http" not in config:
+        config["http"] = dict(http_client.DEFAULT_SETTINGS)
+
+    if "irc" not in config:
+        config["irc"] = {
+            "port": 6697,
+            "tls": True,
+            "ping_interval": 30,
+            "ping_timeout": 10
+        }
+
     if sys.stdin.isatty():
         channels_input = input("Enter Twitch channels (comma separated): ").strip()
         channels = [c.strip().lstrip("#") for c in channels_input.split(",") if c.strip()]
@@ -162,31 +296,63 @@ def load_or_create_config():
 
 # ---------------- CONTEXT MONITOR ----------------
 class ContextMonitor:
-    def __init__(self, file_path, max_lines=20):
+    """Follows the caption file, keeping the last max_lines lines for prompts.
+
+    Only appended bytes are read (see captions.TailReader), woken by inotify
+    where available and polling every poll_interval seconds otherwise.
+    """
+
+    def __init__(self, file_path, max_lines=20, poll_interval=1.0, memory=None, index=None):
         self.file_path = file_path
         self.max_lines = max_lines
-        self.context_buffer = []
-        self.last_modified = 0
+        self.poll_interval = poll_interval
+        self.ring = CaptionRing(max_lines)
+        self.memory = memory  # CaptionMemory: older captions condensed into summaries
+        self.index = index    # RetrievalIndex: captions are searchable from every channel
+        self.reader = TailReader(file_path) if file_path else None
+        self.watcher = None
         if file_path:
             threading.Thread(target=self.monitor_file, daemon=True).start()
 
+    @property
+    def context_buffer(self):
+        return self.ring.lines()
+
     def monitor_file(self):
+        self.watcher = make_watcher(self.file_path, self.poll_interval)
+        print(f"[CAPTIONS] Following {self.file_path} ({self.watcher.kind})")
         while True:
-            try:
-                if os.path.exists(self.file_path):
-                    mtime = os.path.getmtime(self.file_path)
-                    if mtime > self.last_modified:
-                        self.last_modified = mtime
-                        with open(self.file_path, "r", encoding="utf-8", errors="ignore") as f:
-                            lines = f.readlines()
-                            # Just take the last N lines
-                            self.context_buffer = [line.strip() for line in lines[-self.max_lines:] if line.strip()]
-            except Exception as e:
-                print(f"[ERROR] Context monitor failed: {e}")
-            time.sleep(1)
+            self.poll()
+            self.watcher.wait()
+
+    def poll(self):
+        try:
+            lines = self.reader.read()
+            if lines:
+                self.ring.extend(lines)
+                if self.memory:
+                    self.memory.add(lines)
+                if self.index:
+                    for line in lines:
+                        self.index.add(line)
+        except Exception as e:
+            print(f"[ERROR] Context monitor failed: {e}")
+
+    def recent(self, seconds):
+        return self.ring.recent(seconds)
 
     def get_context(self):
-        return "\n".join(self.context_buffer)
+        # With caption memory: a fixed-size block of summaries covering the whole stream, then recent lines.
+        lines = self.memory.context_lines() if self.memory else self.ring.lines()
+        return "\n".join(lines)
+
+    def stats(self):
+        stats = self.reader.stats() if self.reader else {}
+        stats["watcher"] = self.watcher.kind if self.watcher else None
+        stats["lines_seen"] = self.ring.total
+        if self.memory:
+            stats["memory"] = self.memory.stats()
+        return stats
 
 # ---------------- EVENTSUB CLIENT ----------------
 class TwitchEventSub:
@@ -285,7 +451,7 @@ class TwitchEventSub:
                 }
             }
             try:
-                resp = requests.post(url, headers=headers, json=payload, timeout=10)
+                resp = http_client.post(url, headers=headers, json=payload)
                 if resp.status_code in [200, 202]:
                     print(f"[EVENTSUB] Subscribed to ads for {ch}")
                 elif resp.status_code == 409:
@@ -308,62 +474,142 @@ class TwitchEventSub:
 def analyze_sentiment_and_update_preferences(message, user, config):
     prompt = f"Analyze the sentiment of the following message and identify the main topics. Respond with a JSON object with two keys: 'sentiment' (either 'positive', 'negative', or 'neutral') and 'topics' (a list of strings). Message: {message}"
 
-    response_text = generate_ai_response(prompt, user, config)
-
-    # Clean up markdown if present
-    if response_text.startswith("```json"):
-        response_text = response_text[7:]
-    if response_text.startswith("```"):
-        response_text = response_text[3:]
-    if response_text.endswith("```"):
-        response_text = response_text[:-3]
-    response_text = response_text.strip()
+    response_json = run_task("classify", prompt, config)
+    if not isinstance(response_json, dict):
+        return
 
     try:
-        response_json = json.loads(response_text)
-
-        sentiment = response_json.get("sentiment")
-        topics = response_json.get("topics", [])
-
+        apply_sentiment_results([(user, response_json.get("sentiment"), response_json.get("topics", []))], config)
+    except Exception as e:
+        print(f"[ERROR] Sentiment analysis failed: {e}")
+        print(f"[DEBUG] Failed response: {response_json}")
+
+def apply_sentiment_results(results, config):
+    """Apply [(user, sentiment, topics), ...] at once: one score delta per user and one config write."""
+    traits = config.setdefault("personality_traits", {})
+    likes = traits.setdefault("likes", [])
+    dislikes = traits.setdefault("dislikes", [])
+    deltas = {}
+    changed = False
+    for user, sentiment, topics in results:
         if sentiment == "positive":
-            config["personality_traits"]["likes"].extend(topics)
-            create_or_update_user(user, favouritism_score_increment=1)
+            target, delta = likes, 1
         elif sentiment == "negative":
-            config["personality_traits"]["dislikes"].extend(topics)
-            create_or_update_user(user, favouritism_score_increment=-1)
-
-        # Remove duplicates
-        config["personality_traits"]["likes"] = list(set(config["personality_traits"]["likes"]))
-        config["personality_traits"]["dislikes"] = list(set(config["personality_traits"]["dislikes"]))
-
+            target, delta = dislikes, -1
+        else:
+            continue
+        deltas[user] = deltas.get(user, 0) + delta
+        for topic in topics or []:
+            if topic not in target:
+                target.append(topic)
+                changed = True
+
+    for user, delta in deltas.items():
+        if delta:
+            create_or_update_user(user, favouritism_score_increment=delta)
+
+    if changed:
         with open(CONFIG_FILE, "w") as f:
             json.dump(config, f, indent=4)
-
-    except Exception as e:
-        print(f"[ERROR] Sentiment analysis failed: {e}")
-        print(f"[DEBUG] Failed text: {response_text}")
+    return deltas
 
 # ---------------- MEMORY ----------------
-def record_message(user, message):
-    MEMORY["chat_history"].append({"user": user, "message": message})
-    if len(MEMORY["chat_history"]) > 100:
-        MEMORY["chat_history"] = MEMORY["chat_history"][-100:]
-
-def get_recent_memory(n=5):
-    return MEMORY["chat_history"][-n:]
+def record_message(user, message, channel=None, flags=0):
+    channel = channel_key(channel) if channel else None
+    if RETRIEVAL is not None:
+        RETRIEVAL.add(f"{user}: {message}", channel)
+    record = MEMORY.append(user, message, channel, flags)
+    if CHAT_LOG is not None:
+        CHAT_LOG.append("chat", record.channel, record.user, record.text, flags, record.timestamp)
+    return record
+
+def log_event(kind, channel, user, text=""):
+    # Subs, raids and other channel events go to the on-disk log only.
+    if CHAT_LOG is not None:
+        CHAT_LOG.append(kind, channel, user, text)
+
+def get_recent_memory(n=5, channel=None):
+    # ChatRecords, which also answer m["user"] and m["message"]; channel=None reads across all channels.
+    return MEMORY.recent(n, channel_key(channel) if channel else None)
 
 # ---------------- IRC BOT ----------------
 class IRCBot:
     def __init__(self, config):
         self.server = "irc.chat.twitch.tv"
-        self.port = 6667
         self.config = config
+        http_client.configure(self.config.get("http", {}))
+        configure_response_cache(self.config.get("response_cache", {}))
+        configure_search_cache(self.config.get("search_cache", {}))
+        model_settings = dict(self.config.get("model_client", {}))
+        if not model_settings.get("hedge_workers"):
+            # Every AI worker can be in a hedged call at once, each holding a primary and a backup thread.
+            model_settings["hedge_workers"] = 2 * max(self.config.get("ai_executor", {}).get("max_concurrency", 3), 1)
+        configure_model_client(model_settings)
+        configure_key_pool(self.config.get("model_pool", {}))
+        irc_settings = self.config.get("irc", {})
+        self.port = irc_settings.get("port", 6697)
         self.nick = self.config["bot_username"]
+        self.nick_lower = self.nick.lower()
         self.token = self.config["bot_token"]
-        self.channels = self.config["channels"]
-        self.sock = None
+        # Keyed like msg.channel, so chatter and history lookups match what the parser reports.
+        self.channels = [channel_key(ch) for ch in self.config["channels"]]
         self.loop = asyncio.get_event_loop()
+        queue_settings = self.config.get("work_queue", {})
+        # Sharded by channel: a channel's messages are handled in order, one at a time.
+        self.work_queue = ShardedWorkQueue(
+            max_depth=queue_settings.get("max_depth", 500),
+            workers=queue_settings.get("workers", 4),
+            name="irc-worker",
+        )
+        self.work_queue.start()
+        ai_settings = self.config.get("ai_executor", {})
+        self.ai = AIExecutor(
+            max_concurrency=ai_settings.get("max_concurrency", 3),
+            max_queue=ai_settings.get("max_queue", 200),
+            deadlines=ai_settings.get("deadlines"),
+        )
+        self.ai.start()
+        batch_settings = self.config.get("sentiment_batch", {})
+        self.sentiment_batcher = MicroBatcher(
+            self.submit_sentiment_batch,
+            max_batch=batch_settings.get("max_batch", 25),
+            max_wait=batch_settings.get("max_wait", 10),
+            name="sentiment-batcher",
+        )
+        self.sentiment_batcher.start()
+        self.sentiment = SentimentAnalyzer(
+            extra_words=self.config.get("sentiment", {}).get("extra_words"),
+            extra_emotes=self.config.get("sentiment", {}).get("extra_emotes"),
+        )
+        fact_settings = self.config.get("fact_extraction", {})
+        self.fact_pipeline = FactPipeline(
+            lambda batch: extract_facts_batch(batch, self.config),
+            update_user_facts_bulk,
+            dispatch=lambda fn, batch: self.ai.submit(PRIORITY_BACKGROUND, fn, batch),
+            max_batch=fact_settings.get("max_batch", 20),
+            max_wait=fact_settings.get("max_wait", 30),
+        )
+        self.fact_pipeline.start()
+        self.sentiment_stats = {"scored": 0, "applied_locally": 0, "escalated_topics": 0, "escalated_low_confidence": 0}
+        self.sentiment_lock = threading.Lock()  # handle_sentiment runs on every handler worker
+        self.stream_stats = {"replies": 0, "messages": 0, "ttfm_ms_last": 0.0, "ttfm_ms_avg": 0.0, "ttfm_ms_max": 0.0}
+        self.stream_lock = threading.Lock()  # stream_reply runs on several AI workers at once
+        self.outbound = OutboundScheduler(
+            self.write_raw,
+            rate_limit=self.config.get("rate_limit", "regular"),
+            max_bytes=self.config.get("max_message_bytes", 500),
+        )
+        self.outbound.start()
+        self.sock = IRCConnection(
+            self.server, self.port, self.nick, self.token, self.channels, self.ingest_line,
+            use_tls=irc_settings.get("tls", True),
+            ping_interval=irc_settings.get("ping_interval", 30),
+            ping_timeout=irc_settings.get("ping_timeout", 10),
+        )
         self.sock_lock = threading.Lock()
+        self.active_chatters = ActiveChatterIndex(window=self.config.get("active_chatter_window", 3600))
+        history_settings = self.config.get("chat_history", {})
+        MEMORY.configure(history_settings.get("capacity", 100), history_settings.get("channels", {}))
         self.commands = {
             "ai": self.ai_command,
             "gemini": self.gemini_command,
@@ -384,8 +630,23 @@ class IRCBot:
             "raidmsg": self.raidmsg_command,
             "raidout": self.raidout_command
         }
-        self.context_monitor = ContextMonitor(self.config.get("caption_file_path"))
-        self.game_manager = GameManager(self.config, self.send_message)
+        memory_settings = self.config.get("caption_memory", {})
+        memory = None
+        if memory_settings.get("enabled", True) and self.config.get("caption_file_path"):
+            memory = CaptionMemory(lambda text, max_chars: summarize_captions(text, max_chars, self.config),
+                                   submit=lambda fn, on_dropped: self.ai.submit(PRIORITY_BACKGROUND, fn, on_expired=on_dropped),
+                                   **{k: v for k, v in memory_settings.items() if k != "enabled"})
+        global RETRIEVAL
+        retrieval_settings = self.config.get("retrieval", {})
+        RETRIEVAL = RetrievalIndex(**retrieval_settings) if retrieval_settings.get("enabled", True) else None
+        self.context_monitor = ContextMonitor(self.config.get("caption_file_path"), memory=memory, index=RETRIEVAL)
+        global CHAT_LOG
+        log_settings = self.config.get("chat_log", {})
+        CHAT_LOG = ChatLog(**{k: v for k, v in log_settings.items() if k != "enabled"}) if log_settings.get("enabled", True) else None
+        if CHAT_LOG is not None:
+            self.restore_history(history_settings)
+        self.game_manager = GameManager(self.config, self.send_message,
+                                        submit=lambda fn, on_dropped: self.ai.submit(PRIORITY_REPLY, fn, on_expired=on_dropped))
         self.is_brb = False
         self.is_ad_break = False
         self.original_auto_chat_freq = self.config.get("auto_chat_freq", 0.2)
@@ -401,134 +662,269 @@ class IRCBot:
         self.eventsub = TwitchEventSub(self.config, self.start_ad_mode)
         self.eventsub.start()
 
-        threading.Thread(target=self.connect_and_listen, daemon=True).start()
         self.auto_chat_timer = threading.Timer(self.config.get("auto_chat_interval", 600), self.auto_chat)
         self.auto_chat_timer.start()
         self.conversation_starter_timer = threading.Timer(self.config.get("conversation_starter_interval", 900), self.conversation_starter_task)
         self.conversation_starter_timer.start()
 
-    def connect_and_listen(self):
-        while True:
-            try:
-                print(f"[IRC] Connecting to {self.server}:{self.port} as {self.nick}")
-                self.sock = socket.socket()
-                self.sock.connect((self.server, self.port))
-                self.sock.send(f"PASS {self.token}\r\n".encode("utf-8"))
-                self.sock.send(f"NICK {self.nick}\r\n".encode("utf-8"))
-                for ch in self.channels:
-                    self.sock.send(f"JOIN #{ch}\r\n".encode("utf-8"))
-                print(f"[IRC] Connected and joined channels: {', '.join(self.channels)}")
-                self.listen()
-            except Exception as e:
-                print(f"[ERROR] IRC connect failed: {e}")
-                if self.sock: self.sock.close()
-                time.sleep(5)
-
-    def listen(self):
-        buffer = ""
-        while True:
-            try:
-                data = self.sock.recv(1024).decode("utf-8", errors="ignore")
-                if not data: raise Exception("Disconnected")
-                buffer += data
-                while "\r\n" in buffer:
-                    line, buffer = buffer.split("\r\n", 1)
-                    self.handle_line(line)
-            except Exception as e:
-                print(f"[ERROR] IRC recv error: {e}")
-                if self.sock: self.sock.close()
-                break
+    def restore_history(self, history_settings):
+        """Refills each channel's recent chat (and the retrieval index) from the tail of the chat log."""
+        started = time.perf_counter()
+        per_channel = max([history_settings.get("capacity", 100)] + list(history_settings.get("channels", {}).values()))
+        recent = CHAT_LOG.tail(per_channel, channels=self.channels)
+        entries = sorted((e for channel_entries in recent.values() for e in channel_entries), key=lambda e: e.timestamp)
+        for e in entries:
+            MEMORY.append(e.user, e.text, e.channel, e.flags, e.timestamp)
+            if RETRIEVAL is not None:
+                RETRIEVAL.add(f"{e.user}: {e.text}", e.channel, e.timestamp)
+        if entries:
+            print(f"[CHAT LOG] Restored {len(entries)} messages in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def flush_batches(self):
+        # Shutdown: the executor's daemon workers die with the process, so the
+        # partial sentiment and fact batches are classified here instead.
+        self.sentiment_batcher.stop()
+        self.fact_pipeline.stop()
+        while self.sentiment_batcher.flush(self.classify_sentiment_batch):
+            pass
+        while self.fact_pipeline.flush(inline=True):
+            pass
+
+    def close_chat_log(self):
+        global CHAT_LOG
+        if CHAT_LOG is not None:
+            CHAT_LOG.close()
+            CHAT_LOG = None
+
+    async def connect_and_listen(self):
+        await self.sock.run()
+
+    def write_raw(self, data):
+        self.sock.send(data)
+
+    def ingest_line(self, line):
+        # Reader side: parse and enqueue only, so reading never waits on handlers.
+        try:
+            print(f"[IRC RAW] {line}")
+            msg = parse_message(line)
+            if msg is None: return
+            for priority, handler in self.route_message(msg):
+                self.work_queue.put(msg.channel, priority, handler, msg)
+        except Exception as e:
+            print(f"[ERROR] Error in ingest_line: {e}")
+            traceback.print_exc()
 
     def handle_line(self, line):
+        # Synchronous equivalent of ingest_line: runs every routed handler in place.
         try:
             print(f"[IRC RAW] {line}")
-            if line.startswith("PING"):
-                self.sock.send(f"PONG {line.split()[1]}\r\n".encode("utf-8"))
-            elif "PRIVMSG" in line:
-                parts = line.split(":", 2)
-                if len(parts) < 3: return
-                user = parts[1].split("!")[0]
-                channel = parts[1].split(" ")[2][1:]
-                message = parts[2]
-                print(f"[CHAT] {user}: {message}")
-
-                record_message(user, message)
-
-                create_or_update_user(user, message_count_increment=1)
-
-                if random.random() < self.config.get("sentiment_analysis_probability", 0.1):
-                    analyze_sentiment_and_update_preferences(message, user, self.config)
-
-                if self.moderate_message(message, user, channel):
-                    return
-
-                if message.startswith("!"):
-                    command_parts = message.split(" ", 1)
-                    command = command_parts[0][1:].lower()
-                    args = command_parts[1] if len(command_parts) > 1 else ""
-                    self.handle_command(command, args, user, channel)
-                else:
-                    # Check for active game answers
-                    response, points = self.game_manager.handle_message(channel, user, message)
-                    if response:
-                        self.send_message(response, channel)
-                        if points > 0:
-                            create_or_update_user(user, favouritism_score_increment=points)
-
-                    if self.nick.lower() in message.lower():
-                        # Try to extract facts from the message
-                        threading.Thread(target=extract_user_facts, args=(message, user, self.config)).start()
-
-                        prompt = message
-                        context = "\n".join([f"{m['user']}: {m['message']}" for m in get_recent_memory()])
-                        resp = generate_ai_response(f"{context}\n{user} says: {prompt}", user, self.config, context_monitor=self.context_monitor)
-                        record_message(self.nick, resp)
-                        self.send_message(resp, channel)
-
-            elif "USERNOTICE" in line:
-                parts = line.split(":", 2)
-                if len(parts) < 3: return
-                message = parts[2]
-                tags = {t.split("=")[0]: t.split("=")[1] for t in parts[0].split(";") if "=" in t}
-                # Usernotice channel (not fully parsed above but usually after USERNOTICE)
-                # Format: ... USERNOTICE #channel ...
-                channel = parts[1].split(" ")[2][1:]
-
-                if tags.get("msg-id") == "sub" or tags.get("msg-id") == "resub":
-                    user = tags.get("display-name")
-                    if user:
-                        create_or_update_user(user, is_subscriber=True, favouritism_score_increment=10)
-                        # AI Subscription Welcome
-                        def _sub_welcome_task():
-                            prompt = f"User '{user}' just subscribed! Thank them enthusiastically in your personality."
-                            response = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
-                            self.send_message(response, channel)
-                        threading.Thread(target=_sub_welcome_task).start()
-
-                elif tags.get("msg-id") == "raid":
-                    user = tags.get("display-name")
-                    viewers = tags.get("msg-param-viewerCount")
-                    if user and viewers:
-                        # AI Raid Welcome
-                        def _raid_welcome_task():
-                            prompt = f"User '{user}' just raided with {viewers} viewers! Give them a warm, hype welcome in your personality."
-                            response = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
-                            self.send_message(response, channel)
-                        threading.Thread(target=_raid_welcome_task).start()
+            msg = parse_message(line)
+            if msg is None: return
+            for priority, handler in self.route_message(msg):
+                handler(msg)
         except Exception as e:
             print(f"[ERROR] Error in handle_line: {e}")
             traceback.print_exc()
 
+    def route_message(self, msg):
+        # PING never gets here: the transport answers it before lines are handed over.
+        if msg.command == "PRIVMSG":
+            if msg.text is None or not msg.user or not msg.channel:
+                return []
+            if self.check_moderation(msg):
+                priority = PRIORITY_MODERATION
+            elif msg.text.startswith("!"):
+                priority = PRIORITY_COMMAND
+            elif self.nick_lower in msg.text_lower:
+                priority = PRIORITY_MENTION
+            elif self.game_manager.has_active_game(msg.channel):
+                # Plain chat carries game answers while a game runs, which are time-sensitive.
+                priority = PRIORITY_COMMAND
+            else:
+                # Otherwise it is shed first in a flood, before commands and mentions.
+                priority = PRIORITY_ANALYTICS
+            return [(priority, self.handle_privmsg)]
+        if msg.command == "USERNOTICE" and msg.channel:
+            return [(PRIORITY_COMMAND, self.handle_usernotice)]
+        return []
+
+    def handle_sentiment(self, msg):
+        # Every message is scored locally; the model only sees sampled (topic
+        # extraction) or low-confidence messages, in batches.
+        result = self.sentiment.score(msg.text)
+        settings = self.config.get("sentiment", {})
+        if random.random() < self.config.get("sentiment_analysis_probability", 0.1):
+            reason = "escalated_topics"
+        elif result.confidence < settings.get("escalate_below", 0.35) and len(msg.text.split()) >= settings.get("min_words_to_escalate", 4):
+            reason = "escalated_low_confidence"
+        elif result.label != "neutral" and result.confidence >= settings.get("apply_above", 0.7):
+            reason = "applied_locally"
+        else:
+            reason = None
+        with self.sentiment_lock:
+            self.sentiment_stats["scored"] += 1
+            if reason:
+                self.sentiment_stats[reason] += 1
+        if reason == "applied_locally":
+            apply_sentiment_results([(msg.user, result.label, [])], self.config)
+        elif reason:
+            self.sentiment_batcher.add((msg.user, msg.text))
+
+    def sentiment_stats_snapshot(self):
+        with self.sentiment_lock:
+            return dict(self.sentiment_stats)
+
+    def submit_sentiment_batch(self, batch):
+        self.ai.submit(PRIORITY_BACKGROUND, self.classify_sentiment_batch, batch)
+
+    def classify_sentiment_batch(self, batch):
+        classified = classify_sentiment_batch(batch, self.config)
+        results = [
+            (user, result["sentiment"], result["topics"])
+            for (user, _), result in zip(batch, classified) if result
+        ]
+        apply_sentiment_results(results, self.config)
+        print(f"[SENTIMENT] Classified {len(results)}/{len(batch)} messages in one request")
+
+    def submit_ai(self, priority, prompt, user, channel=None, wrap=None, record=False, **ai_kwargs):
+        """Queue a generate_ai_response call; the reply is posted only if it arrives before its deadline.
+
+        Extra keyword arguments (cache_key, cache_site, history, site) go to generate_ai_response.
+        Sites listed in config["streaming"]["sites"] are streamed instead (see stream_reply).
+        """
+        streaming = self.config.get("streaming", {})
+        if streaming.get("enabled") and (ai_kwargs.get("site") or ai_kwargs.get("cache_site")) in streaming.get("sites", ()):
+            return self.ai.submit(priority, self.stream_reply, prompt, user, channel, wrap, record,
+                                  time.monotonic(), **ai_kwargs)
+        def deliver(response):
+            if not response:
+                return
+            if record:
+                record_message(self.nick, response, channel, FLAG_BOT)
+            self.send_message(wrap(response) if wrap else response, channel)
+        return self.ai.submit(priority, generate_ai_response, prompt, user, self.config,
+                              context_monitor=self.context_monitor, on_result=deliver, **ai_kwargs)
+
+    def stream_reply(self, prompt, user, channel, wrap, record, submitted_at, **ai_kwargs):
+        """Post a reply sentence by sentence as the model streams it; wrap applies to the first message."""
+        settings = self.config.get("streaming", {})
+        chunker = SentenceChunker(settings.get("first_min_chars", 20), settings.get("min_chars", 150),
+                                  settings.get("max_chars", 400))
+        parts = []
+
+        def post(chunk):
+            if not parts:
+                self.record_ttfm(time.monotonic() - submitted_at)
+                chunk = wrap(chunk) if wrap else chunk
+            parts.append(chunk)
+            self.send_message(chunk, channel)
+
+        for delta in stream_ai_response(prompt, user, self.config, context_monitor=self.context_monitor, **ai_kwargs):
+            for chunk in chunker.feed(delta):
+                post(chunk)
+        for chunk in chunker.finish():
+            post(chunk)
+
+        if parts:
+            with self.stream_lock:
+                self.stream_stats["replies"] += 1
+                self.stream_stats["messages"] += len(parts)
+            if record:
+                record_message(self.nick, " ".join(parts), channel, FLAG_BOT)
+
+    def record_ttfm(self, seconds):
+        ms = round(seconds * 1000, 1)
+        with self.stream_lock:
+            stats = self.stream_stats
+            stats["ttfm_ms_avg"] = ms if not stats["replies"] else round(stats["ttfm_ms_avg"] * 0.9 + ms * 0.1, 1)
+            stats["ttfm_ms_last"] = ms
+            stats["ttfm_ms_max"] = max(stats["ttfm_ms_max"], ms)
+
+    def stream_stats_snapshot(self):
+        with self.stream_lock:
+            return dict(self.stream_stats)
+
+    def handle_privmsg(self, msg):
+        user = msg.user
+        channel = msg.channel
+        message = msg.text
+        print(f"[CHAT] {user}: {message}")
+
+        flags = (FLAG_COMMAND if message.startswith("!") else 0) | (FLAG_MENTION if self.nick_lower in msg.text_lower else 0)
+        record_message(user, message, channel, flags)
+        self.active_chatters.touch(channel, user)
+
+        create_or_update_user(user, message_count_increment=1)
+
+        if self.moderate_message(msg):
+            return
+
+        if not message.startswith("!"):
+            self.handle_sentiment(msg)
+
+        if message.startswith("!"):
+            command_parts = message.split(" ", 1)
+            command = command_parts[0][1:].lower()
+            args = command_parts[1] if len(command_parts) > 1 else ""
+            self.handle_command(command, args, user, channel)
+        else:
+            # Check for active game answers
+            response, points = self.game_manager.handle_message(channel, user, message)
+            if response:
+                self.send_message(response, channel)
+                if points > 0:
+                    create_or_update_user(user, favouritism_score_increment=points)
+
+            if self.nick_lower in msg.text_lower:
+                # Try to extract facts from the message
+                self.fact_pipeline.submit(user, message)
+
+                prompt = message
+                history = get_recent_memory(channel=channel)
+                self.submit_ai(PRIORITY_REPLY, f"{user} says: {prompt}", user, channel, record=True,
+                               cache_key=prompt, cache_site="mention", history=history,
+                               related=self.related_lines(prompt, channel, history))
+
+    def handle_usernotice(self, msg):
+        channel = msg.channel
+        msg_id = msg.tag("msg-id")
+        if msg_id:
+            log_event(msg_id, channel, msg.tag("display-name") or "", msg.text or "")
+
+        if msg_id == "sub" or msg_id == "resub":
+            user = msg.tag("display-name")
+            if user:
+                create_or_update_user(user, is_subscriber=True, favouritism_score_increment=10)
+                # AI Subscription Welcome
+                prompt = f"User '{user}' just subscribed! Thank them enthusiastically in your personality."
+                self.submit_ai(PRIORITY_EVENT, prompt, user, channel, site="welcome_sub")
+
+        elif msg_id == "raid":
+            user = msg.tag("display-name")
+            viewers = msg.tag("msg-param-viewerCount")
+            if user and viewers:
+                # AI Raid Welcome
+                prompt = f"User '{user}' just raided with {viewers} viewers! Give them a warm, hype welcome in your personality."
+                self.submit_ai(PRIORITY_EVENT, prompt, user, channel, site="welcome_raid")
+
     def handle_command(self, command, args, user, channel):
         if command in self.commands:
             self.commands[command](args, user, channel)
 
     def ai_command(self, args, user, channel):
         prompt = args
-        context = "\n".join([f"{m['user']}: {m['message']}" for m in get_recent_memory()])
-        resp = generate_ai_response(f"{context}\n{user} says: {prompt}", user, self.config, context_monitor=self.context_monitor)
-        record_message(self.nick, resp)
-        self.send_message(resp, channel)
+        history = get_recent_memory(channel=channel)
+        self.submit_ai(PRIORITY_REPLY, f"{user} says: {prompt}", user, channel, record=True,
+                       cache_key=prompt, cache_site="ai", history=history,
+                       related=self.related_lines(prompt, channel, history))
+
+    def related_lines(self, query, channel, history):
+        """Earlier chat and caption lines relevant to query, minus those already in history."""
+        if RETRIEVAL is None:
+            return None
+        budget = self.config.get("prompt_budget", {}).get("related", 250)
+        exclude = {f"{m['user']}: {m['message']}" for m in history}
+        return RETRIEVAL.search(query, channel, exclude=exclude, budget=budget)
 
     def gemini_command(self, args, user, channel):
         query = args
@@ -544,6 +940,10 @@ class IRCBot:
             return
 
         self.send_message(f"Searching for '{query}'...", channel)
+        # The search is an HTTP round trip, so it runs on the AI executor rather than this handler worker.
+        self.ai.submit(PRIORITY_REPLY, self.answer_with_search, query, api_key, engine_id, user, channel)
+
+    def answer_with_search(self, query, api_key, engine_id, user, channel):
         search_results = perform_google_search(query, api_key, engine_id)
 
         if search_results.startswith("Search failed:"):
@@ -552,12 +952,9 @@ class IRCBot:
 
         prompt = f"The user '{user}' asked: '{query}'.\n\nHere is some background information:\n{search_results}\n\nUsing this information, answer the user's question. Respond as a natural, organic participant in the chat. Do NOT mention that you performed a search or say 'according to the results'. Just give the answer or opinion as if you knew it. You can share relevant links naturally (e.g., 'I found this link:', 'Check this out:') if they add value."
 
-        response_text = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
-
-        # Save to memory so the conversation context is preserved
-        record_message(self.nick, response_text)
-
-        self.send_message(f"@{user} {response_text}", channel)
+        # Recorded to memory so the conversation context is preserved
+        self.submit_ai(PRIORITY_REPLY, prompt, user, channel, wrap=lambda r: f"@{user} {r}", record=True,
+                       cache_key=query, cache_site="gemini")
 
     def say_command(self, args, user, channel):
         self.send_message(args, channel)
@@ -565,7 +962,7 @@ class IRCBot:
     def uptime_command(self, args, user, channel):
         try:
             url = f"https://decapi.me/twitch/uptime/{channel}"
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
             self.send_message(f"Stream has been live for: {response.text}", channel)
         except requests.exceptions.RequestException as e:
@@ -623,8 +1020,8 @@ class IRCBot:
     def roast_command(self, args, user, channel):
         target = args.strip() or user
         prompt = f"Give me a funny, lighthearted roast for the user '{target}'. Keep it friendly and Twitch-safe."
-        response = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
-        self.send_message(f"@{target} 🔥 {response}", channel)
+        self.submit_ai(PRIORITY_REPLY, prompt, user, channel, wrap=lambda r: f"@{target} 🔥 {r}",
+                       cache_key=target, cache_site="roast")
 
     def eightball_command(self, args, user, channel):
         if not args:
@@ -659,18 +1056,12 @@ class IRCBot:
         self.send_message(f"❤️ Love User Compatibility: {user} + {target} = {score}%! {msg}", channel)
 
     def lurk_command(self, args, user, channel):
-        def _lurk_task():
-            prompt = f"User '{user}' is going into lurk mode (watching silently). Respond with a friendly/funny confirmation in your personality."
-            response = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
-            self.send_message(response, channel)
-        threading.Thread(target=_lurk_task).start()
+        prompt = f"User '{user}' is going into lurk mode (watching silently). Respond with a friendly/funny confirmation in your personality."
+        self.submit_ai(PRIORITY_REPLY, prompt, user, channel, site="lurk")
 
     def raidmsg_command(self, args, user, channel):
-        def _raidmsg_task():
-            prompt = "Write a hype raid message for our community to copy-paste when we raid another stream. It should be short, energetic, and include our channel emotes if you know them, or generic hype emotes."
-            response = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
-            self.send_message(response, channel)
-        threading.Thread(target=_raidmsg_task).start()
+        prompt = "Write a hype raid message for our community to copy-paste when we raid another stream. It should be short, energetic, and include our channel emotes if you know them, or generic hype emotes."
+        self.submit_ai(PRIORITY_REPLY, prompt, user, channel, cache_key="raidmsg", cache_site="raidmsg")
 
     def raidout_command(self, args, user, channel):
         target_user = args.strip()
@@ -681,7 +1072,10 @@ class IRCBot:
         def _raidout_task():
             # 1. Generate hype message
             prompt = f"We are raiding '{target_user}'. Write a short, spunky, hype raid message for my community to copy-paste. Include emojis. Keep it under 150 chars."
-            message = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
+            message = self.ai.call(PRIORITY_REPLY, generate_ai_response, prompt, user, self.config,
+                                   context_monitor=self.context_monitor, site="raidout")
+            # The raid goes ahead even when the model is unavailable.
+            message = message or f"{channel} raid! Welcome, {target_user} chat! 🎉"
 
             # 2. Post to local chat
             self.send_message(f"🚨 RAID INCOMING! Copy this: {message}", channel)
@@ -697,7 +1091,7 @@ class IRCBot:
                         "Client-ID": client_id,
                         "Authorization": f"Bearer {self.token.replace('oauth:', '')}"
                     }
-                    resp = requests.post(url, headers=headers, timeout=10)
+                    resp = http_client.post(url, headers=headers)
                     if resp.status_code in [200, 201, 204]:
                         print(f"[RAID] Raid initiated via API to {target_user} (Status: {resp.status_code})")
                     else:
@@ -727,8 +1121,7 @@ class IRCBot:
                     time.sleep(30)
 
                     # Send the hype message
-                    with self.sock_lock:
-                        self.sock.send(f"PRIVMSG #{target_user} :{message}\r\n".encode("utf-8"))
+                    self.outbound.send_now(target_user, message)
                     print(f"[RAID] Invaded #{target_user} with: {message}")
 
                     time.sleep(1)
@@ -739,8 +1132,7 @@ class IRCBot:
                     # Already in channel, just send
                     print(f"[RAID] Already in #{target_user}, waiting 30s...")
                     time.sleep(30)
-                    with self.sock_lock:
-                        self.sock.send(f"PRIVMSG #{target_user} :{message}\r\n".encode("utf-8"))
+                    self.outbound.send_now(target_user, message)
 
             except Exception as e:
                 print(f"[ERROR] Raid invasion failed: {e}")
@@ -749,7 +1141,7 @@ class IRCBot:
 
     def send_brb_summary(self, channel, user, context_type="brb"):
         try:
-            history = get_recent_memory(30)
+            history = get_recent_memory(30, channel)
             history_str = ""
             for entry in history:
                 history_str += f"{entry['user']}: {entry['message']}\n"
@@ -760,10 +1152,11 @@ class IRCBot:
                 prompt = f"The streamer is stepping away (BRB). Please summarize the recent conversation (last 20-30 messages) and spoken context for the chat. Keep it brief and fun. Here is the recent chat history:\n\n{history_str}"
 
             # generate_ai_response will handle appending the spoken context from context_monitor
-            response = generate_ai_response(prompt, user, self.config, context_monitor=self.context_monitor)
+            response = self.ai.call(PRIORITY_EVENT, generate_ai_response, prompt, user, self.config,
+                                    context_monitor=self.context_monitor, site=context_type, task="summarize")
 
             # Check if still in correct mode before sending
-            if (context_type == "brb" and self.is_brb) or (context_type == "ad" and self.is_ad_break):
+            if response and ((context_type == "brb" and self.is_brb) or (context_type == "ad" and self.is_ad_break)):
                 self.send_message(response)
         except Exception as e:
             print(f"[ERROR] Failed to generate summary: {e}")
@@ -848,60 +1241,83 @@ class IRCBot:
         self.brb_timer.start()
 
     def conversation_starter_task(self):
-        user_to_start_conversation_with = get_random_active_user()
-        if user_to_start_conversation_with:
-            username = user_to_start_conversation_with["username"]
-            prompt = f"You want to start a conversation with the user '{username}'. Their favouritism score is {user_to_start_conversation_with['favouritism_score']}. Based on this, what would be a good way to start a conversation with them? Keep it short and natural."
-            response = generate_ai_response(prompt, username, self.config, context_monitor=self.context_monitor)
-            self.send_message(f"@{username}, {response}")
+        weight = by_favouritism(self.favouritism_scores)
+        for channel in self.channels:
+            username = self.active_chatters.sample(channel, weight=weight, exclude=(self.nick_lower,))
+            if not username:
+                continue
+            user_data = get_user(username)
+            if not user_data or user_data["message_count"] <= 5:
+                continue
+            prompt = f"You want to start a conversation with the user '{username}'. Their favouritism score is {user_data['favouritism_score']}. Based on this, what would be a good way to start a conversation with them? Keep it short and natural."
+            self.submit_ai(PRIORITY_AUTO, prompt, username, channel, wrap=lambda r, username=username: f"@{username}, {r}",
+                           site="starter")
 
         self.conversation_starter_timer = threading.Timer(self.config.get("conversation_starter_interval", 900), self.conversation_starter_task)
         self.conversation_starter_timer.start()
 
+    def favouritism_scores(self, usernames):
+        # Newcomers (five messages or fewer) are left out and get the lowest weight.
+        return {
+            username: user_data["favouritism_score"] or 0
+            for username, user_data in get_users(usernames).items()
+            if user_data["message_count"] > 5
+        }
+
     def auto_chat(self):
         if random.random() < self.config.get("auto_chat_freq", 0.2):
-            chat_history = get_recent_memory(10)
-            if len(chat_history) > 5:
+            # Each channel gets a comment on its own conversation.
+            for channel in self.channels:
+                chat_history = get_recent_memory(10, channel)
+                if len(chat_history) <= 5:
+                    continue
                 prompt = "Based on the following chat history, what would be a good comment or question to add to the conversation? Respond in 1 or 2 short sentences. Keep it short and engaging.\n\n"
                 for entry in chat_history:
                     prompt += f"{entry['user']}: {entry['message']}\n"
 
-                response = generate_ai_response(prompt, self.nick, self.config, context_monitor=self.context_monitor)
-                if len(response) > 200:
-                    response = response[:200] + "..."
-                record_message(self.nick, response)
-                self.send_message(response)
+                def _post(response, channel=channel):
+                    if not response:
+                        return
+                    if len(response) > 200:
+                        response = response[:200] + "..."
+                    record_message(self.nick, response, channel, FLAG_BOT)
+                    self.send_message(response, channel)
+                self.ai.submit(PRIORITY_AUTO, generate_ai_response, prompt, self.nick, self.config,
+                               context_monitor=self.context_monitor, site="auto", on_result=_post)
 
         self.auto_chat_timer = threading.Timer(self.config.get("auto_chat_interval", 600), self.auto_chat)
         self.auto_chat_timer.start()
 
-    def moderate_message(self, message, user, channel):
+    def check_moderation(self, msg):
         moderation_config = self.config.get("moderation", {})
+        message = msg.text
 
         # Banned words
         if moderation_config.get("banned_words"):
+            lowered = msg.text_lower
             for word in moderation_config["banned_words"]:
-                if word in message.lower():
-                    self.delete_message(user, channel)
-                    self.timeout_user(user, channel)
+                if word in lowered:
                     return True
 
         # Link filtering
         if moderation_config.get("link_filtering"):
             if "http://" in message or "https://" in message or "www." in message:
-                self.delete_message(user, channel)
-                self.timeout_user(user, channel)
                 return True
 
         # Caps filtering
         if moderation_config.get("caps_filtering"):
             if len(message) > 10 and message.isupper():
-                self.delete_message(user, channel)
-                self.timeout_user(user, channel)
                 return True
 
         return False
 
+    def moderate_message(self, msg):
+        if self.check_moderation(msg):
+            self.delete_message(msg.user, msg.channel)
+            self.timeout_user(msg.user, msg.channel)
+            return True
+        return False
+
     def delete_message(self, user, channel):
         self.send_message(f"/delete {user}")
 
@@ -917,31 +1333,44 @@ class IRCBot:
         delay_settings = self.config.get("delay_settings", {"base_delay": 1.0, "delay_per_character": 0.01})
         base_delay = delay_settings.get("base_delay", 1.0)
         delay_per_character = delay_settings.get("delay_per_character", 0.01)
+        max_bytes = self.config.get("max_message_bytes", 500)
 
-        # Split by paragraphs first for natural pauses
-        paragraphs = msg.split("\n")
-        for paragraph in paragraphs:
-            # Split into 500-character chunks
-            chunks = textwrap.wrap(paragraph, width=500, replace_whitespace=False)
-
-            target_channels = [channel] if channel else self.channels
-
-            for ch in target_channels:
-                for chunk in chunks:
-                    delay = base_delay + (len(chunk) * delay_per_character)
-                    threading.Thread(target=self._send_message_chunk, args=(ch, chunk, delay)).start()
+        target_channels = [channel] if channel else self.channels
 
-    def _send_message_chunk(self, channel, chunk, delay):
-        try:
-            time.sleep(delay)
-            with self.sock_lock:
-                self.sock.send(f"PRIVMSG #{channel} :{chunk}\r\n".encode("utf-8"))
-            print(f"[BOT] Sent to #{channel}: {chunk}")
-        except Exception as e:
-            print(f"[ERROR] Sending message failed: {e}")
-
-    def get_status_snapshot(self):
+        # Split by paragraphs first for natural pauses
+        for paragraph in msg.split("\n"):
+            for chunk in chunk_message(paragraph, max_bytes):
+                # Typing delay is a hint: the scheduler applies it per channel, after the previous chunk.
+                delay = base_delay + (len(chunk) * delay_per_character)
+                for ch in target_channels:
+                    self.outbound.enqueue(ch, chunk, delay)
+
+    def get_status_snapshot(self, since=None):
+        """Live dashboard state. With since (a chat sequence number), chat_history holds only newer messages."""
+        seq = MEMORY.seq  # read first, so a message landing meanwhile is sent again rather than skipped
+        chat = get_recent_memory(50) if since is None else MEMORY.since(since, limit=50)
         return {
-            "chat_history": get_recent_memory(50),
-            "captions": self.context_monitor.context_buffer if self.context_monitor else []
+            "chat_history": [record.to_dict() for record in chat],
+            "chat_seq": seq,
+            "chat_delta": since is not None,
+            "chat_memory": MEMORY.stats(),
+            "retrieval": RETRIEVAL.stats() if RETRIEVAL is not None else {},
+            "chat_log": CHAT_LOG.stats() if CHAT_LOG is not None else {},
+            "captions": self.context_monitor.context_buffer if self.context_monitor else [],
+            "caption_reader": self.context_monitor.stats() if self.context_monitor else {},
+            "connection": self.sock.health(),
+            "work_queue": self.work_queue.stats(),
+            "active_chatters": self.active_chatters.stats(),
+            "http": http_client.stats(),
+            "ai": self.ai.stats(),
+            "model": model_client_stats(),
+            "routes": route_stats(),
+            "keys": key_pool_stats(),
+            "response_cache": response_cache_stats(),
+            "prompts": prompt_stats(),
+            "streaming": dict(self.stream_stats_snapshot(), model=stream_stats()),
+            "search_cache": search_cache_stats(),
+            "facts": self.fact_pipeline.stats(),
+            "sentiment": dict(self.sentiment_stats_snapshot(), batches=self.sentiment_batcher.stats()),
+            "outbound": self.outbound.stats()
         }
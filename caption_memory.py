@@ -0,0 +1,169 @@
+import collections
+import threading
+import time
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "recent_lines": 12,      # newest lines kept verbatim in the context block
+    "window_chars": 1500,    # unsummarized text (beyond the recent lines) that triggers a summary
+    "summary_chars": 100,    # target length of each summary
+    "fanout": 3,             # summaries per level before the oldest are merged one level up
+    "levels": 3,             # the top level folds into a single whole-stream summary
+    "retry_after": 60.0,     # seconds to wait after a failed summary
+}
+
+class _Summary:
+    __slots__ = ("start", "end", "text")
+
+    def __init__(self, start, end, text):
+        self.start = start
+        self.end = end
+        self.text = text
+
+def _ago(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60}h{minutes % 60:02d}"
+
+class CaptionMemory:
+    """Recent caption lines verbatim, older ones condensed into a hierarchy of summaries.
+
+    Lines older than the last recent_lines wait until window_chars of them
+    have built up, then a background job (run through submit) condenses them
+    into a level-0 summary. When a level holds more than fanout summaries
+    the oldest fanout are condensed into one on the next level; the top level
+    folds into a single summary of everything before it. The context block
+    is therefore bounded by levels * fanout summaries plus recent_lines,
+    however long the stream runs. Lines between the newest summary and the
+    recent ones are left out of it until they are summarized.
+
+    summarize(text, max_chars) returns the summary, or "" on failure, in
+    which case the text is kept and retried after retry_after seconds.
+    submit(fn, on_dropped) runs fn in the background; it returns False if
+    the job was shed, and calls on_dropped() if it is discarded unrun later.
+    """
+
+    def __init__(self, summarize, submit=None, **settings):
+        self.summarize = summarize
+        self.submit = submit or (lambda fn, on_dropped: threading.Thread(target=fn, daemon=True).start())
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.lock = threading.Lock()
+        self.pending = collections.deque()  # (unix time, line) not yet summarized
+        self.pending_chars = 0
+        self.levels = [[] for _ in range(self.settings["levels"])]
+        self.running = False
+        self.retry_at = 0.0
+        self.summaries = 0
+        self.merges = 0
+        self.failures = 0
+        self.dropped_lines = 0
+
+    def add(self, lines, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            for line in lines:
+                self.pending.append((now, line))
+                self.pending_chars += len(line) + 1
+            # If summaries keep failing, don't let the backlog grow without bound.
+            while self.pending_chars > 5 * self.settings["window_chars"] and len(self.pending) > 1:
+                _, line = self.pending.popleft()
+                self.pending_chars -= len(line) + 1
+                self.dropped_lines += 1
+        self._maybe_schedule()
+
+    def _older_chars(self):
+        recent = min(self.settings["recent_lines"], len(self.pending))
+        return self.pending_chars - sum(len(self.pending[-i][1]) + 1 for i in range(1, recent + 1))
+
+    def _maybe_schedule(self):
+        with self.lock:
+            if self.running or time.monotonic() < self.retry_at:
+                return
+            if self._older_chars() < self.settings["window_chars"]:
+                return
+            self.running = True
+        if self.submit(self.condense, self._dropped) is False:  # shed by a full queue
+            self._dropped()
+
+    def _dropped(self):
+        # The job will never run (e.g. it expired in a busy queue), so let the next add() schedule another.
+        with self.lock:
+            self.running = False
+
+    def condense(self):
+        """Summarizes one window of older lines, then merges levels that overflowed."""
+        try:
+            with self.lock:
+                batch = []
+                chars = 0
+                while len(self.pending) > self.settings["recent_lines"] and chars < self.settings["window_chars"]:
+                    stamp, line = self.pending.popleft()
+                    batch.append((stamp, line))
+                    chars += len(line) + 1
+                self.pending_chars -= chars
+            if not batch:
+                return
+            text = self.summarize("\n".join(line for _, line in batch), self.settings["summary_chars"])
+            if not text:
+                with self.lock:
+                    self.pending.extendleft(reversed(batch))
+                    self.pending_chars += sum(len(line) + 1 for _, line in batch)
+                self._failed()
+                return
+            with self.lock:
+                self.levels[0].append(_Summary(batch[0][0], batch[-1][0], text.strip()))
+                self.summaries += 1
+            self._merge()
+        finally:
+            with self.lock:
+                self.running = False
+        self._maybe_schedule()
+
+    def _merge(self):
+        fanout = self.settings["fanout"]
+        for level, summaries in enumerate(self.levels):
+            top = level == len(self.levels) - 1
+            with self.lock:
+                if len(summaries) <= fanout:
+                    continue
+                group = list(summaries) if top else summaries[:fanout]
+            text = self.summarize("\n".join(s.text for s in group), self.settings["summary_chars"])
+            if not text:
+                self._failed()
+                return
+            merged = _Summary(group[0].start, group[-1].end, text.strip())
+            with self.lock:
+                del summaries[:len(group)]
+                if top:
+                    summaries.insert(0, merged)
+                else:
+                    self.levels[level + 1].append(merged)
+                self.merges += 1
+
+    def _failed(self):
+        with self.lock:
+            self.failures += 1
+            self.retry_at = time.monotonic() + self.settings["retry_after"]
+
+    def context_lines(self, now=None):
+        """Summaries oldest first, then the recent lines verbatim."""
+        now = time.time() if now is None else now
+        with self.lock:
+            lines = [
+                f"[{_ago(now - s.start)} to {_ago(now - s.end)} ago] {s.text}"
+                for level in reversed(self.levels) for s in level
+            ]
+            recent = list(self.pending)[-self.settings["recent_lines"]:]
+        return lines + [line for _, line in recent]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "summaries": self.summaries,
+                "merges": self.merges,
+                "failures": self.failures,
+                "dropped_lines": self.dropped_lines,
+                "pending_lines": len(self.pending),
+                "levels": [len(level) for level in self.levels],
+            }
@@ -0,0 +1,204 @@
+import collections
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+class TailReader:
+    """Reads only what was appended to a growing text file since the last read().
+
+    Remembers its byte offset and carries an unterminated last line over to
+    the next read. A file that shrank, or whose bytes just before the offset
+    changed, was truncated or rewritten and is read again from the start; a
+    different inode means it was rotated, and the new file is read from the
+    start. The file is opened per read rather than held, so writers on
+    Windows can still rename or delete it. The first read only looks at the
+    last backlog_bytes of an existing file.
+    """
+
+    SIGNATURE_BYTES = 64
+
+    def __init__(self, path, backlog_bytes=64 * 1024, max_line_bytes=64 * 1024):
+        self.path = path
+        self.backlog_bytes = backlog_bytes
+        self.max_line_bytes = max_line_bytes
+        self.identity = None   # (st_dev, st_ino) of the file being followed
+        self.mtime_ns = None
+        self.offset = 0
+        self.signature = b""   # the bytes just before offset, to spot rewrites
+        self.partial = b""
+        self.bytes_read = 0
+        self.truncations = 0
+        self.rotations = 0
+
+    def read(self):
+        """Complete new lines (stripped, non-empty) since the last call."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        identity = (st.st_dev, st.st_ino)
+        if identity != self.identity:
+            first = self.identity is None
+            if not first:
+                self.rotations += 1
+            self.identity = identity
+            self._restart(max(st.st_size - self.backlog_bytes, 0) if first else 0)
+        elif st.st_mtime_ns == self.mtime_ns and st.st_size == self.offset:
+            return []
+        self.mtime_ns = st.st_mtime_ns
+
+        with open(self.path, "rb") as f:
+            if st.st_size < self.offset or not self._signature_matches(f):
+                self.truncations += 1
+                self._restart(0)
+            skip_partial = self.offset > 0 and not self.signature
+            f.seek(self.offset)
+            data = f.read()
+        if not data:
+            return []
+        self.offset += len(data)
+        self.bytes_read += len(data)
+        self.signature = (self.signature + data)[-self.SIGNATURE_BYTES:]
+        if skip_partial:
+            # Started mid-file: the first line is probably cut, drop it.
+            data = data.split(b"\n", 1)[1] if b"\n" in data else b""
+        return self._split(data)
+
+    def _restart(self, offset):
+        self.offset = offset
+        self.signature = b""
+        self.partial = b""
+
+    def _signature_matches(self, f):
+        if not self.signature:
+            return True
+        f.seek(self.offset - len(self.signature))
+        return f.read(len(self.signature)) == self.signature
+
+    def _split(self, data):
+        *complete, self.partial = (self.partial + data).split(b"\n")
+        if len(self.partial) > self.max_line_bytes:
+            complete.append(self.partial)
+            self.partial = b""
+        lines = (raw.decode("utf-8", errors="ignore").strip() for raw in complete)
+        return [line for line in lines if line]
+
+    def stats(self):
+        return {
+            "offset": self.offset,
+            "bytes_read": self.bytes_read,
+            "truncations": self.truncations,
+            "rotations": self.rotations,
+        }
+
+class PollWatcher:
+    kind = "polling"
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+
+    def wait(self):
+        time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """Blocks until the file's directory reports a change to that file (Linux inotify via ctypes).
+
+    The directory is watched, not the file, so a rotated or recreated file
+    still wakes us. wait() also returns after safety_interval seconds.
+    """
+    kind = "inotify"
+
+    def __init__(self, path, safety_interval=5.0):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self.name = os.fsencode(os.path.basename(path))
+        self.safety_interval = safety_interval
+
+    def wait(self):
+        deadline = time.monotonic() + self.safety_interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return
+            if self._drain():
+                return
+
+    def _drain(self):
+        """Reads pending events; True if any concern our file."""
+        ours = False
+        try:
+            while True:
+                buffer = os.read(self.fd, 4096)
+                position = 0
+                while position + _EVENT_HEADER.size <= len(buffer):
+                    _, _, _, length = _EVENT_HEADER.unpack_from(buffer, position)
+                    position += _EVENT_HEADER.size
+                    name = buffer[position:position + length].rstrip(b"\0")
+                    position += length
+                    ours = ours or name == self.name
+        except BlockingIOError:
+            pass
+        return ours
+
+    def close(self):
+        os.close(self.fd)
+
+def make_watcher(path, poll_interval=1.0):
+    """inotify on Linux when it can be set up, otherwise polling every poll_interval seconds."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            print(f"[CAPTIONS] inotify unavailable ({e}); polling instead")
+    return PollWatcher(poll_interval)
+
+class CaptionRing:
+    """The last max_lines caption lines with the time each was read."""
+
+    def __init__(self, max_lines=20):
+        self.lock = threading.Lock()
+        self.entries = collections.deque(maxlen=max_lines)  # (unix time, line)
+        self.total = 0
+
+    def extend(self, lines, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.entries.extend((now, line) for line in lines)
+            self.total += len(lines)
+
+    def lines(self):
+        with self.lock:
+            return [line for _, line in self.entries]
+
+    def recent(self, seconds, now=None):
+        """Lines read in the last seconds."""
+        cutoff = (time.time() if now is None else now) - seconds
+        with self.lock:
+            return [line for stamp, line in self.entries if stamp >= cutoff]
@@ -0,0 +1,123 @@
+import collections
+import itertools
+import sys
+import threading
+import time
+
+FLAG_BOT = 1       # sent by the bot itself
+FLAG_COMMAND = 2   # a !command
+FLAG_MENTION = 4   # mentions the bot
+
+class ChatRecord:
+    """One chat message. Supports record["user"] / record["message"] like the dicts it replaces."""
+    __slots__ = ("seq", "user", "channel", "text", "timestamp", "flags")
+
+    _KEYS = {"user": "user", "message": "text", "channel": "channel", "timestamp": "timestamp", "seq": "seq"}
+
+    def __init__(self, seq, user, channel, text, timestamp, flags=0):
+        self.seq = seq
+        self.user = user
+        self.channel = channel
+        self.text = text
+        self.timestamp = timestamp
+        self.flags = flags
+
+    def __getitem__(self, key):
+        return getattr(self, self._KEYS[key])
+
+    def get(self, key, default=None):
+        return getattr(self, self._KEYS[key]) if key in self._KEYS else default
+
+    def to_dict(self):
+        return {"seq": self.seq, "user": self.user, "channel": self.channel, "message": self.text,
+                "timestamp": self.timestamp, "flags": self.flags}
+
+    def __repr__(self):
+        return f"ChatRecord({self.seq}, {self.channel!r}, {self.user!r}, {self.text!r})"
+
+def _last(ring, k):
+    """The last k items of a deque, oldest first, without copying the rest."""
+    if k <= 0:
+        return []
+    items = list(itertools.islice(reversed(ring), k))
+    items.reverse()
+    return items
+
+class ChatHistory:
+    """Per-channel ring buffers of recent chat, plus one across all channels.
+
+    Appends are O(1); recent(k) is O(k). Usernames and channel names are
+    interned, so thousands of records from the same chatters share their
+    strings. Every record gets a sequence number, so readers can ask for
+    just what arrived since they last looked (since()).
+    """
+
+    def __init__(self, capacity=100, capacities=None):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.capacities = dict(capacities or {})
+        self.channels = {}
+        self.all = collections.deque(maxlen=capacity)
+        self.seq = 0
+
+    def configure(self, capacity=None, capacities=None):
+        with self.lock:
+            if capacity is not None:
+                self.capacity = capacity
+                self.all = collections.deque(self.all, maxlen=capacity)
+            if capacities is not None:
+                self.capacities = dict(capacities)
+            for channel, ring in self.channels.items():
+                self.channels[channel] = collections.deque(ring, maxlen=self._capacity(channel))
+
+    def _capacity(self, channel):
+        return self.capacities.get(channel, self.capacity)
+
+    def append(self, user, text, channel=None, flags=0, timestamp=None):
+        user = sys.intern(user)
+        channel = sys.intern(channel) if channel else None
+        with self.lock:
+            self.seq += 1
+            record = ChatRecord(self.seq, user, channel, text, time.time() if timestamp is None else timestamp, flags)
+            self.all.append(record)
+            if channel is not None:
+                ring = self.channels.get(channel)
+                if ring is None:
+                    ring = self.channels[channel] = collections.deque(maxlen=self._capacity(channel))
+                ring.append(record)
+        return record
+
+    def recent(self, k=5, channel=None):
+        """The last k records in channel (or across all channels), oldest first."""
+        with self.lock:
+            ring = self.all if channel is None else self.channels.get(channel, ())
+            return _last(ring, k)
+
+    def since(self, seq, channel=None, limit=None):
+        """Records newer than seq, oldest first (at most limit, the newest ones)."""
+        with self.lock:
+            ring = self.all if channel is None else self.channels.get(channel, ())
+            newer = []
+            for record in reversed(ring):
+                if record.seq <= seq or (limit is not None and len(newer) >= limit):
+                    break
+                newer.append(record)
+        newer.reverse()
+        return newer
+
+    def clear(self):
+        with self.lock:
+            self.channels.clear()
+            self.all.clear()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.all)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "seq": self.seq,
+                "capacity": self.capacity,
+                "channels": {channel: len(ring) for channel, ring in self.channels.items()},
+            }
@@ -0,0 +1,350 @@
+import bisect
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+DEFAULT_SETTINGS = {
+    "directory": "chat_log",
+    "segment_bytes": 8 << 20,    # a new segment file is started past this size
+    "index_interval": 4096,      # bytes between sparse index entries
+    "flush_interval": 1.0,       # seconds a record may wait before its batch is written and fsynced
+    "max_batch": 1000,           # queued entries that trigger a write before flush_interval
+    "max_segments": 64,          # oldest segments are deleted beyond this; 0 keeps everything
+}
+
+# Record: header (payload length, timestamp), JSON payload, trailer (crc32 of header + payload, payload length).
+# The trailer repeats the length so the log can also be walked backwards from the end.
+_HEADER = struct.Struct("<Id")
+_TRAILER = struct.Struct("<II")
+_INDEX = struct.Struct("<dQ")    # (timestamp, offset of the first record at or after it)
+_FRAMING = _HEADER.size + _TRAILER.size
+
+LogEntry = collections.namedtuple("LogEntry", "timestamp kind channel user text flags")
+
+def encode(entry):
+    payload = json.dumps([entry.kind, entry.channel, entry.user, entry.text, entry.flags],
+                         ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    head = _HEADER.pack(len(payload), entry.timestamp) + payload
+    return head + _TRAILER.pack(zlib.crc32(head), len(payload))
+
+def _decode(buf, start, length, timestamp):
+    kind, channel, user, text, flags = json.loads(buf[start + _HEADER.size:start + _HEADER.size + length])
+    return LogEntry(timestamp, kind, channel, user, text, flags)
+
+def _check(buf, start, length):
+    end = start + _HEADER.size + length
+    crc, trailer_length = _TRAILER.unpack_from(buf, end)
+    return trailer_length == length and crc == zlib.crc32(buf[start:end])
+
+def scan(buf, offset, end):
+    """(offset, timestamp, length) of each intact record from offset; stops at the first torn or corrupt one."""
+    while offset + _FRAMING <= end:
+        length, timestamp = _HEADER.unpack_from(buf, offset)
+        if offset + _FRAMING + length > end or not _check(buf, offset, length):
+            return
+        yield offset, timestamp, length
+        offset += _FRAMING + length
+
+def scan_backward(buf, end):
+    """Like scan, newest first, walking back from end."""
+    while end >= _FRAMING:
+        _, length = _TRAILER.unpack_from(buf, end - _TRAILER.size)
+        start = end - _FRAMING - length
+        if start < 0 or _HEADER.unpack_from(buf, start)[0] != length or not _check(buf, start, length):
+            return
+        yield start, _HEADER.unpack_from(buf, start)[1], length
+        end = start
+
+class _Segment:
+    def __init__(self, number, directory):
+        self.number = number
+        self.path = os.path.join(directory, f"{number:08d}.log")
+        self.index_path = os.path.join(directory, f"{number:08d}.idx")
+        self.times = []      # sparse index, in memory
+        self.offsets = []
+        self.size = 0        # bytes written and fsynced; readers never look past this
+
+    def load(self, index_interval):
+        """Reads the index, then checks the log after its last entry: a torn tail is cut off, missing entries are added."""
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        size = os.path.getsize(self.path)
+        for timestamp, offset in _INDEX.iter_unpack(data[:len(data) - len(data) % _INDEX.size]):
+            if offset >= size:
+                break
+            self.times.append(timestamp)
+            self.offsets.append(offset)
+        start = self.offsets[-1] if self.offsets else 0
+        end = start
+        added = False
+        if size:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for offset, timestamp, length in scan(buf, start, size):
+                    if not self.offsets or offset - self.offsets[-1] >= index_interval:
+                        self.times.append(timestamp)
+                        self.offsets.append(offset)
+                        added = True
+                    end = offset + _FRAMING + length
+        if end < size:
+            print(f"[CHAT LOG] Dropping {size - end} torn bytes at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        if added or len(data) != len(self.offsets) * _INDEX.size:
+            with open(self.index_path, "wb") as f:
+                f.write(b"".join(_INDEX.pack(t, o) for t, o in zip(self.times, self.offsets)))
+        self.size = end
+
+    def delete(self):
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class ChatLog:
+    """Append-only, segmented on-disk log of chat messages and channel events.
+
+    append() only queues; a background thread writes each batch and fsyncs
+    once per batch, so a crash loses at most flush_interval seconds.
+    The log rolls into numbered segment files of about segment_bytes, each
+    with a sparse (timestamp, offset) index every index_interval bytes, so
+    read_range() memory-maps just the segments it needs and starts from the
+    nearest index entry. Every record carries its length at both ends and a
+    CRC, so tail() reads backwards from the end and a torn final write is
+    detected and cut off when the log is reopened.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.directory = self.settings["directory"]
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()  # segment list and sizes, shared with readers
+        self.segments = []
+        numbers = sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                         if name.endswith(".log") and name[:-4].isdigit())
+        for number in numbers:
+            segment = _Segment(number, self.directory)
+            segment.load(self.settings["index_interval"])
+            self.segments.append(segment)
+        if not self.segments:
+            self.segments.append(_Segment(0, self.directory))
+        self.file = open(self.segments[-1].path, "ab")
+        self.index_file = open(self.segments[-1].index_path, "ab")
+        self.records = 0
+        self.bytes = 0
+        self.fsyncs = 0
+        self.rolls = 0
+        self.write_errors = 0
+        self.cond = threading.Condition()
+        self.queue = []
+        self.oldest = None
+        self.queued = 0      # entries appended so far
+        self.done = 0        # entries the writer has finished with
+        self.flushing = False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="chat-log", daemon=True)
+        self.thread.start()
+
+    def append(self, kind, channel, user, text, flags=0, timestamp=None):
+        entry = LogEntry(time.time() if timestamp is None else timestamp, kind, channel, user, text, flags)
+        with self.cond:
+            if not self.queue:
+                self.oldest = time.monotonic()
+            self.queue.append(entry)
+            self.queued += 1
+            if len(self.queue) == 1 or len(self.queue) >= self.settings["max_batch"]:
+                self.cond.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Waits until everything appended so far is written and fsynced."""
+        with self.cond:
+            target = self.queued
+            self.flushing = True
+            self.cond.notify_all()
+            return self.cond.wait_for(lambda: self.done >= target, timeout)
+
+    def close(self):
+        self.flush()
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join()
+        self.file.close()
+        self.index_file.close()
+
+    def _run(self):
+        # The only writer, so entries reach the file in append order.
+        while True:
+            with self.cond:
+                while self.running:
+                    if len(self.queue) >= self.settings["max_batch"] or (self.queue and self.flushing):
+                        break
+                    if self.queue:
+                        remaining = self.oldest + self.settings["flush_interval"] - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.cond.wait(timeout=remaining)
+                    else:
+                        self.flushing = False
+                        self.cond.wait()
+                if not self.running and not self.queue:
+                    return
+                batch, self.queue = self.queue, []
+            self._write(batch)
+            with self.cond:
+                self.done += len(batch)
+                self.cond.notify_all()
+
+    def _write(self, batch):
+        records, written = self.records, self.bytes
+        try:
+            for entry in batch:
+                self._write_one(encode(entry), entry.timestamp)
+            self._sync()
+        except (OSError, ValueError) as e:  # ValueError: the file could not be reopened after an earlier failure
+            self.write_errors += 1
+            self.records, self.bytes = records, written
+            print(f"[CHAT LOG] Write of {len(batch)} records failed: {e}")
+            self._rewind()
+
+    def _rewind(self):
+        """Cuts the active segment back to its last fsynced size, so a partly written batch can't hide later ones."""
+        segment = self.segments[-1]
+        for f in (self.file, self.index_file):
+            try:
+                f.close()  # discards whatever is still buffered
+            except OSError:
+                pass
+        with self.lock:
+            keep = bisect.bisect_left(segment.offsets, segment.size)
+            del segment.times[keep:]
+            del segment.offsets[keep:]
+        try:
+            with open(segment.path, "r+b") as f:
+                f.truncate(segment.size)
+            with open(segment.index_path, "wb") as f:
+                f.write(b"".join(_INDEX.pack(t, o) for t, o in zip(segment.times, segment.offsets)))
+            self.file = open(segment.path, "ab")
+            self.index_file = open(segment.index_path, "ab")
+        except OSError as e:
+            print(f"[CHAT LOG] Could not reset {segment.path}: {e}")
+
+    def _write_one(self, data, timestamp):
+        segment = self.segments[-1]
+        offset = self.file.tell()
+        if offset and offset + len(data) > self.settings["segment_bytes"]:
+            self._roll()
+            segment, offset = self.segments[-1], 0
+        if not segment.offsets or offset - segment.offsets[-1] >= self.settings["index_interval"]:
+            self.index_file.write(_INDEX.pack(timestamp, offset))
+            with self.lock:
+                segment.times.append(timestamp)
+                segment.offsets.append(offset)
+        self.file.write(data)
+        self.records += 1
+        self.bytes += len(data)
+
+    def _sync(self):
+        self.file.flush()
+        self.index_file.flush()
+        os.fsync(self.file.fileno())
+        self.fsyncs += 1
+        with self.lock:
+            self.segments[-1].size = self.file.tell()
+
+    def _roll(self):
+        self._sync()
+        os.fsync(self.index_file.fileno())
+        self.file.close()
+        self.index_file.close()
+        segment = _Segment(self.segments[-1].number + 1, self.directory)
+        self.file = open(segment.path, "ab")
+        self.index_file = open(segment.index_path, "ab")
+        self.rolls += 1
+        with self.lock:
+            self.segments.append(segment)
+            limit = self.settings["max_segments"]
+            dropped = self.segments[:-limit] if limit and len(self.segments) > limit else []
+            del self.segments[:len(dropped)]
+        for old in dropped:
+            old.delete()
+
+    def _readable(self):
+        with self.lock:
+            return [(s, s.size, list(s.times), list(s.offsets)) for s in self.segments if s.size]
+
+    def read_range(self, start, end=None, channel=None, kinds=None):
+        """Entries with start <= timestamp <= end, oldest first; optionally one channel and/or some kinds.
+
+        Only segments overlapping the range are opened, each from the last index
+        entry before start. Entries still queued for writing are not included.
+        """
+        end = float("inf") if end is None else end
+        segments = self._readable()
+        entries = []
+        for i, (segment, size, times, offsets) in enumerate(segments):
+            if times[0] > end:
+                break
+            if i + 1 < len(segments) and segments[i + 1][2][0] < start:
+                continue
+            offset = offsets[max(bisect.bisect_right(times, start) - 1, 0)]
+            with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buf:
+                for record_start, timestamp, length in scan(buf, offset, size):
+                    if timestamp > end:
+                        return entries
+                    if timestamp < start:
+                        continue
+                    entry = _decode(buf, record_start, length, timestamp)
+                    if (channel is None or entry.channel == channel) and (kinds is None or entry.kind in kinds):
+                        entries.append(entry)
+        return entries
+
+    def tail(self, per_channel, channels=None, kinds=("chat",), max_records=100000):
+        """The newest per_channel entries of each channel, as {channel: [entries oldest first]}.
+
+        Reads backwards from the end of the log, stopping once every channel in
+        channels is full (or after max_records entries when channels is None).
+        """
+        wanted = set(channels) if channels is not None else None
+        found = collections.defaultdict(list)
+        full = 0
+        for seen, entry in enumerate(self._backward()):
+            if seen >= max_records:
+                break
+            if entry.kind not in kinds or (wanted is not None and entry.channel not in wanted):
+                continue
+            bucket = found[entry.channel]
+            if len(bucket) < per_channel:
+                bucket.append(entry)
+                full += len(bucket) == per_channel
+                if wanted is not None and full == len(wanted):
+                    break
+        return {channel: bucket[::-1] for channel, bucket in found.items()}
+
+    def _backward(self):
+        for segment, size, _, _ in reversed(self._readable()):
+            with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buf:
+                for record_start, timestamp, length in scan_backward(buf, size):
+                    yield _decode(buf, record_start, length, timestamp)
+
+    def stats(self):
+        with self.lock:
+            segments = len(self.segments)
+            size = sum(s.size for s in self.segments)
+        return {
+            "segments": segments,
+            "bytes_on_disk": size,
+            "records_written": self.records,
+            "fsyncs": self.fsyncs,
+            "rolls": self.rolls,
+            "write_errors": self.write_errors,
+            "pending": self.queued - self.done,
+        }
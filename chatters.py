@@ -0,0 +1,134 @@
+import collections
+import random
+import threading
+import time
+
+class _Partition:
+    __slots__ = ("recency", "members", "positions")
+
+    def __init__(self):
+        self.recency = collections.OrderedDict()  # user -> [last_seen, messages], oldest first
+        self.members = []                         # dense list for O(1) random picks
+        self.positions = {}                       # user -> index in members
+
+    def add(self, user, now):
+        entry = self.recency.get(user)
+        if entry is None:
+            self.recency[user] = [now, 1]
+            self.positions[user] = len(self.members)
+            self.members.append(user)
+        else:
+            entry[0] = now
+            entry[1] += 1
+            self.recency.move_to_end(user)
+
+    def remove(self, user):
+        del self.recency[user]
+        index = self.positions.pop(user)
+        last = self.members.pop()
+        if last != user:
+            self.members[index] = last
+            self.positions[last] = index
+
+    def expire(self, cutoff):
+        while self.recency:
+            user, entry = next(iter(self.recency.items()))
+            if entry[0] >= cutoff:
+                break
+            self.remove(user)
+
+class ActiveChatterIndex:
+    """Chatters seen within the activity window, partitioned by channel.
+
+    Updated from the message path; sampling picks a random member in O(1)
+    and optional weights are applied by rejection sampling. Weight functions
+    take a list of (user, messages_in_window) pairs and return one value in
+    [0, 1] per pair, so a database-backed weight costs one lookup per call.
+    """
+
+    def __init__(self, window=3600, max_attempts=50):
+        self.window = window
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.partitions = {}
+
+    def touch(self, channel, user, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            partition = self.partitions.get(channel)
+            if partition is None:
+                partition = self.partitions[channel] = _Partition()
+            partition.add(user, now)
+            partition.expire(now - self.window)
+
+    def active(self, channel, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            partition = self.partitions.get(channel)
+            if partition is None:
+                return []
+            partition.expire(now - self.window)
+            return list(reversed(partition.recency))
+
+    def _snapshot(self, channel, now, picks=None):
+        """Return (user, messages) pairs: `picks` random members, or everyone if picks is None."""
+        with self.lock:
+            partition = self.partitions.get(channel)
+            if partition is None:
+                return []
+            partition.expire(now - self.window)
+            if not partition.members:
+                return []
+            if picks is None:
+                return [(user, entry[1]) for user, entry in partition.recency.items()]
+            members = partition.members
+            recency = partition.recency
+            return [(user, recency[user][1]) for user in (random.choice(members) for _ in range(picks))]
+
+    def sample(self, channel, weight=None, min_messages=1, exclude=(), now=None):
+        """Pick one active chatter in channel, or None if nobody qualifies."""
+        now = time.time() if now is None else now
+        # Weights may hit the database, so they are evaluated outside the lock.
+        picks = [
+            (user, messages) for user, messages in self._snapshot(channel, now, self.max_attempts)
+            if messages >= min_messages and user not in exclude
+        ]
+        if picks:
+            if weight is None:
+                return picks[0][0]
+            for (user, _), chance in zip(picks, weight(picks)):
+                if random.random() < chance:
+                    return user
+
+        # Rejection sampling kept missing (tiny weights or few eligible users); fall back to a full pass.
+        eligible = [
+            (user, messages) for user, messages in self._snapshot(channel, now)
+            if messages >= min_messages and user not in exclude
+        ]
+        if not eligible:
+            return None
+        if weight is None:
+            return random.choice(eligible)[0]
+        weights = weight(eligible)
+        if not any(weights):
+            return None
+        return random.choices([user for user, _ in eligible], weights=weights)[0]
+
+    def stats(self):
+        with self.lock:
+            return {channel: len(partition.members) for channel, partition in self.partitions.items()}
+
+def by_activity(cap=20):
+    """Weight chatters by how many messages they sent in the window."""
+    return lambda pairs: [min(messages, cap) / cap for _, messages in pairs]
+
+def by_favouritism(scores_for, cap=50):
+    """Weight chatters by favouritism score, mapped from [-cap, cap] onto [0, 1].
+
+    scores_for takes a list of users and returns {user: score}; users it
+    leaves out get the lowest weight.
+    """
+    def weight(pairs):
+        scores = scores_for(list({user for user, _ in pairs}))
+        return [(max(-cap, min(cap, scores.get(user, -cap))) + cap) / (2 * cap) for user, _ in pairs]
+    return weight
@@ -1,8 +1,9 @@
 from flask import Flask, render_template
 from flask_socketio import SocketIO, emit
 import json
-from ai_client import generate_ai_response
-from database import get_db_connection, set_favouritism_score, set_user_facts
+from ai_client import generate_ai_response, invalidate_response_cache
+from ai_executor import PRIORITY_REPLY
+from database import get_all_users, get_all_user_facts, set_favouritism_score, set_user_facts
 
 CONFIG_FILE = "bot_config.json"
 
@@ -53,6 +54,7 @@ def create_dashboard_app(bot):
         # Update the bot's config as well
         bot.config["personality"] = config["personality"]
         bot.config["auto_chat_freq"] = config["auto_chat_freq"]
+        invalidate_response_cache()
 
 
     @socketio.on("send_message")
@@ -60,8 +62,8 @@ def create_dashboard_app(bot):
         msg = data.get("message")
         if msg and bot:
             config = load_config()
-            rewritten = generate_ai_response(f"Rewrite this in my personality: {msg}", bot.nick, config)
-            bot.send_message(rewritten)
+            bot.ai.submit(PRIORITY_REPLY, generate_ai_response, f"Rewrite this in my personality: {msg}", bot.nick, config,
+                          site="dashboard", on_result=bot.send_message)
 
     @socketio.on("update_socials")
     def handle_update_socials(data):
@@ -92,6 +94,7 @@ def create_dashboard_app(bot):
         emit("config_updated", config, broadcast=True)
         # Update the bot's config as well
         bot.config["personality_traits"] = config["personality_traits"]
+        invalidate_response_cache()
 
     @socketio.on("update_delay_settings")
     def handle_update_delay_settings(data):
@@ -112,13 +115,19 @@ def create_dashboard_app(bot):
         emit("config_updated", config, broadcast=True)
         # Update the bot's config as well
         bot.config["max_response_length"] = config["max_response_length"]
+        invalidate_response_cache()
 
     @socketio.on("get_user_data")
     def handle_get_user_data():
-        conn = get_db_connection()
-        users = conn.execute("SELECT * FROM users").fetchall()
-        conn.close()
-        emit("user_data", {user["username"]: dict(user) for user in users})
+        users = get_all_users()
+        facts = get_all_user_facts()
+        user_data = {}
+        for user in users:
+            entry = dict(user)
+            # The dashboard edits facts as a JSON list string.
+            entry["facts"] = json.dumps(facts.get(user["username"], []))
+            user_data[user["username"]] = entry
+        emit("user_data", user_data)
 
     @socketio.on("update_favouritism_score")
     def handle_update_favouritism_score(data):
@@ -147,9 +156,10 @@ def create_dashboard_app(bot):
         bot.config["conversation_starter"] = config["conversation_starter"]
 
     @socketio.on("get_live_context")
-    def handle_get_live_context():
+    def handle_get_live_context(data=None):
         if bot:
-            snapshot = bot.get_status_snapshot()
+            # The page passes the last chat sequence number it has, to get only newer messages.
+            snapshot = bot.get_status_snapshot(since=(data or {}).get("since"))
             emit("live_context_update", snapshot)
 
     app.debug = True
@@ -1,110 +1,530 @@
 import sqlite3
 import datetime
 import json
+import threading
+import time
+import atexit
+import queue
+from contextlib import contextmanager
 
 DB_FILE = "bot_memory.db"
+USER_STATS_FLUSH_INTERVAL = 5.0
+MAX_FACTS_PER_USER = 20
+FACT_INSERT_BATCH = 100  # rows per multi-row INSERT, well under SQLite's bound-parameter limit
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses them.
+SELECT_USER = "SELECT * FROM users WHERE username = ?"
+SELECT_USERS = "SELECT * FROM users WHERE username IN ({})"
+SELECT_ALL_USERS = "SELECT * FROM users"
+SET_FAVOURITISM_SCORE = "UPDATE users SET favouritism_score = ? WHERE username = ?"
+SELECT_USER_FACTS = "SELECT id, fact, fact_key FROM user_facts WHERE username = ? ORDER BY last_used DESC, id DESC LIMIT ?"
+SELECT_ALL_USER_FACTS = "SELECT username, fact FROM user_facts ORDER BY username, created_at, id"
+TOUCH_USER_FACT = "UPDATE user_facts SET last_used = ? WHERE username = ? AND fact_key = ?"
+DELETE_USER_FACT = "DELETE FROM user_facts WHERE username = ? AND fact_key = ?"
+RENAME_USER_FACT = "UPDATE user_facts SET fact = ? WHERE username = ? AND fact_key = ?"
+EVICT_USER_FACTS = """
+    DELETE FROM user_facts WHERE username = ? AND id NOT IN (
+        SELECT id FROM user_facts WHERE username = ? ORDER BY last_used DESC, id DESC LIMIT ?
+    )
+"""
+INSERT_USER_FACTS_ROW = "(?, ?, ?, ?, ?, ?)"
+INSERT_USER_FACTS = """
+    INSERT INTO user_facts (username, fact, fact_key, source_message, created_at, last_used)
+    VALUES {rows}
+    ON CONFLICT(username, fact_key) DO UPDATE SET last_used = excluded.last_used
+"""
+SELECT_SEARCH_RESULT = "SELECT results, expires_at FROM search_cache WHERE query_key = ?"
+UPSERT_SEARCH_RESULT = """
+    INSERT INTO search_cache (query_key, query, results, fetched_at, expires_at) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(query_key) DO UPDATE SET
+        query = excluded.query, results = excluded.results,
+        fetched_at = excluded.fetched_at, expires_at = excluded.expires_at
+"""
+PRUNE_SEARCH_CACHE = "DELETE FROM search_cache WHERE expires_at < ?"
+SELECT_RANDOM_ACTIVE_USER = "SELECT * FROM users WHERE last_seen > ? AND message_count > 5 ORDER BY RANDOM() LIMIT 1"
+UPSERT_USER_STATS = """
+    INSERT INTO users (username, message_count, is_subscriber, favouritism_score, last_seen)
+    VALUES (:username, :messages, COALESCE(:subscriber, 0), :favouritism, :last_seen)
+    ON CONFLICT(username) DO UPDATE SET
+        message_count = message_count + excluded.message_count,
+        favouritism_score = favouritism_score + excluded.favouritism_score,
+        is_subscriber = CASE WHEN :subscriber IS NULL THEN is_subscriber ELSE excluded.is_subscriber END,
+        last_seen = excluded.last_seen
+"""
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+def _open_connection(path):
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def create_tables():
-    conn = get_db_connection()
+# ---------------- STORAGE ENGINE ----------------
+class StorageEngine:
+    """Small pool of long-lived, WAL-mode connections shared by every thread.
+
+    The bot, dashboard and background threads check a connection out for the
+    duration of one call instead of opening a new one each time. WAL lets
+    readers proceed while a write is in progress.
+    """
+
+    def __init__(self, pool_size=8):
+        self.pool_size = pool_size
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.path = None
+        self.opened = 0
+        self.generation = 0
+
+    def _acquire(self):
+        with self.lock:
+            if self.path != DB_FILE:
+                self._reset(DB_FILE)
+            generation = self.generation
+            try:
+                return self.idle.get_nowait(), generation
+            except queue.Empty:
+                create = self.opened < self.pool_size
+                if create:
+                    self.opened += 1
+                path = self.path
+        if not create:
+            return self.idle.get(), generation
+        try:
+            return _open_connection(path), generation
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+            raise
+
+    def _release(self, conn, generation):
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if generation != self.generation:
+                conn.close()
+                return
+        self.idle.put(conn)
+
+    def _reset(self, path):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self.path = path
+        self.opened = 0
+        self.generation += 1
+
+    @contextmanager
+    def connection(self):
+        conn, generation = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn, generation)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close_all(self):
+        with self.lock:
+            self._reset(None)
+
+ENGINE = StorageEngine()
+
+def get_db_connection():
+    # Standalone connection for callers that manage (and close) it themselves.
+    return _open_connection(DB_FILE)
+
+# ---------------- SCHEMA ----------------
+def _migrate_legacy_columns(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)").fetchall()]
+    if "favouritism_score" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN favouritism_score INTEGER NOT NULL DEFAULT 0")
+    if "last_seen" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN last_seen TIMESTAMP")
+    if "facts" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN facts TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen)")
+
+def _migrate_user_facts(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_facts (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            fact TEXT NOT NULL,
+            fact_key TEXT NOT NULL,
+            source_message TEXT,
+            created_at TIMESTAMP NOT NULL,
+            last_used TIMESTAMP NOT NULL,
+            UNIQUE (username, fact_key)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_facts_recent ON user_facts(username, last_used)")
+    # Move the old JSON blobs over; the column stays but is no longer written.
+    now = datetime.datetime.now()
+    for row in conn.execute("SELECT username, facts FROM users WHERE facts IS NOT NULL AND facts != '[]'").fetchall():
+        try:
+            facts = json.loads(row["facts"])
+        except ValueError:
+            continue
+        if isinstance(facts, list):
+            _insert_facts(conn, row["username"], facts, None, now)
+    conn.execute("UPDATE users SET facts = NULL")
+
+def _migrate_search_cache(conn):
+    # expires_at/fetched_at are unix timestamps so entries survive restarts.
     conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            message_count INTEGER NOT NULL DEFAULT 0,
-            is_subscriber BOOLEAN NOT NULL DEFAULT 0
+        CREATE TABLE IF NOT EXISTS search_cache (
+            query_key TEXT PRIMARY KEY,
+            query TEXT NOT NULL,
+            results TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            expires_at REAL NOT NULL
         )
     """)
-    conn.commit()
-    conn.close()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_expires ON search_cache(expires_at)")
+
+# MIGRATIONS[i] upgrades the schema to version i + 1 (stored in PRAGMA user_version).
+MIGRATIONS = [
+    _migrate_legacy_columns,
+    _migrate_user_facts,
+    _migrate_search_cache,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def create_tables():
+    with ENGINE.connection() as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    is_subscriber BOOLEAN NOT NULL DEFAULT 0
+                )
+            """)
     migrate_tables()
 
 def migrate_tables():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA table_info(users)")
-    columns = [row[1] for row in cursor.fetchall()]
-    if "favouritism_score" not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN favouritism_score INTEGER NOT NULL DEFAULT 0")
-    if "last_seen" not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN last_seen TIMESTAMP")
-    if "facts" not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN facts TEXT")
-    conn.commit()
-    conn.close()
+    with ENGINE.connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(MIGRATIONS, start=1):
+            if version < target:
+                with conn:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                version = target
+
+# ---------------- USERS ----------------
+class UserStatsAggregator:
+    """Write-behind buffer for per-user counters.
+
+    Chat traffic only touches an in-memory dict; pending deltas are written
+    periodically (and at exit) as one upsert transaction. get_user() merges
+    whatever is still pending so readers never see stale scores. Facts used
+    in prompts are queued here too, so their last_used bumps share that
+    transaction instead of costing a write per prompt.
+    """
+
+    def __init__(self, flush_interval=USER_STATS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+        self.pending = {}  # username -> [messages, favouritism, is_subscriber or None, last_seen]
+        self.in_flight = {}  # the batch being written; neither pending nor committed
+        self.epoch = 0  # bumped whenever a batch leaves pending
+        self.fact_touches = {}  # (username, fact_key) -> last used
+        self.started = False
+        self.flushes = 0
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._run, name="user-stats", daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, username, message_count_increment=0, is_subscriber=None, favouritism_score_increment=0):
+        now = datetime.datetime.now()
+        with self.lock:
+            entry = self.pending.get(username)
+            if entry is None:
+                self.pending[username] = [message_count_increment, favouritism_score_increment, is_subscriber, now]
+            else:
+                entry[0] += message_count_increment
+                entry[1] += favouritism_score_increment
+                if is_subscriber is not None:
+                    entry[2] = is_subscriber
+                entry[3] = now
+        if not self.started:
+            self.start()
+
+    def touch_facts(self, username, facts):
+        now = datetime.datetime.now()
+        with self.lock:
+            for fact in facts:
+                self.fact_touches[(username, normalize_fact(fact))] = now
+        if not self.started:
+            self.start()
+
+    def snapshot(self, usernames):
+        """Return ({username: pending entry}, epoch), waiting out a flush that is writing one of them.
+
+        If the epoch is unchanged after the caller has read the rows, no
+        batch was committed in between, so rows plus snapshot count each
+        delta exactly once.
+        """
+        with self.lock:
+            while any(username in self.in_flight for username in usernames):
+                self.flushed.wait(1.0)
+            pending = {username: list(self.pending[username]) for username in usernames if username in self.pending}
+            return pending, self.epoch
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending and not self.fact_touches:
+                    return 0
+                batch, self.pending = self.pending, {}
+                touches, self.fact_touches = self.fact_touches, {}
+                self.in_flight = batch
+                self.epoch += 1
+            rows = [
+                {
+                    "username": username,
+                    "messages": messages,
+                    "favouritism": favouritism,
+                    "subscriber": None if subscriber is None else (1 if subscriber else 0),
+                    "last_seen": last_seen,
+                }
+                for username, (messages, favouritism, subscriber, last_seen) in batch.items()
+            ]
+            try:
+                with ENGINE.transaction() as conn:
+                    conn.executemany(UPSERT_USER_STATS, rows)
+                    conn.executemany(TOUCH_USER_FACT, [(used, username, key) for (username, key), used in touches.items()])
+            except Exception as e:
+                print(f"[ERROR] Flushing user stats failed: {e}")
+                self._restore(batch, touches)
+                return 0
+            finally:
+                with self.lock:
+                    self.in_flight = {}
+                    self.flushed.notify_all()
+            self.flushes += 1
+            return len(rows)
+
+    def _restore(self, batch, touches):
+        with self.lock:
+            for key, used in touches.items():
+                self.fact_touches.setdefault(key, used)
+            for username, (messages, favouritism, subscriber, last_seen) in batch.items():
+                entry = self.pending.get(username)
+                if entry is None:
+                    self.pending[username] = [messages, favouritism, subscriber, last_seen]
+                else:
+                    # Newer values win for the flag and timestamp; counters add up.
+                    entry[0] += messages
+                    entry[1] += favouritism
+                    if entry[2] is None:
+                        entry[2] = subscriber
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+USER_STATS = UserStatsAggregator()
+
+def flush_user_stats():
+    return USER_STATS.flush()
 
 def get_user(username):
-    conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-    conn.close()
-    return user
+    while True:
+        pending, epoch = USER_STATS.snapshot((username,))
+        with ENGINE.connection() as conn:
+            user = conn.execute(SELECT_USER, (username,)).fetchone()
+        if USER_STATS.epoch == epoch:
+            break
+        # A batch was written while we read, so the row may already hold the snapshot.
+    return _merge_pending(username, user, pending.get(username))
+
+def get_users(usernames, chunk=500):
+    """Fetch several users in one query per `chunk` names; returns {username: dict} for known users."""
+    usernames = list(dict.fromkeys(usernames))
+    while True:
+        pending, epoch = USER_STATS.snapshot(usernames)
+        rows = {}
+        with ENGINE.connection() as conn:
+            for start in range(0, len(usernames), chunk):
+                names = usernames[start:start + chunk]
+                for row in conn.execute(SELECT_USERS.format(", ".join("?" * len(names))), names):
+                    rows[row["username"]] = row
+        if USER_STATS.epoch == epoch:
+            break
+    users = {}
+    for username in usernames:
+        user = _merge_pending(username, rows.get(username), pending.get(username))
+        if user is not None:
+            users[username] = user
+    return users
+
+def _merge_pending(username, user, pending):
+    if pending is None:
+        return dict(user) if user is not None else None
+    messages, favouritism, subscriber, last_seen = pending
+    merged = dict(user) if user is not None else {
+        "username": username,
+        "message_count": 0,
+        "is_subscriber": 0,
+        "favouritism_score": 0,
+        "last_seen": None,
+        "facts": None,
+    }
+    merged["message_count"] += messages
+    merged["favouritism_score"] += favouritism
+    if subscriber is not None:
+        merged["is_subscriber"] = 1 if subscriber else 0
+    merged["last_seen"] = last_seen
+    return merged
+
+def get_all_users():
+    USER_STATS.flush()
+    with ENGINE.connection() as conn:
+        return conn.execute(SELECT_ALL_USERS).fetchall()
 
 def create_or_update_user(username, message_count_increment=0, is_subscriber=None, favouritism_score_increment=0):
-    conn = get_db_connection()
-    user = get_user(username)
+    USER_STATS.add(username, message_count_increment, is_subscriber, favouritism_score_increment)
+
+# ---------------- FACTS ----------------
+def normalize_fact(fact):
+    """Key used to de-duplicate facts: case, spacing and trailing punctuation don't matter."""
+    return " ".join(str(fact).lower().split()).rstrip(".!?")
+
+def _unique_facts(facts):
+    seen = {}
+    for fact in facts:
+        fact = " ".join(str(fact).split())
+        key = normalize_fact(fact)
+        if key and key not in seen:
+            seen[key] = fact
+    return seen
+
+def _insert_facts(conn, username, facts, source_message, now):
+    rows = list(_unique_facts(facts).items())
+    for start in range(0, len(rows), FACT_INSERT_BATCH):
+        batch = rows[start:start + FACT_INSERT_BATCH]
+        params = []
+        for key, fact in batch:
+            params.extend((username, fact, key, source_message, now, now))
+        conn.execute(INSERT_USER_FACTS.format(rows=", ".join([INSERT_USER_FACTS_ROW] * len(batch))), params)
+    conn.execute(EVICT_USER_FACTS, (username, username, MAX_FACTS_PER_USER))
+    return len(rows)
+
+def update_user_facts(username, new_facts, source_message=None):
+    """Add facts for a user. Known facts are refreshed; the least recently used beyond the cap are evicted."""
+    return update_user_facts_bulk([(username, new_facts, source_message)])
+
+def update_user_facts_bulk(entries):
+    """Write [(username, facts, source_message), ...] for many users in one transaction."""
+    entries = [entry for entry in entries if entry[1]]
+    if not entries:
+        return 0
+    # Queued last_used bumps must land before eviction picks the least recently used.
+    USER_STATS.flush()
     now = datetime.datetime.now()
-    if user is None:
-        conn.execute(
-            "INSERT INTO users (username, message_count, is_subscriber, favouritism_score, last_seen, facts) VALUES (?, ?, ?, ?, ?, ?)",
-            (username, message_count_increment, 1 if is_subscriber else 0, favouritism_score_increment, now, json.dumps([]))
-        )
-    else:
-        new_message_count = user["message_count"] + message_count_increment
-        new_is_subscriber = is_subscriber if is_subscriber is not None else user["is_subscriber"]
-        new_favouritism_score = user["favouritism_score"] + favouritism_score_increment
-        conn.execute(
-            "UPDATE users SET message_count = ?, is_subscriber = ?, favouritism_score = ?, last_seen = ? WHERE username = ?",
-            (new_message_count, 1 if new_is_subscriber else 0, new_favouritism_score, now, username)
-        )
-    conn.commit()
-    conn.close()
-
-def update_user_facts(username, new_facts):
-    conn = get_db_connection()
-    user = get_user(username)
-    if user:
-        current_facts = json.loads(user["facts"]) if user["facts"] else []
-        current_facts.extend(new_facts)
-        # Unique facts only
-        current_facts = list(set(current_facts))
-        conn.execute(
-            "UPDATE users SET facts = ? WHERE username = ?",
-            (json.dumps(current_facts), username)
-        )
-        conn.commit()
-    conn.close()
+    with ENGINE.transaction() as conn:
+        return sum(_insert_facts(conn, username, facts, source_message, now) for username, facts, source_message in entries)
+
+def get_user_facts(username, limit=10, query=None):
+    """Return up to limit facts, most recently used first.
+
+    With a query, facts sharing words with it are ranked ahead of the rest.
+    Reading is side-effect free; pass the facts that end up in a prompt to
+    touch_user_facts() to keep them clear of eviction.
+    """
+    with ENGINE.connection() as conn:
+        rows = conn.execute(SELECT_USER_FACTS, (username, MAX_FACTS_PER_USER)).fetchall()
+    if query:
+        words = set(query.lower().split())
+        rows = sorted(rows, key=lambda row: -len(words.intersection(row["fact_key"].split())))
+    return [row["fact"] for row in rows[:limit]]
+
+def touch_user_facts(username, facts):
+    """Mark facts as used; the bump is written with the next user stats flush."""
+    if facts:
+        USER_STATS.touch_facts(username, facts)
+
+def get_all_user_facts():
+    with ENGINE.connection() as conn:
+        rows = conn.execute(SELECT_ALL_USER_FACTS).fetchall()
+    facts = {}
+    for row in rows:
+        facts.setdefault(row["username"], []).append(row["fact"])
+    return facts
 
 def set_user_facts(username, facts):
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE users SET facts = ? WHERE username = ?",
-        (json.dumps(facts), username)
-    )
-    conn.commit()
-    conn.close()
+    """Make the stored facts match the given list, touching only the rows that changed."""
+    wanted = _unique_facts(facts)
+    with ENGINE.transaction() as conn:
+        current = {row["fact_key"]: row["fact"] for row in conn.execute(
+            "SELECT fact, fact_key FROM user_facts WHERE username = ?", (username,)
+        ).fetchall()}
+        removed = [(username, key) for key in current if key not in wanted]
+        renamed = [(fact, username, key) for key, fact in wanted.items() if key in current and current[key] != fact]
+        added = [fact for key, fact in wanted.items() if key not in current]
+        if removed:
+            conn.executemany(DELETE_USER_FACT, removed)
+        if renamed:
+            conn.executemany(RENAME_USER_FACT, renamed)
+        if added:
+            _insert_facts(conn, username, added, None, datetime.datetime.now())
+    return {"added": len(added), "removed": len(removed), "updated": len(renamed)}
 
+# ---------------- SEARCH CACHE ----------------
+def load_search_result(query_key):
+    """Returns (results, expires_at) or None. Expired rows are returned too; the caller decides."""
+    with ENGINE.connection() as conn:
+        row = conn.execute(SELECT_SEARCH_RESULT, (query_key,)).fetchone()
+    return (row["results"], row["expires_at"]) if row else None
+
+def save_search_result(query_key, query, results, expires_at):
+    with ENGINE.transaction() as conn:
+        conn.execute(UPSERT_SEARCH_RESULT, (query_key, query, results, time.time(), expires_at))
+
+def prune_search_cache(older_than):
+    with ENGINE.transaction() as conn:
+        return conn.execute(PRUNE_SEARCH_CACHE, (older_than,)).rowcount
+
+# ---------------- SCORES ----------------
 def set_favouritism_score(username, score):
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE users SET favouritism_score = ? WHERE username = ?",
-        (score, username)
-    )
-    conn.commit()
-    conn.close()
+    # Apply buffered deltas first so they don't land on top of the new absolute score.
+    USER_STATS.flush()
+    with ENGINE.transaction() as conn:
+        conn.execute(SET_FAVOURITISM_SCORE, (score, username))
 
 def get_random_active_user():
-    conn = get_db_connection()
+    USER_STATS.flush()
     # Get users who have been active in the last hour and have sent at least 5 messages
     one_hour_ago = datetime.datetime.now() - datetime.timedelta(hours=1)
-    user = conn.execute(
-        "SELECT * FROM users WHERE last_seen > ? AND message_count > 5 ORDER BY RANDOM() LIMIT 1",
-        (one_hour_ago,)
-    ).fetchone()
-    conn.close()
-    return user
+    with ENGINE.connection() as conn:
+        return conn.execute(SELECT_RANDOM_ACTIVE_USER, (one_hour_ago,)).fetchone()
 
 if __name__ == "__main__":
     create_tables()
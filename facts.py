@@ -0,0 +1,117 @@
+import re
+import threading
+import time
+
+from batching import MicroBatcher
+
+# A message has to talk about its author before it can hold a fact about them.
+_FIRST_PERSON = re.compile(
+    r"\b(i|i'm|im|i've|ive|i'd|my|mine|me|myself|we|we're|our)\b", re.IGNORECASE
+)
+_DURABLE_STATEMENT = re.compile(
+    r"\b(i|we)\s*(?:'m|am|m|'ve|have|ve|got|own|live|lived|work|worked|study|studied|use|play|main|"
+    r"was born|grew up|moved|speak|drive|build|built|bought|run|teach|code|stream)\b"
+    r"|\b(?:i'm|im|i am)\s+(?:a|an|from|in|into|learning|studying|working|\d)",
+    re.IGNORECASE,
+)
+_NUMBER = re.compile(r"\d")
+_KEYWORDS = re.compile(
+    r"\b("
+    # hardware
+    r"pc|laptop|gpu|cpu|rtx|gtx|radeon|ryzen|intel|nvidia|monitor|keyboard|mouse|headset|mic|ps4|ps5|xbox|switch|"
+    r"steam deck|console|ram|ssd|setup|rig|"
+    # pets
+    r"cat|cats|dog|dogs|puppy|kitten|pet|pets|hamster|parrot|bird|rabbit|bunny|fish|snake|lizard|"
+    # places and life
+    r"live|living|from|country|city|town|moved|born|home|timezone|"
+    r"job|work|works|working|engineer|developer|student|school|college|university|uni|nurse|doctor|teacher|"
+    r"wife|husband|girlfriend|boyfriend|kid|kids|son|daughter|brother|sister|mom|dad|"
+    r"years old|birthday|allergic|vegan|vegetarian|diabetic|"
+    r"favorite|favourite|hobby|hobbies|main|mains|rank|ranked"
+    r")\b",
+    re.IGNORECASE,
+)
+
+def might_contain_fact(message):
+    """Cheap local check: True if the message could state a durable fact about its author."""
+    if len(message.split()) < 3:
+        return False
+    if not _FIRST_PERSON.search(message):
+        return False
+    return bool(_DURABLE_STATEMENT.search(message) or _KEYWORDS.search(message) or _NUMBER.search(message))
+
+class FactPipeline:
+    """Pre-filter plus cross-user batching for fact extraction.
+
+    Messages that fail might_contain_fact() never reach the model. The rest
+    are batched across users; each batch is one extract_batch(items) call,
+    and everything it finds is written with one store(entries) call.
+    dispatch(fn, batch), if given, decides where batches run (for example
+    on the AI executor).
+    """
+
+    def __init__(self, extract_batch, store, dispatch=None, max_batch=20, max_wait=30.0):
+        self.extract_batch = extract_batch
+        self.store = store
+        self.dispatch = dispatch
+        self.batcher = MicroBatcher(self._dispatch, max_batch=max_batch, max_wait=max_wait, name="fact-batcher")
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.seen = 0
+        self.rejected = 0
+        self.llm_calls = 0
+        self.facts_found = 0
+
+    def start(self):
+        self.batcher.start()
+
+    def stop(self):
+        self.batcher.stop()
+
+    def submit(self, user, message):
+        """Returns True if the message was queued for extraction."""
+        with self.lock:
+            self.seen += 1
+            if not might_contain_fact(message):
+                self.rejected += 1
+                return False
+        self.batcher.add((user, message))
+        return True
+
+    def flush(self, inline=False):
+        # inline skips dispatch and extracts on the calling thread, e.g. at shutdown.
+        return self.batcher.flush(self.process if inline else None)
+
+    def _dispatch(self, batch):
+        if self.dispatch is not None:
+            self.dispatch(self.process, batch)
+        else:
+            self.process(batch)
+
+    def process(self, batch):
+        results = self.extract_batch(batch)
+        with self.lock:
+            self.llm_calls += 1
+        entries = [(user, facts, message) for (user, message), facts in zip(batch, results) if facts]
+        if entries:
+            self.store(entries)
+            found = sum(len(facts) for _, facts, _ in entries)
+            with self.lock:
+                self.facts_found += found
+            print(f"[FACTS] Extracted {found} facts for {len(entries)} messages from a batch of {len(batch)}")
+        return entries
+
+    def stats(self):
+        with self.lock:
+            hours = max(time.monotonic() - self.started_at, 1.0) / 3600
+            # The old path made one model call per message.
+            saved = self.seen - self.llm_calls
+            return {
+                "seen": self.seen,
+                "rejected": self.rejected,
+                "pending": self.batcher.pending(),
+                "llm_calls": self.llm_calls,
+                "facts_found": self.facts_found,
+                "llm_calls_saved": saved,
+                "llm_calls_saved_per_hour": round(saved / hours, 1),
+            }
@@ -1,8 +1,7 @@
 import random
 import threading
-import json
 import time
-from ai_client import generate_ai_response
+from ai_client import run_task
 
 class Game:
     def __init__(self, channel, config, send_message_callback=None):
@@ -18,24 +17,29 @@ class Game:
     def end_game(self):
         self.is_active = False
 
+def _thread_submit(fn, on_dropped):
+    threading.Thread(target=fn, daemon=True).start()
+
 class TriviaGame(Game):
-    def __init__(self, channel, config, send_message_callback=None):
+    """submit(fn, on_dropped) runs the question fetch in the background; it
+    returns False if the job was shed, and calls on_dropped() if it is
+    discarded unrun later. The bot passes its AI executor here.
+    """
+
+    def __init__(self, channel, config, send_message_callback=None, submit=None):
         super().__init__(channel, config, send_message_callback)
         self.question = ""
         self.answer = ""
         self.loading = True
-        threading.Thread(target=self.fetch_question, daemon=True).start()
+        if (submit or _thread_submit)(self.fetch_question, self.fetch_dropped) is False:
+            self.fetch_dropped()
 
     def fetch_question(self):
-        prompt = "Generate a single random trivia question and its answer. Return a JSON object with keys 'question' and 'answer'. The answer should be short (1-3 words). Only return the JSON."
         try:
-            resp = generate_ai_response(prompt, "System", self.config)
-            # Clean up markdown
-            if resp.startswith("```json"): resp = resp[7:]
-            if resp.startswith("```"): resp = resp[3:]
-            if resp.endswith("```"): resp = resp[:-3]
-
-            data = json.loads(resp.strip())
+            # The trivia route carries the prompt and the {question, answer} schema.
+            data = run_task("trivia", "", self.config)
+            if not isinstance(data, dict):
+                raise ValueError("no trivia question returned")
             self.question = data.get("question")
             self.answer = data.get("answer").lower().strip()
             print(f"[TRIVIA] Q: {self.question} A: {self.answer}")
@@ -48,6 +52,14 @@ class TriviaGame(Game):
         if self.send_message_callback and self.is_active:
              self.send_message_callback(f"🎉 TRIVIA TIME! 🎉\nQuestion: {self.question}", self.channel)
 
+    def fetch_dropped(self):
+        # The AI was too busy to write a question; end the game so a new one can start.
+        print("[TRIVIA] Question fetch was dropped")
+        self.loading = False
+        self.end_game()
+        if self.send_message_callback:
+            self.send_message_callback("⚠️ The AI is busy, no trivia this time. Try again in a bit!", self.channel)
+
     def get_start_message(self):
         return "⏳ Fetching a trivia question from the AI... Get ready!"
 
@@ -116,18 +128,25 @@ class WordScrambleGame(Game):
         return False, None
 
 class GameManager:
-    def __init__(self, config, send_message_callback=None):
+    def __init__(self, config, send_message_callback=None, submit=None):
         self.config = config
         self.send_message_callback = send_message_callback
+        self.submit = submit  # handed to TriviaGame for the question fetch
         self.active_games = {} # {channel: GameInstance}
+        # Chat lines are handled by several worker threads; answers must be judged one at a time.
+        self.lock = threading.Lock()
 
     def start_game(self, game_type, channel, user):
+        with self.lock:
+            return self._start_game(game_type, channel, user)
+
+    def _start_game(self, game_type, channel, user):
         if channel in self.active_games and self.active_games[channel].is_active:
             return "A game is already active in this channel!"
 
         game = None
         if game_type == "trivia":
-            game = TriviaGame(channel, self.config, self.send_message_callback)
+            game = TriviaGame(channel, self.config, self.send_message_callback, submit=self.submit)
         elif game_type == "guess":
             game = GuessNumberGame(channel, self.config, self.send_message_callback)
         elif game_type == "scramble":
@@ -138,7 +157,15 @@ class GameManager:
         self.active_games[channel] = game
         return game.get_start_message()
 
+    def has_active_game(self, channel):
+        game = self.active_games.get(channel)
+        return game is not None and game.is_active
+
     def handle_message(self, channel, user, message):
+        with self.lock:
+            return self._handle_message(channel, user, message)
+
+    def _handle_message(self, channel, user, message):
         if channel in self.active_games:
             game = self.active_games[channel]
             if not game.is_active:
@@ -0,0 +1,252 @@
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+DEFAULT_SETTINGS = {
+    "pool_maxsize": 10,      # keep-alive connections kept per host
+    "timeout": 10,           # read timeout (seconds)
+    "connect_timeout": 3.05,
+    "http2": False,          # needs httpx[http2]; falls back to requests when missing
+}
+
+class _HostStats:
+    __slots__ = ("requests", "errors", "in_flight", "latency_last", "latency_avg", "latency_max", "last_status", "last_error")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency_last = 0.0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+        self.last_status = None
+        self.last_error = None
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "latency_ms": {
+                "last": round(self.latency_last * 1000, 1),
+                "avg": round(self.latency_avg * 1000, 1),
+                "max": round(self.latency_max * 1000, 1),
+            },
+        }
+
+_SECRET_PARAM_RE = re.compile(r"([?&](?:key|access_token)=)[^&\s'\"]+", re.IGNORECASE)
+
+def redact(error):
+    """str(error) with API keys in URL query strings replaced, for logs and the dashboard."""
+    return _SECRET_PARAM_RE.sub(r"\1***", str(error)) or error.__class__.__name__
+
+def _as_requests_error(error):
+    """The requests exception matching an httpx one, so callers only ever catch requests' exceptions."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return requests.exceptions.HTTPError(str(error), response=_HTTPXResponse(error.response))
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(error))
+    if isinstance(error, httpx.ConnectError):
+        return requests.exceptions.ConnectionError(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+class _HTTPXResponse:
+    """An httpx response whose raise_for_status() raises requests.exceptions.HTTPError."""
+
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def raise_for_status(self):
+        try:
+            self._response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise _as_requests_error(e) from e
+        return self
+
+class HTTPClient:
+    """Shared outbound HTTP layer: one keep-alive session per host.
+
+    Reusing a session skips the TCP and TLS handshake on every call after
+    the first. Requests get default timeouts, and per-host latency and error
+    counters are kept for the dashboard. With http2 enabled and httpx[http2]
+    installed, hosts are served by an httpx client instead; its responses
+    offer the same status_code/text/json()/raise_for_status() surface, and
+    its errors are re-raised as the matching requests exceptions.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.host_stats = {}
+
+    def configure(self, settings):
+        """Apply new settings; existing sessions are closed and rebuilt on next use."""
+        with self.lock:
+            self.settings.update(settings or {})
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def _use_http2(self):
+        if not self.settings.get("http2"):
+            return False
+        if httpx is None:
+            print("[HTTP] http2 requested but httpx is not installed; using HTTP/1.1")
+            self.settings["http2"] = False
+            return False
+        return True
+
+    def _new_session(self):
+        pool_size = self.settings.get("pool_maxsize", 10)
+        if self._use_http2():
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            return httpx.Client(http2=True, limits=limits)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def session_for(self, host):
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = self.sessions[host] = self._new_session()
+                self.host_stats.setdefault(host, _HostStats())
+            return session
+
+    def _timeout(self, session):
+        read = self.settings.get("timeout", 10)
+        connect = self.settings.get("connect_timeout", 3.05)
+        if self._is_httpx(session):
+            return httpx.Timeout(read, connect=connect)
+        return (connect, read)
+
+    def _begin(self, url, kwargs):
+        host = urlsplit(url).netloc
+        session = self.session_for(host)
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self._timeout(session)
+        stats = self.host_stats[host]
+        with self.lock:
+            stats.in_flight += 1
+        return session, stats
+
+    def _failed(self, stats, error):
+        with self.lock:
+            stats.in_flight -= 1
+            stats.requests += 1
+            stats.errors += 1
+            stats.last_error = redact(error)
+
+    def _is_httpx(self, session):
+        return httpx is not None and isinstance(session, httpx.Client)
+
+    def request(self, method, url, **kwargs):
+        session, stats = self._begin(url, kwargs)
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except Exception as e:
+            self._failed(stats, e)
+            if self._is_httpx(session) and isinstance(e, httpx.HTTPError):
+                raise _as_requests_error(e) from e
+            raise
+        self._finished(stats, started, response)
+        return _HTTPXResponse(response) if self._is_httpx(session) else response
+
+    def stream_lines(self, method, url, **kwargs):
+        """Yield decoded response lines as they arrive (for server-sent events).
+
+        HTTP errors are raised before the first line. Latency is recorded up
+        to the response headers; closing the generator closes the connection.
+        """
+        session, stats = self._begin(url, kwargs)
+        started = time.monotonic()
+        if self._is_httpx(session):
+            response = None
+            try:
+                with session.stream(method, url, **kwargs) as response:
+                    self._finished(stats, started, response)
+                    response.raise_for_status()
+                    yield from response.iter_lines()
+            except Exception as e:
+                if response is None:
+                    self._failed(stats, e)
+                if isinstance(e, httpx.HTTPError):
+                    raise _as_requests_error(e) from e
+                raise
+            return
+        try:
+            response = session.request(method, url, stream=True, **kwargs)
+        except Exception as e:
+            self._failed(stats, e)
+            raise
+        self._finished(stats, started, response)
+        try:
+            response.raise_for_status()
+            response.encoding = response.encoding or "utf-8"
+            # chunk_size=None hands over each chunk as soon as it is received.
+            yield from response.iter_lines(chunk_size=None, decode_unicode=True)
+        finally:
+            response.close()
+
+    def _finished(self, stats, started, response):
+        latency = time.monotonic() - started
+        with self.lock:
+            stats.in_flight -= 1
+            stats.latency_last = latency
+            stats.latency_avg = latency if not stats.requests else stats.latency_avg * 0.9 + latency * 0.1
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.requests += 1
+            stats.last_status = response.status_code
+            if response.status_code >= 400:
+                stats.errors += 1
+                stats.last_error = f"HTTP {response.status_code}"
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            return {host: stats.as_dict() for host, stats in self.host_stats.items()}
+
+    def close(self):
+        self.configure({})
+
+CLIENT = HTTPClient()
+
+def configure(settings):
+    CLIENT.configure(settings)
+
+def get(url, **kwargs):
+    return CLIENT.get(url, **kwargs)
+
+def post(url, **kwargs):
+    return CLIENT.post(url, **kwargs)
+
+def stream_lines(method, url, **kwargs):
+    return CLIENT.stream_lines(method, url, **kwargs)
+
+def stats():
+    return CLIENT.stats()
@@ -0,0 +1,330 @@
+import asyncio
+import collections
+import ssl
+import time
+
+# ---------------- FRAMING ----------------
+class LineFramer:
+    """Splits a raw IRC byte stream into CRLF-terminated lines.
+
+    Incoming chunks are appended to a single bytearray. Each feed() decodes
+    and splits all complete lines at once and drops the consumed prefix, so
+    the unread backlog is never re-copied per line.
+    """
+
+    def __init__(self, encoding="utf-8"):
+        self.encoding = encoding
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        end = buf.rfind(b"\r\n")
+        if end == -1:
+            return []
+        # CRLF never appears inside a UTF-8 sequence, so everything up to the
+        # last terminator can be decoded and split in one pass.
+        text = buf[:end].decode(self.encoding, errors="ignore")
+        del buf[:end + 2]
+        return [line for line in text.split("\r\n") if line]
+
+    def pending(self):
+        return len(self.buffer)
+
+    def reset(self):
+        self.buffer = bytearray()
+
+# ---------------- PARSING ----------------
+_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+class IRCMessage:
+    """A single parsed IRC line (IRCv3 tags, prefix, command, params, trailing)."""
+
+    __slots__ = ("raw", "prefix", "command", "params", "text", "user", "channel", "_raw_tags", "_tags", "_text_lower")
+
+    def __init__(self, raw, raw_tags, prefix, command, params, text):
+        self.raw = raw
+        self._raw_tags = raw_tags
+        self._tags = None
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+        self.text = text
+        self.user = prefix.split("!", 1)[0] if prefix else None
+        self.channel = params[0][1:] if params and params[0][:1] == "#" else None
+        self._text_lower = None
+
+    @property
+    def tags(self):
+        # Most lines never look at their tags, so they are only split on first access.
+        if self._tags is None:
+            self._tags = parse_tags(self._raw_tags) if self._raw_tags else {}
+        return self._tags
+
+    @property
+    def text_lower(self):
+        if self._text_lower is None:
+            self._text_lower = self.text.lower() if self.text else ""
+        return self._text_lower
+
+    def tag(self, key, default=None):
+        return self.tags.get(key, default)
+
+    def __repr__(self):
+        return f"IRCMessage(command={self.command!r}, user={self.user!r}, channel={self.channel!r}, text={self.text!r})"
+
+def _unescape_tag_value(value):
+    out = []
+    i = 0
+    n = len(value)
+    while i < n:
+        c = value[i]
+        if c == "\\" and i + 1 < n:
+            out.append(_TAG_ESCAPES.get(value[i + 1], value[i + 1]))
+            i += 2
+        elif c == "\\":
+            i += 1
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+def parse_tags(raw_tags):
+    tags = {}
+    for item in raw_tags.split(";"):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        if "\\" in value:
+            value = _unescape_tag_value(value)
+        tags[key] = value
+    return tags
+
+def parse_message(line):
+    """Parse one IRC line in a single left-to-right pass. Returns None for blank/garbage lines."""
+    if not line:
+        return None
+
+    raw_tags = None
+    rest = line
+    if rest[0] == "@":
+        raw_tags, _, rest = rest.partition(" ")
+        raw_tags = raw_tags[1:]
+        rest = rest.lstrip(" ")
+
+    prefix = None
+    if rest[:1] == ":":
+        prefix, _, rest = rest.partition(" ")
+        prefix = prefix[1:]
+
+    middle, sep, text = rest.partition(" :")
+    params = middle.split()
+    if not params:
+        return None
+    return IRCMessage(line, raw_tags, prefix, params[0], params[1:], text if sep else None)
+
+# ---------------- TRANSPORT ----------------
+class JoinLimiter:
+    """Sliding-window limit on channel JOIN attempts (Twitch counts each channel)."""
+
+    def __init__(self, max_joins=20, window=10.0):
+        self.max_joins = max_joins
+        self.window = window
+        self.history = collections.deque()
+
+    def delay_for(self, count, now=None):
+        now = time.monotonic() if now is None else now
+        while self.history and now - self.history[0] >= self.window:
+            self.history.popleft()
+        overflow = len(self.history) + count - self.max_joins
+        if overflow <= 0:
+            return 0.0
+        return self.window - (now - self.history[overflow - 1])
+
+    def record(self, count, now=None):
+        now = time.monotonic() if now is None else now
+        self.history.extend([now] * count)
+
+def channel_key(name):
+    """A configured channel name ("#MyChannel") as Twitch reports it in messages ("mychannel")."""
+    return name.lstrip("#").lower()
+
+def batch_joins(channels, batch_size=20, max_bytes=500):
+    """Group channels into comma-separated JOIN lines."""
+    batches = []
+    current = []
+    length = 5
+    for ch in channels:
+        name = f"#{channel_key(ch)}"
+        if current and (len(current) >= batch_size or length + len(name) + 1 > max_bytes):
+            batches.append(current)
+            current = []
+            length = 5
+        current.append(name)
+        length += len(name) + 1
+    if current:
+        batches.append(current)
+    return [f"JOIN {','.join(batch)}\r\n" for batch in batches]
+
+class IRCConnection:
+    """asyncio IRC transport (TLS by default) with keepalive, stall detection and reconnects.
+
+    Complete lines are handed to on_line(line); PING/PONG and RECONNECT are
+    handled here. send() is thread-safe and mirrors socket.send so existing
+    callers can keep writing raw IRC bytes.
+    """
+
+    def __init__(self, server, port, nick, token, channels, on_line, use_tls=True,
+                 ping_interval=30.0, ping_timeout=10.0, join_rate=20, join_window=10.0,
+                 max_backoff=30.0):
+        self.server = server
+        self.port = port
+        self.nick = nick
+        self.token = token
+        self.channels = channels
+        self.on_line = on_line
+        self.use_tls = use_tls
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_backoff = max_backoff
+        self.join_limiter = JoinLimiter(join_rate, join_window)
+        self.loop = None
+        self.writer = None
+        self.running = False
+        self.connected_since = None
+        self.last_rx = None
+        self.rtt = None
+        self.reconnects = 0
+        self.stalls = 0
+        self.last_error = None
+        self._ping_sent_at = None
+
+    # -- public API --
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if self.writer is None or self.loop is None:
+            raise ConnectionError("IRC transport is not connected")
+        self.loop.call_soon_threadsafe(self._write, data)
+
+    def close(self):
+        self.running = False
+        if self.loop and self.writer:
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+    def health(self):
+        now = time.monotonic()
+        return {
+            "connected": self.writer is not None,
+            "server": f"{self.server}:{self.port}",
+            "tls": self.use_tls,
+            "uptime": round(now - self.connected_since, 1) if self.connected_since else 0,
+            "last_rx_age": round(now - self.last_rx, 1) if self.last_rx else None,
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "last_error": self.last_error,
+        }
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.running = True
+        attempt = 0
+        while self.running:
+            started = time.monotonic()
+            try:
+                await self._session()
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+                print(f"[ERROR] IRC connection lost: {self.last_error}")
+            finally:
+                self._drop_writer()
+            if not self.running:
+                break
+            # A session that stayed up for a while resets the backoff.
+            if time.monotonic() - started > self.max_backoff:
+                attempt = 0
+            delay = min(self.max_backoff, 0.5 * 2 ** attempt)
+            attempt += 1
+            self.reconnects += 1
+            print(f"[IRC] Reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    # -- internals --
+    def _write(self, data):
+        if self.writer is not None:
+            self.writer.write(data)
+
+    def _drop_writer(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        self.writer = None
+        self.connected_since = None
+
+    async def _session(self):
+        print(f"[IRC] Connecting to {self.server}:{self.port} as {self.nick}{' (TLS)' if self.use_tls else ''}")
+        ssl_context = ssl.create_default_context() if self.use_tls else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.server, self.port, ssl=ssl_context),
+            timeout=self.ping_interval,
+        )
+        self.writer = writer
+        self.connected_since = self.last_rx = time.monotonic()
+        self._ping_sent_at = None
+        writer.write(
+            f"PASS {self.token}\r\nNICK {self.nick}\r\n"
+            "CAP REQ :twitch.tv/tags twitch.tv/commands\r\n".encode("utf-8")
+        )
+        await writer.drain()
+        join_task = asyncio.ensure_future(self._join_channels(list(self.channels)))
+        try:
+            await self._read_loop(reader)
+        finally:
+            join_task.cancel()
+
+    async def _join_channels(self, channels):
+        for line in batch_joins(channels):
+            count = line.count("#")
+            delay = self.join_limiter.delay_for(count)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.join_limiter.record(count)
+            self._write(line.encode("utf-8"))
+        if channels:
+            print(f"[IRC] Connected and joined channels: {', '.join(channels)}")
+
+    async def _read_loop(self, reader):
+        framer = LineFramer()
+        while self.running:
+            timeout = self.ping_timeout if self._ping_sent_at else self.ping_interval
+            try:
+                data = await asyncio.wait_for(reader.read(4096), timeout=timeout)
+            except asyncio.TimeoutError:
+                if self._ping_sent_at:
+                    self.stalls += 1
+                    raise ConnectionError(f"no PONG within {self.ping_timeout}s")
+                self._ping_sent_at = time.monotonic()
+                self._write(b"PING :tmi.twitch.tv\r\n")
+                continue
+            if not data:
+                raise ConnectionError("Disconnected")
+            self.last_rx = time.monotonic()
+            if self._ping_sent_at:
+                # Any traffic proves the link is alive; a PONG also gives us the RTT.
+                if b"PONG" in data:
+                    self.rtt = self.last_rx - self._ping_sent_at
+                self._ping_sent_at = None
+            for line in framer.feed(data):
+                if line.startswith("PING"):
+                    self._write(f"PONG{line[4:]}\r\n".encode("utf-8"))
+                    continue
+                if line.startswith(":tmi.twitch.tv "):
+                    command = line[15:].split(" ", 1)[0]
+                    if command == "PONG":
+                        continue
+                    if command == "RECONNECT":
+                        raise ConnectionError("server requested RECONNECT")
+                self.on_line(line)
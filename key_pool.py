@@ -0,0 +1,161 @@
+import collections
+import threading
+import time
+
+DEFAULT_SETTINGS = {
+    "rpm": 60,          # requests per minute per key and model, unless the key sets its own
+    "cooldown": 60.0,   # seconds a key sits out after a 429 without a retry hint
+}
+
+class PoolExhausted(Exception):
+    def __init__(self, message, wait=None):
+        super().__init__(message)
+        self.wait = wait
+
+def mask_key(key):
+    return key[:4] + "..." + key[-4:] if len(key) > 8 else "..."
+
+class _Slot:
+    """One API key's quota and health for one model."""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.sent = collections.deque()  # monotonic send times in the last minute
+        self.cooling_until = 0.0
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def remaining(self, now):
+        while self.sent and now - self.sent[0] >= 60:
+            self.sent.popleft()
+        return self.rpm - len(self.sent)
+
+class Lease:
+    """A (key, model) pick for one request; report() must be called exactly once with its outcome."""
+
+    def __init__(self, pool, key, model, models):
+        self.pool = pool
+        self.key = key
+        self.model = model
+        self.models = models
+        self.url = None
+        self.headers = {}
+        self.started = time.monotonic()
+
+    def report(self, status, wait=None):
+        """status: 200 for success, the HTTP error status, or None when the request never got an answer."""
+        self.pool._report(self, status, wait)
+
+class KeyPool:
+    """Spreads model requests over several API keys and fallback models.
+
+    Each (key, model) pair keeps a sliding one-minute request count against
+    its rpm and a latency average. acquire() prefers the first model in the
+    list and, among its keys, the one with the most remaining quota per
+    second of latency. A key answering 429 sits out for the server's retry
+    hint (or cooldown seconds) for that model; fallback models are only used
+    while every key is throttled or out of quota on the preferred one.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.lock = threading.Lock()
+        self.keys = {}   # key -> rpm override or None
+        self.slots = {}  # (key, model) -> _Slot
+
+    def configure(self, settings):
+        with self.lock:
+            self.settings.update(settings or {})
+
+    def set_keys(self, keys):
+        """keys: [(key, rpm or None), ...]; cheap when unchanged, so callers can sync on every request."""
+        keys = dict(keys)
+        with self.lock:
+            if keys == self.keys:
+                return
+            self.keys = keys
+            self.slots = {slot: state for slot, state in self.slots.items() if slot[0] in keys}
+            for (key, _), state in self.slots.items():
+                state.rpm = keys[key] or self.settings["rpm"]
+
+    def _slot(self, key, model):
+        state = self.slots.get((key, model))
+        if state is None:
+            state = self.slots[(key, model)] = _Slot(self.keys[key] or self.settings["rpm"])
+        return state
+
+    def acquire(self, models):
+        now = time.monotonic()
+        with self.lock:
+            if not self.keys:
+                raise PoolExhausted("no Gemini API keys configured")
+            ready_in = None
+            for model in models:
+                best = best_score = None
+                # Keys without a measurement yet are assumed as fast as the best one, so they get tried.
+                measured = [self._slot(key, model).latency for key in self.keys]
+                measured = [latency for latency in measured if latency is not None]
+                unmeasured = min(measured) if measured else 0.5
+                for key in self.keys:
+                    state = self._slot(key, model)
+                    if state.cooling_until > now:
+                        wait = state.cooling_until - now
+                        ready_in = wait if ready_in is None else min(ready_in, wait)
+                        continue
+                    remaining = state.remaining(now)
+                    if remaining <= 0:
+                        wait = 60 - (now - state.sent[0]) if state.sent else 1.0
+                        ready_in = wait if ready_in is None else min(ready_in, wait)
+                        continue
+                    latency = state.latency if state.latency is not None else unmeasured
+                    score = (remaining / state.rpm) / max(latency, 0.05)
+                    if best is None or score > best_score:
+                        best, best_score = key, score
+                if best is not None:
+                    state = self._slot(best, model)
+                    state.sent.append(now)
+                    state.requests += 1
+                    return Lease(self, best, model, models)
+        raise PoolExhausted("every Gemini API key is throttled or out of quota", ready_in)
+
+    def _report(self, lease, status, wait):
+        now = time.monotonic()
+        with self.lock:
+            state = self.slots.get((lease.key, lease.model))
+            if state is None:  # key removed while the request was out
+                return
+            if status == 429:
+                state.throttled += 1
+                state.cooling_until = now + (wait if wait is not None else self.settings["cooldown"])
+                print(f"[MODEL] Key {mask_key(lease.key)} throttled on {lease.model}; "
+                      f"out of rotation for {state.cooling_until - now:.0f}s")
+            elif status != 200:
+                state.errors += 1
+            else:
+                seconds = now - lease.started
+                state.latency = seconds if state.latency is None else state.latency * 0.8 + seconds * 0.2
+
+    def available(self, models):
+        """True if acquire(models) would succeed right now."""
+        now = time.monotonic()
+        with self.lock:
+            return any(self._slot(key, model).cooling_until <= now and self._slot(key, model).remaining(now) > 0
+                       for model in models for key in self.keys)
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            keys = {}
+            for (key, model), state in self.slots.items():
+                keys.setdefault(mask_key(key), {})[model] = {
+                    "requests": state.requests,
+                    "errors": state.errors,
+                    "throttled": state.throttled,
+                    "remaining": max(state.remaining(now), 0),
+                    "rpm": state.rpm,
+                    "cooling_for": round(max(state.cooling_until - now, 0), 1),
+                    "latency_ms": round(state.latency * 1000, 1) if state.latency is not None else None,
+                }
+            return keys
@@ -1,9 +1,16 @@
 import asyncio
 import threading
 from bot import IRCBot, load_or_create_config
+from database import flush_user_stats
 from dashboard import create_dashboard_app
 
 if __name__ == "__main__":
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
     config = load_or_create_config()
     bot = IRCBot(config)
 
@@ -14,7 +21,10 @@ if __name__ == "__main__":
 
     threading.Thread(target=run_dashboard, daemon=True).start()
 
+    # The IRC transport runs on this loop; it reconnects on its own and only returns on shutdown.
     try:
-        asyncio.get_event_loop().run_forever()
-    except RuntimeError:
-        asyncio.new_event_loop().run_forever()
+        loop.run_until_complete(bot.connect_and_listen())
+    finally:
+        bot.flush_batches()  # sentiment and facts still waiting for a full batch
+        bot.close_chat_log()  # writes out the last batch of chat
+        flush_user_stats()
@@ -0,0 +1,312 @@
+import collections
+import concurrent.futures
+import email.utils
+import random
+import re
+import threading
+import time
+
+import http_client
+from ai_executor import PRIORITY_EVENT, PRIORITY_REPLY, current_job
+from key_pool import PoolExhausted, mask_key
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+DEFAULT_SETTINGS = {
+    "max_retries": 3,
+    "base_delay": 0.5,        # first backoff ceiling; doubles per attempt (full jitter)
+    "max_delay": 8.0,
+    "max_retry_after": 30.0,  # longer Retry-After hints fail the call instead of waiting
+    "hedge": True,            # duplicate slow reply-priority requests
+    "hedge_min_delay": 0.5,   # never hedge sooner than this, whatever the p95
+    "hedge_workers": 4,       # threads for hedged calls; each call may hold two
+    "failure_threshold": 5,   # consecutive failures that open the breaker
+    "reset_timeout": 30.0,    # seconds the breaker stays open before a probe
+}
+
+class ModelUnavailable(Exception):
+    pass
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold consecutive failures; open -> half_open after reset_timeout.
+
+    While open every call fails fast. Half-open lets a single important
+    probe through; its outcome closes or re-opens the breaker. Low-priority
+    calls are refused whenever the breaker isn't closed or the last call failed.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.probing = False
+
+    def allow(self, important=True):
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "closed":
+                return important or self.consecutive_failures == 0
+            if self.state == "half_open" and important and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"[MODEL] Circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def stats(self):
+        with self.lock:
+            retry_in = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0) if self.state == "open" else 0
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "retry_in": round(retry_in, 1),
+            }
+
+_RETRY_DELAY_RE = re.compile(r'"retryDelay"\s*:\s*"([\d.]+)s"')
+
+def retry_after(response):
+    """Seconds the server asked us to wait (Retry-After header or Google's retryDelay), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    match = _RETRY_DELAY_RE.search(response.text or "") if response is not None else None
+    return float(match.group(1)) if match else None
+
+class _RetryableError(Exception):
+    def __init__(self, message, wait=None, rotate=False):
+        super().__init__(message)
+        self.wait = wait
+        self.rotate = rotate  # a throttled key was swapped out; not a sign the API is down
+
+class ModelClient:
+    """POSTs to the model API with retries, optional hedging and a circuit breaker.
+
+    Calls made from AI executor jobs take their importance from the job:
+    reply and event jobs are important, auto and background jobs are shed
+    while the API is unhealthy, and only reply jobs are hedged. Retries use
+    full-jitter exponential backoff, honour Retry-After, and never sleep past
+    the job's deadline. post() returns the parsed JSON body or raises
+    ModelUnavailable.
+
+    url may instead be a callable returning a key_pool.Lease, in which case
+    every attempt (and hedge) takes a fresh key. A 429 then retries at once
+    on another key while the pool still has one available.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.breaker = CircuitBreaker(self.settings["failure_threshold"], self.settings["reset_timeout"])
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=200)
+        self.hedge_pool = self._hedge_pool(self.settings["hedge_workers"])
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.fast_fails = 0
+        self.shed = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rotations = 0
+
+    def configure(self, settings):
+        with self.lock:
+            workers = self.settings["hedge_workers"]
+            self.settings.update(settings or {})
+            self.breaker.failure_threshold = self.settings["failure_threshold"]
+            self.breaker.reset_timeout = self.settings["reset_timeout"]
+            if self.settings["hedge_workers"] != workers:
+                old, self.hedge_pool = self.hedge_pool, self._hedge_pool(self.settings["hedge_workers"])
+                old.shutdown(wait=False)
+
+    @staticmethod
+    def _hedge_pool(workers):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="model-hedge")
+
+    def p95(self):
+        with self.lock:
+            if len(self.latencies) < 20:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def post(self, url, payload, headers=None):
+        priority, deadline = current_job()
+        important = priority is None or priority <= PRIORITY_EVENT
+        hedge = self.settings["hedge"] and priority == PRIORITY_REPLY
+        with self.lock:
+            self.calls += 1
+        if not self.breaker.allow(important):
+            with self.lock:
+                if important:
+                    self.fast_fails += 1
+                else:
+                    self.shed += 1
+            raise ModelUnavailable("model API unhealthy (circuit %s)" % self.breaker.state)
+
+        attempt = 0
+        while True:
+            try:
+                body = self._hedged(url, payload, headers) if hedge else self._attempt(url, payload, headers)
+                self.breaker.record_success()
+                return body
+            except _RetryableError as e:
+                if e.rotate:
+                    with self.lock:
+                        self.rotations += 1
+                else:
+                    self.breaker.record_failure()
+                wait = self._backoff(attempt, e.wait, deadline)
+                if wait is None or not self.breaker.allow(important):
+                    with self.lock:
+                        self.failures += 1
+                    raise ModelUnavailable(str(e)) from e
+                attempt += 1
+                with self.lock:
+                    self.retries += 1
+                print(f"[MODEL] {e}; retry {attempt} in {wait:.1f}s")
+                time.sleep(wait)
+            except Exception:
+                # Other 4xx errors are our fault, not the API's: it answered, so the breaker counts it as up.
+                self.breaker.record_success()
+                raise
+
+    def allow_stream(self):
+        """Breaker check for streaming calls, which hold their own connection; report back with record_stream()."""
+        priority, _ = current_job()
+        important = priority is None or priority <= PRIORITY_EVENT
+        with self.lock:
+            self.calls += 1
+        if self.breaker.allow(important):
+            return True
+        with self.lock:
+            if important:
+                self.fast_fails += 1
+            else:
+                self.shed += 1
+        return False
+
+    def record_stream(self, ok):
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _backoff(self, attempt, server_wait, deadline):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if attempt >= self.settings["max_retries"]:
+            return None
+        if server_wait is not None:
+            if server_wait > self.settings["max_retry_after"]:
+                return None
+            wait = server_wait + random.uniform(0, self.settings["base_delay"])
+        else:
+            wait = random.uniform(0, min(self.settings["max_delay"], self.settings["base_delay"] * 2 ** attempt))
+        if deadline is not None and time.monotonic() + wait >= deadline:
+            return None
+        return wait
+
+    def _attempt(self, url, payload, headers):
+        lease = None
+        if callable(url):
+            try:
+                lease = url()
+            except PoolExhausted as e:
+                raise _RetryableError(str(e), e.wait)
+            url = lease.url
+            headers = dict(headers or {}, **lease.headers)
+        started = time.monotonic()
+        try:
+            response = http_client.post(url, headers=headers, json=payload)
+        except Exception as e:
+            if lease is not None:
+                lease.report(None)
+            raise _RetryableError(f"request failed: {e.__class__.__name__}: {http_client.redact(e)}")
+        if response.status_code in RETRY_STATUSES:
+            server_wait = retry_after(response)
+            if lease is not None:
+                lease.report(response.status_code, server_wait)
+                if response.status_code == 429 and lease.pool.available(lease.models):
+                    raise _RetryableError(f"HTTP 429 on key {mask_key(lease.key)}", 0.0, rotate=True)
+            raise _RetryableError(f"HTTP {response.status_code}", server_wait)
+        try:
+            response.raise_for_status()
+        except Exception:
+            if lease is not None:
+                lease.report(response.status_code)
+            raise
+        if lease is not None:
+            lease.report(200)
+        with self.lock:
+            self.latencies.append(time.monotonic() - started)
+        return response.json()
+
+    def _hedged(self, url, payload, headers):
+        """Sends a second copy if the first hasn't answered by the recent p95; first success wins."""
+        p95 = self.p95()
+        delay = max(self.settings["hedge_min_delay"], p95 if p95 is not None else float("inf"))
+        primary = self.hedge_pool.submit(self._attempt, url, payload, headers)
+        if delay == float("inf"):
+            return primary.result()
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+        with self.lock:
+            self.hedges += 1
+        backup = self.hedge_pool.submit(self._attempt, url, payload, headers)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self.lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        p95 = self.p95()
+        with self.lock:
+            return {
+                "breaker": self.breaker.stats(),
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "fast_fails": self.fast_fails,
+                "shed": self.shed,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "key_rotations": self.rotations,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            }
@@ -0,0 +1,154 @@
+import json
+import threading
+
+# Task -> model, generationConfig, prompt template and output shape.
+# "lean" tasks send only the templated prompt: no personality, user score,
+# facts, captions or chat history. "json" tasks ask for structured output,
+# constrained by "schema" when one is given. "fallbacks" are tried, in order,
+# only while every API key is throttled or out of quota on "model".
+DEFAULT_ROUTES = {
+    "reply": {
+        "model": "gemini-2.0-flash",
+        "fallbacks": ["gemini-2.0-flash-lite"],
+        "generation": {"temperature": 0.9},
+        "template": "{prompt}",
+        "lean": False,
+        "json": False,
+    },
+    "summarize": {
+        "model": "gemini-2.0-flash",
+        "fallbacks": ["gemini-2.0-flash-lite"],
+        "generation": {"temperature": 0.7},
+        "template": "{prompt}",
+        "lean": False,
+        "json": False,
+    },
+    "classify": {
+        "model": "gemini-2.0-flash-lite",
+        "fallbacks": ["gemini-2.0-flash"],
+        "generation": {"temperature": 0.0},
+        "template": "{prompt}",
+        "lean": True,
+        "json": True,
+    },
+    "extract": {
+        "model": "gemini-2.0-flash-lite",
+        "fallbacks": ["gemini-2.0-flash"],
+        "generation": {"temperature": 0.0},
+        "template": "{prompt}",
+        "lean": True,
+        "json": True,
+    },
+    "condense": {
+        "model": "gemini-2.0-flash-lite",
+        "fallbacks": ["gemini-2.0-flash"],
+        "generation": {"temperature": 0.3},
+        "template": "{prompt}",
+        "lean": True,
+        "json": False,
+    },
+    "trivia": {
+        "model": "gemini-2.0-flash-lite",
+        "fallbacks": ["gemini-2.0-flash"],
+        "generation": {"temperature": 1.0},
+        "template": "Generate a single random trivia question and its answer. The answer should be short (1-3 words). {prompt}",
+        "lean": True,
+        "json": True,
+        "schema": {
+            "type": "OBJECT",
+            "properties": {"question": {"type": "STRING"}, "answer": {"type": "STRING"}},
+            "required": ["question", "answer"],
+        },
+    },
+}
+
+def route_for(task, config):
+    """DEFAULT_ROUTES[task] with config["model_routes"][task] laid over it (generation is merged key by key)."""
+    route = dict(DEFAULT_ROUTES.get(task) or DEFAULT_ROUTES["reply"])
+    override = (config.get("model_routes") or {}).get(task) or {}
+    generation = dict(route.get("generation") or {})
+    generation.update(override.get("generation") or {})
+    route.update(override)
+    route["generation"] = generation
+    return route
+
+def generation_config(route, schema=None, **extra):
+    generation = dict(route["generation"])
+    schema = schema or route.get("schema")
+    if route.get("json") or schema:
+        generation["responseMimeType"] = "application/json"
+    if schema:
+        generation["responseSchema"] = schema
+    generation.update(extra)
+    return generation
+
+class RouteStats:
+    """Per-task call counts and latency for the dashboard."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = {}
+
+    def record(self, task, model, seconds, ok):
+        with self.lock:
+            stats = self.tasks.get(task)
+            if stats is None:
+                stats = self.tasks[task] = {"model": model, "calls": 0, "errors": 0, "latency_ms_avg": 0.0}
+            stats["model"] = model
+            stats["calls"] += 1
+            stats["errors"] += not ok
+            ms = seconds * 1000
+            stats["latency_ms_avg"] = round(ms if stats["calls"] == 1 else stats["latency_ms_avg"] * 0.9 + ms * 0.1, 1)
+
+    def stats(self):
+        with self.lock:
+            return {task: dict(stats) for task, stats in self.tasks.items()}
+
+def _sample(schema):
+    kind = (schema or {}).get("type", "STRING").upper()
+    if kind == "OBJECT":
+        return {name: _sample(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return [_sample(schema.get("items"))]
+    if kind == "INTEGER":
+        return 0
+    if kind == "NUMBER":
+        return 0.0
+    if kind == "BOOLEAN":
+        return False
+    return (schema.get("enum") or ["mock"])[0]
+
+class MockBackend:
+    """Offline stand-in for the Gemini API (config "model_backend": "mock").
+
+    Answers generateContent payloads with a canned response in the same
+    shape: responses[task] if set (a value, or a callable taking the
+    payload), otherwise a value built from the responseSchema, or a short
+    text naming the model. Every request is kept in calls for inspection.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.calls = []
+
+    def respond(self, task, model, payload):
+        with self.lock:
+            self.calls.append((task, model, payload))
+            canned = self.responses.get(task)
+        if callable(canned):
+            canned = canned(payload)
+        generation = payload.get("generationConfig", {})
+        if canned is None:
+            if generation.get("responseMimeType") == "application/json":
+                canned = _sample(generation.get("responseSchema") or {"type": "OBJECT"})
+            else:
+                prompt = payload["contents"][0]["parts"][0]["text"]
+                canned = f"[mock {model}] {prompt.splitlines()[-1][:80]}"
+        text = canned if isinstance(canned, str) else json.dumps(canned)
+        return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+    def reset(self):
+        with self.lock:
+            self.responses.clear()
+            self.calls.clear()
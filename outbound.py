@@ -0,0 +1,269 @@
+import collections
+import re
+import threading
+import time
+
+# Twitch chat limits: messages per 30 seconds, across all channels.
+RATE_LIMITS = {
+    "regular": (20, 30.0),
+    "moderator": (100, 30.0),
+}
+
+def chunk_message(text, max_bytes=500):
+    """Split text into pieces whose UTF-8 encoding fits in max_bytes.
+
+    Breaks on whitespace where possible and never inside a character, so
+    max_bytes must fit the longest UTF-8 character (4 bytes).
+    """
+    if max_bytes < 4:
+        raise ValueError("max_bytes must be at least 4")
+    text = text.strip()
+    if not text:
+        return []
+    chunks = []
+    while len(text.encode("utf-8")) > max_bytes:
+        # Walk back from max_bytes to the nearest character boundary.
+        encoded = text.encode("utf-8")
+        cut = max_bytes
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        head = encoded[:cut].decode("utf-8")
+        space = head.rfind(" ")
+        if space > 0:
+            head = head[:space]
+        chunks.append(head.rstrip())
+        text = text[len(head):].lstrip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*(?=\s)|\n")
+
+class SentenceChunker:
+    """Turns streamed text deltas into sentence-aligned chat messages.
+
+    The first message is released as soon as one sentence of at least
+    first_min characters is complete, so chat sees something quickly. Later
+    ones wait for min_chars of complete sentences so a long answer doesn't
+    become a burst of tiny messages. Anything longer than max_chars without a
+    sentence break is cut at the last space.
+    """
+
+    def __init__(self, first_min=20, min_chars=150, max_chars=450):
+        self.first_min = first_min
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.emitted = 0
+
+    def feed(self, delta):
+        """Add a delta; returns the messages that are ready, in order."""
+        self.buffer += delta
+        ready = []
+        while True:
+            chunk = self._take()
+            if chunk is None:
+                return ready
+            ready.append(chunk)
+
+    def finish(self):
+        """Everything still buffered, once the stream has ended."""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        if rest:
+            self.emitted += 1
+            return [rest]
+        return []
+
+    def _take(self):
+        wanted = self.first_min if self.emitted == 0 else self.min_chars
+        cut = None
+        for match in _SENTENCE_END.finditer(self.buffer):
+            if match.end() > self.max_chars:
+                break
+            cut = match.end()
+            if cut >= wanted:
+                break
+        if cut is None or cut < wanted:
+            if len(self.buffer) <= self.max_chars:
+                return None
+            cut = cut or self.buffer.rfind(" ", 0, self.max_chars)
+            if cut <= 0:
+                cut = self.max_chars
+        chunk = self.buffer[:cut].strip()
+        self.buffer = self.buffer[cut:].lstrip()
+        if not chunk:
+            return None
+        self.emitted += 1
+        return chunk
+
+class TokenBucket:
+    """Message tokens that each come back exactly one period after being spent.
+
+    This mirrors Twitch's rolling 30s window; a continuously refilling bucket
+    could let up to twice the limit through in a single window.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.spent = collections.deque()
+
+    def _expire(self, now):
+        while self.spent and now - self.spent[0] >= self.period:
+            self.spent.popleft()
+
+    def available(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        return self.capacity - len(self.spent)
+
+    def take(self, now=None):
+        """Spend a token and return 0, or return how long until one is free."""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if len(self.spent) < self.capacity:
+            self.spent.append(now)
+            return 0.0
+        return self.period - (now - self.spent[0])
+
+class _Outgoing:
+    __slots__ = ("channel", "text", "delay", "enqueued_at")
+
+    def __init__(self, channel, text, delay, enqueued_at):
+        self.channel = channel
+        self.text = text
+        self.delay = delay
+        self.enqueued_at = enqueued_at
+
+class OutboundScheduler:
+    """Single sender thread for chat messages.
+
+    Each channel has its own FIFO, so chunks of one reply always arrive in
+    order. A chunk becomes eligible once its typing delay has passed since it
+    was queued or since the previous chunk in that channel went out, and every
+    send spends a token from the shared rate-limit bucket. Everything that is
+    due in one pass is written to the socket with a single send.
+    """
+
+    def __init__(self, write, rate_limit="regular", max_bytes=500):
+        capacity, period = RATE_LIMITS.get(rate_limit, RATE_LIMITS["regular"])
+        self.write = write
+        self.max_bytes = max_bytes
+        self.bucket = TokenBucket(capacity, period)
+        self.queues = collections.OrderedDict()
+        self.last_sent = {}
+        self.cond = threading.Condition()
+        self.running = False
+        self.sent = 0
+        self.throttled = 0
+        self.errors = 0
+        self.latency_last = 0.0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._run, name="outbound", daemon=True).start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def enqueue(self, channel, text, delay=0.0):
+        with self.cond:
+            queue = self.queues.get(channel)
+            if queue is None:
+                queue = self.queues[channel] = collections.deque()
+            queue.append(_Outgoing(channel, text, delay, time.monotonic()))
+            self.cond.notify()
+
+    def send_now(self, channel, text):
+        """Send immediately (still rate limited), bypassing the channel queue."""
+        while True:
+            with self.cond:
+                wait = self.bucket.take()
+                if wait <= 0:
+                    break
+                self.throttled += 1
+            time.sleep(wait)
+        self._write([_Outgoing(channel, text, 0.0, time.monotonic())])
+
+    def depth(self):
+        with self.cond:
+            return sum(len(q) for q in self.queues.values())
+
+    def stats(self):
+        with self.cond:
+            channels = {ch: len(q) for ch, q in self.queues.items() if q}
+            tokens = self.bucket.available()
+        return {
+            "depth": sum(channels.values()),
+            "channels": channels,
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "tokens_available": tokens,
+            "rate_limit": f"{self.bucket.capacity}/{int(self.bucket.period)}s",
+            "latency_ms": {
+                "last": round(self.latency_last * 1000, 1),
+                "avg": round(self.latency_avg * 1000, 1),
+                "max": round(self.latency_max * 1000, 1),
+            },
+        }
+
+    def _collect(self, now):
+        """Pop at most one due chunk per channel. Returns (batch, seconds until next check)."""
+        batch = []
+        wake = None
+        for channel, queue in list(self.queues.items()):
+            if not queue:
+                continue
+            head = queue[0]
+            ready_at = max(head.enqueued_at, self.last_sent.get(channel, 0.0)) + head.delay
+            if ready_at > now:
+                wake = ready_at - now if wake is None else min(wake, ready_at - now)
+                continue
+            wait = self.bucket.take(now)
+            if wait > 0:
+                self.throttled += 1
+                wake = wait if wake is None else min(wake, wait)
+                break
+            queue.popleft()
+            self.last_sent[channel] = now
+            batch.append(head)
+            # Rotate so a busy channel cannot starve the others.
+            self.queues.move_to_end(channel)
+        return batch, wake
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.running:
+                    return
+                batch, wake = self._collect(time.monotonic())
+                if not batch:
+                    self.cond.wait(timeout=wake)
+                    continue
+            self._write(batch)
+
+    def _write(self, batch):
+        data = b"".join(f"PRIVMSG #{item.channel} :{item.text}\r\n".encode("utf-8") for item in batch)
+        try:
+            self.write(data)
+        except Exception as e:
+            self.errors += len(batch)
+            print(f"[ERROR] Sending message failed: {e}")
+            return
+        now = time.monotonic()
+        for item in batch:
+            latency = now - item.enqueued_at
+            self.latency_last = latency
+            self.latency_avg = latency if not self.sent else self.latency_avg * 0.9 + latency * 0.1
+            self.latency_max = max(self.latency_max, latency)
+            self.sent += 1
+            print(f"[BOT] Sent to #{item.channel}: {item.text}")
@@ -0,0 +1,202 @@
+import math
+import re
+import threading
+
+from sentiment import EMOTES
+
+# Rough size estimate; Gemini averages about 4 characters per token for English.
+CHARS_PER_TOKEN = 4
+# Chat replies run denser (emotes, usernames), so output limits use a smaller ratio.
+OUTPUT_CHARS_PER_TOKEN = 3
+OUTPUT_TOKEN_HEADROOM = 16
+
+DEFAULT_BUDGET = {
+    "total": 2000,
+    "personality": 250,
+    "facts": 150,
+    "captions": 500,
+    "history": 600,
+    "related": 250,
+}
+
+# Lower-priority sections are trimmed first when the total budget runs short.
+SECTION_PRIORITY = ("facts", "captions", "history", "related")
+
+# Channel emotes are a lowercase prefix followed by a capitalised name (pokiHype, catJAM).
+_EMOTE_RE = re.compile(r"^[a-z0-9]{2,}[A-Z][A-Za-z0-9]*$")
+_WORD_RE = re.compile(r"[A-Za-z0-9]")
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def max_output_tokens(max_response_length):
+    return math.ceil(max_response_length / OUTPUT_CHARS_PER_TOKEN) + OUTPUT_TOKEN_HEADROOM
+
+def _is_emote(token):
+    return token in EMOTES or bool(_EMOTE_RE.match(token)) or not _WORD_RE.search(token)
+
+def is_emote_only(text):
+    tokens = text.split()
+    return all(_is_emote(token) for token in tokens)
+
+def _message_part(line):
+    # "user: message" lines are judged on the message alone.
+    head, sep, tail = line.partition(": ")
+    return tail if sep and " " not in head else line
+
+def clean_lines(lines):
+    """Drops blank, emote-only and repeated lines, keeping the latest copy of each repeat."""
+    kept = []
+    seen = set()
+    for line in reversed(lines):
+        line = line.strip()
+        if not line:
+            continue
+        message = _message_part(line)
+        if is_emote_only(message):
+            continue
+        key = " ".join(message.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append(line)
+    kept.reverse()
+    return kept
+
+def _take_newest(lines, budget):
+    """The newest lines that fit in budget tokens, in their original order."""
+    taken = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        taken.append(line)
+        used += cost
+    taken.reverse()
+    return taken, used
+
+def _take_first(items, budget):
+    """The leading items (most relevant first) that fit in budget tokens."""
+    taken = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(item) + 1
+        if used + cost > budget:
+            break
+        taken.append(item)
+        used += cost
+    return taken, used
+
+class BuiltPrompt:
+    __slots__ = ("text", "tokens", "max_output_tokens", "sections", "dropped")
+
+    def __init__(self, text, tokens, max_output_tokens, sections, dropped):
+        self.text = text
+        self.tokens = tokens
+        self.max_output_tokens = max_output_tokens
+        self.sections = sections
+        self.dropped = dropped
+
+class PromptBuilder:
+    """Assembles generate_ai_response prompts within a token budget.
+
+    The personality segment only changes with config, so it is rendered once
+    per distinct (personality, traits, max_response_length) and reused. Facts,
+    captions, chat history and related earlier lines each get a share of the
+    budget; when the total runs short, related lines are trimmed first, then
+    history, captions and facts. The request itself is never trimmed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._static_key = None
+        self._static = None
+        self.static_builds = 0
+        self.sites = {}
+
+    def personality_segment(self, config, budget):
+        traits = config.get("personality_traits") or {}
+        max_length = config.get("max_response_length", 450)
+        key = (config.get("personality", ""), tuple(traits.get("likes", ())), tuple(traits.get("dislikes", ())),
+               max_length, budget)
+        with self.lock:
+            if key == self._static_key:
+                return self._static
+        segment = self._render_personality(key, budget)
+        with self.lock:
+            self._static_key = key
+            self._static = segment
+            self.static_builds += 1
+        return segment
+
+    def _render_personality(self, key, budget):
+        personality, likes, dislikes, max_length, _ = key
+        text = (f"Respond in personality: {personality}. Keep your response concise (ideally under "
+                f"{max_length} characters) so it fits in Twitch chat, unless asked otherwise.")
+        # Trait lists only grow, so the newest entries win when they don't all fit.
+        remaining = budget - estimate_tokens(text)
+        for label, items in (("Likes", likes), ("Dislikes", dislikes)):
+            unique = list(dict.fromkeys(item.strip() for item in items if item.strip()))
+            kept, used = _take_newest(unique, max(remaining // 2, 0))
+            remaining -= used
+            if kept:
+                text += f"\n{label}: {', '.join(kept)}"
+        return text
+
+    def build(self, prompt, user, config, favouritism_score=0, facts=(), captions=(), history=(),
+              streamer_name="the streamer", site="default", related=()):
+        budget = dict(DEFAULT_BUDGET, **config.get("prompt_budget", {}))
+        personality = self.personality_segment(config, budget["personality"])
+        user_line = f"User '{user}' has a favouritism score of {favouritism_score}."
+        remaining = budget["total"] - estimate_tokens(personality) - estimate_tokens(user_line) - estimate_tokens(prompt)
+
+        raw = {"facts": list(facts), "captions": clean_lines(list(captions)), "history": clean_lines(list(history)),
+               "related": list(related)}
+        dropped = (len(captions) - len(raw["captions"])) + (len(history) - len(raw["history"]))
+        kept = {}
+        for section in SECTION_PRIORITY:
+            allowance = max(min(budget[section], remaining), 0)
+            take = _take_first if section in ("facts", "related") else _take_newest
+            kept[section], used = take(raw[section], allowance)
+            remaining -= used
+            dropped += len(raw[section]) - len(kept[section])
+
+        parts = [personality]
+        if kept["captions"]:
+            parts.append(f"\nRecent spoken context (spoken by {streamer_name}):\n" + "\n".join(kept["captions"]) + "\n")
+        parts.append(f"\n{user_line}")
+        if kept["facts"]:
+            parts.append(f"\nKnown facts about {user}: {', '.join(kept['facts'])}")
+        if kept["related"]:
+            parts.append("\nEarlier in chat (possibly relevant):\n" + "\n".join(kept["related"]))
+        if kept["history"]:
+            parts.append("\n" + "\n".join(kept["history"]))
+        parts.append(f"\n{prompt}")
+        text = "".join(parts)
+
+        tokens = estimate_tokens(text)
+        sections = {name: len(lines) for name, lines in kept.items()}
+        self._record(site, tokens, dropped)
+        return BuiltPrompt(text, tokens, max_output_tokens(config.get("max_response_length", 450)), sections, dropped)
+
+    def _record(self, site, tokens, dropped):
+        with self.lock:
+            stats = self.sites.get(site)
+            if stats is None:
+                stats = self.sites[site] = {"calls": 0, "total_tokens": 0, "last_tokens": 0, "max_tokens": 0, "dropped_lines": 0}
+            stats["calls"] += 1
+            stats["total_tokens"] += tokens
+            stats["last_tokens"] = tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+            stats["dropped_lines"] += dropped
+
+    def stats(self):
+        with self.lock:
+            return {
+                "static_builds": self.static_builds,
+                "sites": {
+                    site: dict(s, avg_tokens=round(s["total_tokens"] / s["calls"], 1))
+                    for site, s in self.sites.items()
+                },
+            }
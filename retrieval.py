@@ -0,0 +1,207 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from prompt_builder import estimate_tokens, is_emote_only
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "k": 5,                   # lines added to a reply prompt
+    "max_docs": 100000,       # oldest lines are dropped beyond this
+    "n_features": 1 << 18,    # hashed term buckets
+    "k1": 1.2,
+    "b": 0.75,
+    "min_score": 1.0,         # weaker matches are left out
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does did for from had has have he her him his how i if in into is it its "
+    "just me my no not of on or our she so that the their them then there they this to too us was we were what "
+    "when where which who why will with you your yes im i'm it's that's dont don't lol".split()
+)
+
+def terms(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def _bucket(term, mask):
+    return zlib.crc32(term.encode()) & mask
+
+class _Growable:
+    """A NumPy array with amortised O(1) append (capacity doubles)."""
+
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, len(self.data) * 2), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def view(self):
+        return self.data[:self.size]
+
+    def drop_front(self, count):
+        kept = self.data[count:self.size].copy()
+        self.data = np.empty(max(len(kept) * 2, 1024), dtype=self.data.dtype)
+        self.data[:len(kept)] = kept
+        self.size = len(kept)
+
+    def nbytes(self):
+        return self.data.nbytes
+
+class RetrievalIndex:
+    """Incremental BM25 over hashed terms, for pulling relevant past chat and caption lines into prompts.
+
+    Each line is stored as its distinct term buckets (hashed with crc32 into
+    n_features) with their counts, in flat NumPy arrays that only grow at the
+    end; document frequencies live in one dense array. A query scores every
+    posting whose bucket the query uses in a few vectorised passes, so adding
+    a line is O(its terms) and a query is O(postings), with no per-term
+    Python loops. Once max_docs is exceeded by a quarter, the oldest lines
+    are compacted away and their frequencies subtracted.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        n_features = self.settings["n_features"]
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.mask = n_features - 1
+        self.lock = threading.Lock()
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.post_bucket = _Growable(np.int32)
+        self.post_tf = _Growable(np.float32)
+        self.post_doc = _Growable(np.int32)   # absolute document id
+        self.doc_len = _Growable(np.float32)
+        self.doc_channel = _Growable(np.int16)
+        self.doc_time = _Growable(np.float64)
+        self.texts = []
+        self.channels = {None: 0}             # channel name -> small id; 0 is channel-less (captions)
+        self.base = 0                         # absolute id of texts[0]
+        self.total_len = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def _channel_id(self, channel):
+        channel_id = self.channels.get(channel)
+        if channel_id is None:
+            channel_id = self.channels[channel] = len(self.channels)
+        return channel_id
+
+    def add(self, text, channel=None, timestamp=None):
+        """Index one line; channel=None marks lines every channel may retrieve (captions)."""
+        words = terms(text)
+        if not words or is_emote_only(text):
+            return False
+        counts = {}
+        for word in words:
+            bucket = _bucket(word, self.mask)
+            counts[bucket] = counts.get(bucket, 0) + 1
+        buckets = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        with self.lock:
+            doc = self.base + len(self.texts)
+            self.texts.append(text)
+            self.post_bucket.extend(buckets)
+            self.post_tf.extend(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            self.post_doc.extend(np.full(len(counts), doc, dtype=np.int32))
+            self.doc_len.extend((len(words),))
+            self.doc_channel.extend((self._channel_id(channel),))
+            self.doc_time.extend((time.time() if timestamp is None else timestamp,))
+            self.df[buckets] += 1
+            self.total_len += len(words)
+            if len(self.texts) > self.settings["max_docs"] * 5 // 4:
+                self._compact(len(self.texts) - self.settings["max_docs"])
+        return True
+
+    def _compact(self, drop):
+        """Forgets the oldest drop lines."""
+        cut_doc = self.base + drop
+        cut = int(np.searchsorted(self.post_doc.view(), cut_doc))
+        np.subtract.at(self.df, self.post_bucket.view()[:cut], 1)
+        self.total_len -= float(self.doc_len.view()[:drop].sum())
+        for array in (self.post_bucket, self.post_tf, self.post_doc):
+            array.drop_front(cut)
+        for array in (self.doc_len, self.doc_channel, self.doc_time):
+            array.drop_front(drop)
+        del self.texts[:drop]
+        self.base = cut_doc
+
+    def search(self, query, channel=None, k=None, exclude=(), budget=None):
+        """Up to k past lines relevant to query, oldest first, within budget tokens.
+
+        Lines from other channels are never returned (channel-less lines are);
+        lines in exclude (e.g. those already in the prompt) are skipped.
+        """
+        k = self.settings["k"] if k is None else k
+        started = time.perf_counter()
+        words = terms(query)
+        if not words or k <= 0:
+            return []
+        query_buckets = np.unique(np.fromiter((_bucket(w, self.mask) for w in words), dtype=np.int32))
+        with self.lock:
+            docs = len(self.texts)
+            if not docs:
+                return []
+            buckets = self.post_bucket.view()
+            hit = np.isin(buckets, query_buckets)
+            hit_buckets = buckets[hit]
+            hit_docs = self.post_doc.view()[hit] - self.base
+            tf = self.post_tf.view()[hit]
+            lengths = self.doc_len.view()
+            df = self.df[hit_buckets].astype(np.float32)
+            allowed = self.doc_channel.view()
+            channel_ids = [0] if channel is None else [0, self.channels.get(channel, -1)]
+            allowed = np.isin(allowed, channel_ids)
+            avg_len = self.total_len / docs
+            k1, b = self.settings["k1"], self.settings["b"]
+            idf = np.log1p((docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * lengths[hit_docs] / avg_len)
+            scores = np.bincount(hit_docs, weights=idf * tf * (k1 + 1) / (tf + norm), minlength=docs)
+            scores[~allowed] = 0
+            want = min(k + len(exclude), docs)
+            top = np.argpartition(-scores, want - 1)[:want] if want < docs else np.arange(docs)
+            top = top[scores[top] >= self.settings["min_score"]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            exclude = set(exclude)
+            picked = [int(i) for i in top if self.texts[i] not in exclude][:k]
+            lines = [self.texts[i] for i in sorted(picked)]
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+        if budget is not None:
+            kept, used = [], 0
+            for line in lines:
+                cost = estimate_tokens(line) + 1
+                if used + cost <= budget:
+                    kept.append(line)
+                    used += cost
+            lines = kept
+        return lines
+
+    def __len__(self):
+        with self.lock:
+            return len(self.texts)
+
+    def nbytes(self):
+        """Approximate memory held: the arrays plus the stored line texts."""
+        with self.lock:
+            arrays = self.df.nbytes + sum(a.nbytes() for a in (self.post_bucket, self.post_tf, self.post_doc,
+                                                               self.doc_len, self.doc_channel, self.doc_time))
+            return arrays + sum(len(text) + 49 for text in self.texts) + 8 * len(self.texts)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "lines": len(self.texts),
+                "postings": self.post_bucket.size,
+                "queries": self.queries,
+                "query_ms_avg": round(self.query_seconds / self.queries * 1000, 2) if self.queries else None,
+            }
@@ -0,0 +1,213 @@
+import collections
+import datetime
+import re
+import threading
+import time
+
+from database import load_search_result, prune_search_cache, save_search_result
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")  # Custom Search quotas reset at midnight Pacific
+except Exception:
+    QUOTA_TZ = None
+
+DEFAULT_SETTINGS = {
+    "ttl": 6 * 3600,
+    "max_entries": 500,
+    "persist": False,
+    "daily_quota": 100,
+    "keep_stale": 24 * 3600,  # persisted rows this long past expiry are pruned
+}
+PRUNE_INTERVAL = 3600
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s#+.-]+")
+_FILLER = frozenset(("hey", "yo", "bot", "please", "pls", "plz", "can", "you", "tell", "me"))
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and leading filler ("hey bot can you tell me ...")."""
+    words = _PUNCTUATION_RE.sub(" ", query.lower()).split()
+    while len(words) > 1 and words[0] in _FILLER:
+        words.pop(0)
+    return " ".join(word.strip(".") or word for word in words)
+
+def _quota_day():
+    return datetime.datetime.now(QUOTA_TZ).date()
+
+class _Flight:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+class SearchCache:
+    """TTL cache with single-flight coalescing in front of a search function.
+
+    get(query, fetch) returns the cached results for the normalized query, or
+    calls fetch() once while concurrent callers for the same key wait for that
+    call instead of issuing their own. fetch() returns (results, ok); only ok
+    results are cached. With persist on, entries are also written to SQLite and
+    read back after a restart; SQLite is only touched outside the lock, and
+    rows expired for longer than keep_stale are pruned at most once per
+    PRUNE_INTERVAL. Expired entries are kept until evicted so they can still
+    be served once the daily quota is used up.
+    """
+
+    def __init__(self, ttl=DEFAULT_SETTINGS["ttl"], max_entries=DEFAULT_SETTINGS["max_entries"],
+                 persist=False, daily_quota=DEFAULT_SETTINGS["daily_quota"], keep_stale=DEFAULT_SETTINGS["keep_stale"]):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        self.daily_quota = daily_quota
+        self.keep_stale = keep_stale
+        self.last_prune = None
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (expires_at, results)
+        self.flights = {}
+        self.hits = 0
+        self.persisted_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.quota_day = _quota_day()
+        self.api_calls_today = 0
+
+    def configure(self, settings):
+        merged = dict(DEFAULT_SETTINGS, **settings)
+        with self.lock:
+            self.ttl = merged["ttl"]
+            self.max_entries = merged["max_entries"]
+            self.persist = merged["persist"]
+            self.daily_quota = merged["daily_quota"]
+            self.keep_stale = merged["keep_stale"]
+
+    def get(self, query, fetch, scope=""):
+        key = f"{scope}|{normalize_query(query)}"
+        now = time.time()
+        with self.lock:
+            entry = self._lookup(key)
+            load = entry is None and self.persist and key not in self.flights
+            if not load:
+                outcome, value = self._begin(key, entry, now)
+        if load:
+            loaded = self._load(key)
+            with self.lock:
+                if loaded is not None:
+                    if loaded[0] >= now:
+                        self.persisted_hits += 1
+                    if key not in self.entries:
+                        self._remember(key, loaded)
+                outcome, value = self._begin(key, self._lookup(key), now)
+
+        if outcome == "done":
+            return value
+        if outcome == "wait":
+            value.event.wait()
+            return value.result
+        flight = value
+
+        results, ok = "Search failed: lookup error.", False
+        try:
+            results, ok = fetch()
+        finally:
+            done = time.time()
+            expires_at = done + self.ttl
+            with self.lock:
+                if ok:
+                    self._remember(key, (expires_at, results))
+                flight.result = results
+                del self.flights[key]
+                persist = ok and self.persist
+                prune = persist and (self.last_prune is None or done - self.last_prune >= PRUNE_INTERVAL)
+                if prune:
+                    self.last_prune = done
+                keep_stale = self.keep_stale
+            flight.event.set()
+        if persist:
+            self._save(key, query, results, expires_at)
+        if prune:
+            self._prune(done - keep_stale)
+        return results
+
+    def _begin(self, key, entry, now):
+        """Under the lock: ("done", results), ("wait", flight) to join a fetch, or ("lead", flight) to run it."""
+        if entry is not None and entry[0] >= now:
+            self.hits += 1
+            return "done", entry[1]
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return "wait", flight
+        if self._quota_exhausted():
+            if entry is not None:
+                self.stale_served += 1
+                return "done", entry[1]
+            return "done", "Search failed: daily search quota reached, try again tomorrow."
+        flight = self.flights[key] = _Flight()
+        self.misses += 1
+        self.api_calls_today += 1
+        return "lead", flight
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _load(self, key):
+        try:
+            row = load_search_result(key)
+        except Exception as e:
+            print(f"[SEARCH] Could not read cached search: {e}")
+            return None
+        if row is None:
+            return None
+        results, expires_at = row
+        return expires_at, results
+
+    def _save(self, key, query, results, expires_at):
+        try:
+            save_search_result(key, query, results, expires_at)
+        except Exception as e:
+            print(f"[SEARCH] Could not persist search result: {e}")
+
+    def _prune(self, older_than):
+        try:
+            removed = prune_search_cache(older_than)
+        except Exception as e:
+            print(f"[SEARCH] Could not prune cached searches: {e}")
+            return
+        if removed:
+            print(f"[SEARCH] Pruned {removed} expired cached searches")
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _quota_exhausted(self):
+        today = _quota_day()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.api_calls_today = 0
+        return bool(self.daily_quota) and self.api_calls_today >= self.daily_quota
+
+    def stats(self):
+        with self.lock:
+            self._quota_exhausted()
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "persisted_hits": self.persisted_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "stale_served": self.stale_served,
+                "in_flight": len(self.flights),
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "api_calls_today": self.api_calls_today,
+                "daily_quota": self.daily_quota,
+                "quota_remaining": max(self.daily_quota - self.api_calls_today, 0) if self.daily_quota else None,
+            }
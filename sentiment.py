@@ -0,0 +1,172 @@
+import math
+import re
+
+# Valence on VADER's -4..+4 scale. Twitch emotes are case-sensitive, so they
+# are matched exactly; everything else is matched lowercased.
+EMOTES = {
+    "PogChamp": 3.0, "Pog": 3.0, "POGGERS": 3.0, "PogU": 3.0, "Poggers": 3.0, "POG": 3.0,
+    "KEKW": 1.5, "LUL": 1.5, "LULW": 1.5, "OMEGALUL": 1.8, "4Head": 1.2, "EZ": 0.8,
+    "catJAM": 2.0, "FeelsGoodMan": 2.2, "peepoHappy": 2.2, "HeyGuys": 1.5, "VoHiYo": 1.5,
+    "SeemsGood": 1.8, "Kreygasm": 2.5, "CoolCat": 1.5, "bleedPurple": 2.0, "PrideLove": 2.5,
+    "GivePLZ": 1.0, "TakeNRG": 1.0, "widepeepoHappy": 2.2, "Clap": 1.8, "EZClap": 1.5,
+    "BibleThump": -1.5, "NotLikeThis": -2.0, "ResidentSleeper": -2.2, "WutFace": -1.5,
+    "monkaS": -1.0, "PepeHands": -2.0, "Sadge": -2.0, "FeelsBadMan": -2.2, "FailFish": -1.8,
+    "DansGame": -2.0, "SwiftRage": -2.2, "BabyRage": -1.8, "NotLikeThisMan": -2.0, "WeirdChamp": -1.8,
+    "<3": 2.5, ":)": 1.8, ":D": 2.2, ":(": -1.8, "D:": -1.5, ":/": -0.8,
+}
+
+WORDS = {
+    # chat slang
+    "pog": 3.0, "poggers": 3.0, "hype": 2.5, "hyped": 2.5, "goated": 3.0, "goat": 2.5, "based": 1.5,
+    "gg": 2.0, "ggs": 2.0, "ggwp": 2.2, "w": 2.0, "dub": 1.8, "clutch": 2.5, "insane": 1.8, "cracked": 2.2,
+    "lit": 2.0, "fire": 1.8, "banger": 2.5, "vibes": 1.5, "wholesome": 2.5, "lol": 1.0, "lmao": 1.5,
+    "lmfao": 1.5, "rofl": 1.5, "haha": 1.5, "hahaha": 1.8, "xd": 1.2, "ty": 1.5, "tysm": 2.2, "thx": 1.5,
+    "l": -2.0, "cringe": -2.0, "mid": -1.5, "trash": -2.5, "garbage": -2.5, "washed": -1.8, "sus": -0.6,
+    "toxic": -2.5, "throw": -1.5, "throwing": -1.5, "tilted": -1.8, "rip": -1.2, "oof": -1.0, "yikes": -1.5,
+    "ratio": -1.0, "bruh": -0.8, "smh": -1.5, "wtf": -1.5, "noob": -1.5, "nerf": -0.8, "lag": -1.2,
+    "laggy": -1.5, "boring": -1.5, "sleeper": -1.5, "scam": -2.5, "rigged": -2.0,
+    # general english
+    "love": 3.2, "loved": 2.9, "loving": 2.9, "lovely": 2.8, "like": 1.5, "likes": 1.5, "liked": 1.5,
+    "great": 3.1, "good": 1.9, "nice": 1.8, "awesome": 3.1, "amazing": 2.8, "best": 3.2, "better": 1.9,
+    "cool": 1.3, "fun": 2.3, "funny": 1.9, "happy": 2.7, "glad": 2.0, "thanks": 1.9, "thank": 1.5,
+    "beautiful": 2.9, "perfect": 2.7, "wow": 2.0, "incredible": 3.0, "excellent": 3.2, "enjoy": 2.2,
+    "enjoyed": 2.3, "enjoying": 2.4, "epic": 2.5, "legend": 2.5, "legendary": 2.7, "win": 2.8, "won": 2.7,
+    "wins": 2.7, "welcome": 2.0, "congrats": 2.8, "congratulations": 2.9, "cute": 2.0, "sweet": 2.0,
+    "yay": 2.4, "yes": 1.0, "wonderful": 2.7, "brilliant": 2.8, "favorite": 2.0, "favourite": 2.0,
+    "bad": -2.5, "terrible": -2.5, "awful": -2.0, "hate": -2.7, "hated": -3.2, "hates": -2.9, "worst": -3.1,
+    "worse": -2.1, "sad": -2.1, "angry": -2.3, "mad": -2.2, "stupid": -2.4, "dumb": -2.3, "ugly": -2.3,
+    "annoying": -1.7, "annoyed": -1.6, "sucks": -1.5, "suck": -1.5, "sucked": -2.0, "broken": -1.5,
+    "lose": -1.6, "lost": -1.3, "losing": -1.6, "loss": -1.3, "fail": -2.5, "failed": -2.3, "unfair": -2.1,
+    "disappointed": -1.9, "disappointing": -2.2, "horrible": -2.5, "pathetic": -2.4, "lame": -1.8,
+    "sorry": -0.3, "ugh": -1.8, "meh": -1.0, "no": -1.2, "die": -2.9, "dead": -3.3, "kill": -3.7,
+    "boo": -1.5, "shit": -2.6, "crap": -1.6, "damn": -0.4, "hell": -0.9,
+}
+
+NEGATIONS = frozenset((
+    "not", "no", "never", "none", "nobody", "nothing", "neither", "nor", "without", "cant", "cannot",
+    "dont", "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "wont", "wouldnt", "shouldnt",
+    "couldnt", "aint", "hardly", "rarely",
+))
+
+BOOSTERS = {
+    "very": 0.293, "really": 0.293, "so": 0.293, "extremely": 0.293, "super": 0.293, "hella": 0.293,
+    "mega": 0.293, "absolutely": 0.293, "totally": 0.293, "incredibly": 0.293, "insanely": 0.293,
+    "fucking": 0.293, "freaking": 0.293, "most": 0.293, "too": 0.2, "literally": 0.15,
+    "kinda": -0.293, "kind": -0.293, "sorta": -0.293, "slightly": -0.293, "somewhat": -0.293,
+    "barely": -0.293, "little": -0.293, "bit": -0.2,
+}
+
+NEGATION_SCALAR = -0.74
+CAPS_BOOST = 0.733
+EXCLAMATION_BOOST = 0.292
+ALPHA = 15  # VADER's normalization constant
+
+_TOKEN_RE = re.compile(r"<3|[:;][()DPp/]|D:|[\w']+")
+_REPEAT_RE = re.compile(r"(\w)\1{2,}")
+
+class SentimentResult:
+    __slots__ = ("label", "compound", "confidence", "hits")
+
+    def __init__(self, label, compound, confidence, hits):
+        self.label = label
+        self.compound = compound
+        self.confidence = confidence
+        self.hits = hits
+
+    def __repr__(self):
+        return f"SentimentResult(label={self.label!r}, compound={self.compound:.3f}, confidence={self.confidence:.2f}, hits={self.hits})"
+
+class SentimentAnalyzer:
+    """Rule-based scorer in the style of VADER, tuned for Twitch chat.
+
+    Emotes are looked up case-sensitively and words lowercased, with the
+    usual VADER adjustments for negation, boosters, ALL CAPS emphasis,
+    exclamation marks and "but". confidence is 0 when no lexicon entry
+    matched and grows with the strength and agreement of the evidence; low
+    confidence means the caller should ask the model instead.
+    """
+
+    def __init__(self, extra_words=None, extra_emotes=None, threshold=0.05):
+        self.words = dict(WORDS)
+        self.words.update({k.lower(): v for k, v in (extra_words or {}).items()})
+        self.emotes = dict(EMOTES)
+        self.emotes.update(extra_emotes or {})
+        self.threshold = threshold
+
+    def score(self, text):
+        tokens = _TOKEN_RE.findall(text)
+        if not tokens:
+            return SentimentResult("neutral", 0.0, 0.0, 0)
+        lowered = [t.lower().replace("'", "") for t in tokens]
+        # Shouting only counts as emphasis when the rest of the message isn't shouting too.
+        mixed_case = any(t.isalpha() and not t.isupper() for t in tokens)
+
+        valences = []
+        positive = negative = 0
+        but_index = None
+        for i, token in enumerate(tokens):
+            word = lowered[i]
+            if word == "but":
+                but_index = len(valences)
+                continue
+            valence = self.emotes.get(token)
+            if valence is None:
+                valence = self.words.get(word)
+                if valence is None and len(word) > 3:
+                    # "loooove", "hypeeee"
+                    valence = self.words.get(_REPEAT_RE.sub(r"\1", word))
+                if valence is None:
+                    continue
+                if mixed_case and token.isupper() and len(token) > 1:
+                    valence += CAPS_BOOST if valence > 0 else -CAPS_BOOST
+            for back in (1, 2, 3):
+                if i < back:
+                    break
+                previous = lowered[i - back]
+                boost = BOOSTERS.get(previous)
+                if boost is not None:
+                    scale = 1.0 if back == 1 else 0.95 if back == 2 else 0.9
+                    valence += boost * scale if valence > 0 else -boost * scale
+                if previous in NEGATIONS:
+                    valence *= NEGATION_SCALAR
+                    break
+            if valence > 0:
+                positive += 1
+            elif valence < 0:
+                negative += 1
+            valences.append(valence)
+
+        if not valences:
+            return SentimentResult("neutral", 0.0, 0.0, 0)
+        if but_index is not None:
+            valences = [v * 0.5 for v in valences[:but_index]] + [v * 1.5 for v in valences[but_index:]]
+
+        total = sum(valences)
+        exclamations = min(text.count("!"), 4)
+        if total > 0:
+            total += exclamations * EXCLAMATION_BOOST
+        elif total < 0:
+            total -= exclamations * EXCLAMATION_BOOST
+        compound = total / math.sqrt(total * total + ALPHA)
+
+        if compound >= self.threshold:
+            label = "positive"
+        elif compound <= -self.threshold:
+            label = "negative"
+        else:
+            label = "neutral"
+
+        hits = len(valences)
+        confidence = min(1.0, abs(compound) / 0.5) * min(1.0, 0.5 + 0.25 * hits)
+        if positive and negative:
+            confidence *= abs(positive - negative) / (positive + negative) * 0.5 + 0.5
+        return SentimentResult(label, compound, round(confidence, 3), hits)
+
+_DEFAULT = None
+
+def score(text):
+    """Score with the shared default analyzer."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = SentimentAnalyzer()
+    return _DEFAULT.score(text)
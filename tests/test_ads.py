@@ -12,9 +12,10 @@ class TestAds(unittest.TestCase):
             "channels": ["test"],
             "gemini_api_key": "key",
             "personality": "friendly",
-            "auto_chat_freq": 0.2
+            "auto_chat_freq": 0.2,
+            "chat_log": {"enabled": False}
         }
-        bot.MEMORY = {"chat_history": []}
+        bot.MEMORY.clear()
 
         with patch('bot.TwitchEventSub'), \
              patch('bot.create_tables'), \
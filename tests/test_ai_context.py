@@ -11,9 +11,10 @@ class TestAIContext(unittest.TestCase):
             "channels": ["streamer_main", "other_channel"]
         }
 
+    @patch('ai_client.get_user_facts', return_value=[])
     @patch('ai_client.get_user')
-    @patch('requests.post')
-    def test_context_attribution_with_channel(self, mock_post, mock_get_user):
+    @patch('http_client.post')
+    def test_context_attribution_with_channel(self, mock_post, mock_get_user, mock_get_user_facts):
         # Mock user data
         mock_get_user.return_value = {"favouritism_score": 0, "facts": "[]"}
 
@@ -39,9 +40,10 @@ class TestAIContext(unittest.TestCase):
         self.assertIn("Recent spoken context (spoken by streamer_main):", sent_text)
         self.assertIn("This is spoken text.", sent_text)
 
+    @patch('ai_client.get_user_facts', return_value=[])
     @patch('ai_client.get_user')
-    @patch('requests.post')
-    def test_context_attribution_default(self, mock_post, mock_get_user):
+    @patch('http_client.post')
+    def test_context_attribution_default(self, mock_post, mock_get_user, mock_get_user_facts):
         # Config without channels
         config = {
             "gemini_api_key": "fake",
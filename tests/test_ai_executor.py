@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from ai_executor import AIExecutor, PRIORITY_REPLY, PRIORITY_EVENT, PRIORITY_AUTO, PRIORITY_BACKGROUND
+
+class TestAIExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = AIExecutor(max_concurrency=1, max_queue=10)
+
+    def tearDown(self):
+        self.executor.stop()
+
+    def test_higher_priority_runs_first(self):
+        order = []
+        # Nothing is running yet, so everything queues up before the single worker starts.
+        self.executor.submit(PRIORITY_BACKGROUND, order.append, "facts")
+        self.executor.submit(PRIORITY_AUTO, order.append, "auto")
+        self.executor.submit(PRIORITY_EVENT, order.append, "welcome")
+        self.executor.submit(PRIORITY_REPLY, order.append, "reply")
+        self.executor.queue.drain()
+        self.assertEqual(order, ["reply", "welcome", "auto", "facts"])
+
+    def test_on_result_receives_value(self):
+        results = []
+        self.executor.submit(PRIORITY_REPLY, lambda: "hi", on_result=results.append)
+        self.executor.queue.drain()
+        self.assertEqual(results, ["hi"])
+        self.assertEqual(self.executor.stats()["completed"], {"reply": 1})
+
+    def test_expired_before_start_is_skipped(self):
+        calls = []
+        expired = []
+        self.executor.submit(PRIORITY_REPLY, calls.append, "late", deadline=-1, on_expired=lambda: expired.append(1))
+        self.executor.queue.drain()
+        self.assertEqual(calls, [])
+        self.assertEqual(expired, [1])
+        self.assertEqual(self.executor.stats()["expired"], {"reply": 1})
+
+    def test_late_result_is_dropped(self):
+        results = []
+
+        def slow():
+            time.sleep(0.05)
+            return "stale"
+
+        self.executor.submit(PRIORITY_REPLY, slow, deadline=0.01, on_result=results.append)
+        self.executor.queue.drain()
+        self.assertEqual(results, [])
+        self.assertEqual(self.executor.stats()["expired"], {"reply": 1})
+
+    def test_failures_are_counted(self):
+        def boom():
+            raise RuntimeError("model down")
+
+        self.executor.submit(PRIORITY_EVENT, boom)
+        self.executor.queue.drain()
+        stats = self.executor.stats()
+        self.assertEqual(stats["failed"], {"event": 1})
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_concurrency_cap(self):
+        executor = AIExecutor(max_concurrency=2, max_queue=10)
+        executor.start()
+        release = threading.Event()
+        peak = []
+
+        def work():
+            peak.append(executor.stats()["in_flight"])
+            release.wait(1)
+
+        for _ in range(5):
+            executor.submit(PRIORITY_REPLY, work)
+        time.sleep(0.1)
+        self.assertEqual(executor.stats()["in_flight"], 2)
+        self.assertEqual(executor.stats()["depth"], 3)
+        release.set()
+        deadline = time.time() + 2
+        while executor.stats()["completed"].get("reply", 0) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        executor.stop()
+        self.assertLessEqual(max(peak), 2)
+
+    def test_call_blocks_for_result(self):
+        self.executor.start()
+        self.assertEqual(self.executor.call(PRIORITY_REPLY, lambda x: x * 2, 21), 42)
+        # Nested calls from a worker run inline instead of deadlocking on the single worker.
+        self.assertEqual(self.executor.call(PRIORITY_REPLY, lambda: self.executor.call(PRIORITY_REPLY, lambda: "inner")), "inner")
+
+    def test_call_returns_none_after_deadline(self):
+        self.executor.start()
+        self.assertIsNone(self.executor.call(PRIORITY_REPLY, time.sleep, 0.2, deadline=0.05))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,9 +11,10 @@ class TestAITruncation(unittest.TestCase):
             "max_response_length": 100 # Set low to test truncation removal
         }
 
+    @patch('ai_client.get_user_facts', return_value=[])
     @patch('ai_client.get_user')
-    @patch('requests.post')
-    def test_no_hard_truncation(self, mock_post, mock_get_user):
+    @patch('http_client.post')
+    def test_no_hard_truncation(self, mock_post, mock_get_user, mock_get_user_facts):
         # Mock user data
         mock_get_user.return_value = {"favouritism_score": 0, "facts": "[]"}
 
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+
+from batching import MicroBatcher
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_flush_by_size(self):
+        batches = []
+        done = threading.Event()
+
+        def handler(batch):
+            batches.append(batch)
+            done.set()
+
+        batcher = MicroBatcher(handler, max_batch=3, max_wait=60)
+        batcher.start()
+        for i in range(4):
+            batcher.add(i)
+        self.assertTrue(done.wait(1))
+        batcher.stop()
+        self.assertEqual(batches, [[0, 1, 2]])
+        self.assertEqual(batcher.pending(), 1)
+
+    def test_flush_by_age(self):
+        batches = []
+        done = threading.Event()
+
+        def handler(batch):
+            batches.append(batch)
+            done.set()
+
+        batcher = MicroBatcher(handler, max_batch=100, max_wait=0.05)
+        batcher.start()
+        started = time.monotonic()
+        batcher.add("a")
+        batcher.add("b")
+        self.assertTrue(done.wait(1))
+        batcher.stop()
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        self.assertEqual(batches, [["a", "b"]])
+
+    def test_manual_flush_and_stats(self):
+        batches = []
+        batcher = MicroBatcher(batches.append, max_batch=2)
+        for i in range(5):
+            batcher.add(i)
+        self.assertEqual(batcher.flush(), 2)
+        self.assertEqual(batcher.flush(), 2)
+        self.assertEqual(batcher.flush(), 1)
+        self.assertEqual(batcher.flush(), 0)
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+        self.assertEqual(batcher.stats(), {"pending": 0, "batches": 3, "items": 5, "avg_batch": 1.7})
+
+    def test_flush_can_use_another_handler(self):
+        batches, inline = [], []
+        batcher = MicroBatcher(batches.append, max_batch=5)
+        batcher.add("a")
+        self.assertEqual(batcher.flush(inline.append), 1)
+        self.assertEqual((batches, inline), ([], [["a"]]))
+
+    def test_handler_errors_do_not_stop_the_batcher(self):
+        def handler(batch):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(handler, max_batch=1)
+        batcher.add(1)
+        batcher.flush()
+        self.assertEqual(batcher.stats()["batches"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
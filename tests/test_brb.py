@@ -34,10 +34,11 @@ class TestBRB(unittest.TestCase):
             "channels": ["test"],
             "gemini_api_key": "key",
             "personality": "friendly",
-            "auto_chat_freq": 0.2
+            "auto_chat_freq": 0.2,
+            "chat_log": {"enabled": False}
         }
         # Reset memory
-        bot.MEMORY = {"chat_history": []}
+        bot.MEMORY.clear()
 
         # Initialize bot with mocked dependencies
         with patch('bot.create_tables'), \
@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import patch
+
+import ai_client
+from ai_executor import AIExecutor, PRIORITY_BACKGROUND
+from caption_memory import CaptionMemory
+
+def stub_model(calls):
+    """Local stand-in for the summarizer: keeps the #tags it was given, so recall is checkable."""
+    def summarize(text, max_chars):
+        calls.append(text)
+        tags = sorted({word for word in text.split() if word.startswith("#")})
+        return " ".join(tags)[:max_chars] or "chatting"
+    return summarize
+
+def run_now(fn, on_dropped=None):
+    fn()
+
+class TestCaptionMemory(unittest.TestCase):
+    def memory(self, calls, **settings):
+        settings = dict({"recent_lines": 3, "window_chars": 100, "summary_chars": 60, "fanout": 2, "levels": 3}, **settings)
+        return CaptionMemory(stub_model(calls), submit=run_now, **settings)
+
+    def test_summarizes_only_once_a_window_builds_up(self):
+        calls = []
+        memory = self.memory(calls)
+        memory.add([f"line {i} about nothing much" for i in range(6)], now=0)
+        self.assertEqual(calls, [])  # 3 older lines, under 100 chars
+        memory.add(["#speedrun attempt starts now, wish me luck"], now=60)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(memory.stats()["levels"], [1, 0, 0])
+        context = memory.context_lines(now=120)
+        self.assertEqual(len(context), 1 + 3)
+        self.assertTrue(context[0].startswith("[2 min to 2 min ago]"))
+        self.assertEqual(context[-1], "#speedrun attempt starts now, wish me luck")
+
+    def test_context_stays_bounded_and_keeps_early_topics(self):
+        calls = []
+        memory = self.memory(calls)
+        memory.add(["we are starting with #eldenring today, so hyped for this"] * 4, now=0)
+        for minute in range(1, 300):
+            memory.add([f"minute {minute}: just talking about the boss fight and chat"] * 2, now=minute * 60)
+        context = memory.context_lines(now=300 * 60)
+        self.assertLessEqual(len(context), 3 * 2 + 3)
+        self.assertIn("#eldenring", context[0])  # the whole-stream summary still remembers
+        stats = memory.stats()
+        self.assertGreater(stats["merges"], 10)
+        self.assertEqual(stats["dropped_lines"], 0)
+
+    def test_failed_summary_keeps_the_text_and_backs_off(self):
+        calls = []
+        memory = CaptionMemory(lambda text, max_chars: calls.append(text) or "", submit=run_now,
+                               recent_lines=1, window_chars=20, retry_after=60)
+        memory.add(["a line long enough to summarize", "recent"])
+        memory.add(["another"])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(memory.stats()["pending_lines"], 3)
+        self.assertEqual(memory.stats()["failures"], 1)
+        with patch("caption_memory.time.monotonic", return_value=10 ** 9):
+            memory.add(["more"])
+        self.assertEqual(len(calls), 2)
+
+    def test_shed_job_can_be_resubmitted(self):
+        memory = CaptionMemory(lambda text, max_chars: "x", submit=lambda fn, on_dropped: False, recent_lines=0, window_chars=1)
+        memory.add(["hello"])
+        self.assertFalse(memory.running)
+
+    def test_condensing_resumes_after_an_expired_job(self):
+        executor = AIExecutor(max_concurrency=0)
+        deadline = [-1]  # the first job expires before a worker reaches it
+        calls = []
+        memory = CaptionMemory(stub_model(calls), recent_lines=0, window_chars=1,
+                               submit=lambda fn, on_dropped: executor.submit(PRIORITY_BACKGROUND, fn, deadline=deadline[0],
+                                                                             on_expired=on_dropped))
+        memory.add(["#first"])
+        executor.queue.drain()
+        self.assertEqual(calls, [])
+        self.assertFalse(memory.running)
+        self.assertEqual(executor.stats()["expired"], {"background": 1})
+
+        deadline[0] = 300
+        memory.add(["#second"])
+        executor.queue.drain()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(memory.stats()["pending_lines"], 0)
+
+class TestSummarizeCaptions(unittest.TestCase):
+    def setUp(self):
+        ai_client.MOCK_BACKEND.reset()
+
+    def tearDown(self):
+        ai_client.MOCK_BACKEND.reset()
+
+    def test_condense_route_is_lean_and_bounded(self):
+        config = {"gemini_api_key": "k", "model_backend": "mock", "channels": ["streamer"], "personality": "pirate"}
+        ai_client.MOCK_BACKEND.responses["condense"] = "Beat the first boss. " * 20
+        summary = ai_client.summarize_captions("we beat the boss", 50, config)
+        self.assertLessEqual(len(summary), 100)
+        self.assertTrue(summary.endswith("."))
+        task, model, payload = ai_client.MOCK_BACKEND.calls[0]
+        self.assertEqual((task, model), ("condense", "gemini-2.0-flash-lite"))
+        text = payload["contents"][0]["parts"][0]["text"]
+        self.assertIn("streamer", text)
+        self.assertNotIn("pirate", text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from captions import CaptionRing, InotifyWatcher, TailReader
+
+class TestTailReader(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "captions.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, data, mode="ab"):
+        with open(self.path, mode) as f:
+            f.write(data.encode())
+
+    def test_reads_only_appended_complete_lines(self):
+        reader = TailReader(self.path)
+        self.assertEqual(reader.read(), [])  # no file yet
+        self.write("hello\nwor")
+        self.assertEqual(reader.read(), ["hello"])
+        self.write("ld\n\n  spaced  \n")
+        self.assertEqual(reader.read(), ["world", "spaced"])
+        self.assertEqual(reader.read(), [])
+        self.assertEqual(reader.stats()["bytes_read"], os.path.getsize(self.path))
+
+    def test_first_read_starts_near_the_end(self):
+        self.write("".join(f"old line {i}\n" for i in range(1000)))
+        reader = TailReader(self.path, backlog_bytes=40)
+        lines = reader.read()
+        self.assertEqual(lines[-1], "old line 999")
+        self.assertLessEqual(len(lines), 3)
+        self.assertTrue(all(line.startswith("old line 9") for line in lines))  # no cut-off first line
+
+    def test_truncation_and_rewrite_restart_from_the_top(self):
+        reader = TailReader(self.path)
+        self.write("first caption here\n")
+        reader.read()
+        self.write("short\n", mode="wb")
+        self.assertEqual(reader.read(), ["short"])
+        self.write("a brand new caption!!\n", mode="wb")  # same inode, longer, different bytes
+        self.assertEqual(reader.read(), ["a brand new caption!!"])
+        self.assertEqual(reader.stats()["truncations"], 2)
+
+    def test_rotation_follows_the_new_file(self):
+        reader = TailReader(self.path)
+        self.write("before rotation\n")
+        reader.read()
+        os.rename(self.path, self.path + ".1")
+        self.write("after rotation\n")
+        self.assertEqual(reader.read(), ["after rotation"])
+        self.assertEqual(reader.stats()["rotations"], 1)
+
+    def test_invalid_utf8_is_dropped(self):
+        reader = TailReader(self.path)
+        with open(self.path, "wb") as f:
+            f.write(b"caf\xc3\xa9 \xff ok\n")
+        self.assertEqual(reader.read(), ["café  ok"])
+
+class TestCaptionRing(unittest.TestCase):
+    def test_bounded_with_time_window(self):
+        ring = CaptionRing(max_lines=3)
+        ring.extend(["a", "b"], now=100.0)
+        ring.extend(["c", "d"], now=200.0)
+        self.assertEqual(ring.lines(), ["b", "c", "d"])
+        self.assertEqual(ring.recent(50, now=220.0), ["c", "d"])
+        self.assertEqual(ring.total, 4)
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+class TestInotifyWatcher(unittest.TestCase):
+    def test_wakes_on_append_to_the_file_only(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "captions.txt")
+        watcher = InotifyWatcher(path, safety_interval=3.0)
+        self.addCleanup(watcher.close)
+
+        def touch():
+            time.sleep(0.1)
+            with open(os.path.join(directory, "other.txt"), "w") as f:
+                f.write("x")
+            time.sleep(0.2)
+            with open(path, "a") as f:
+                f.write("line\n")
+
+        threading.Thread(target=touch, daemon=True).start()
+        started = time.monotonic()
+        watcher.wait()
+        elapsed = time.monotonic() - started
+        self.assertGreaterEqual(elapsed, 0.25)
+        self.assertLess(elapsed, 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from chat_history import FLAG_BOT, ChatHistory
+
+class TestChatHistory(unittest.TestCase):
+    def test_per_channel_rings_with_their_own_capacity(self):
+        history = ChatHistory(capacity=3, capacities={"big": 5})
+        for i in range(6):
+            history.append("user", f"small {i}", "small")
+            history.append("user", f"big {i}", "big")
+        self.assertEqual([m["message"] for m in history.recent(10, "small")], ["small 3", "small 4", "small 5"])
+        self.assertEqual([m.text for m in history.recent(2, "big")], ["big 4", "big 5"])
+        self.assertEqual(history.recent(5, "nobody"), [])
+        self.assertEqual([m.channel for m in history.recent(2)], ["small", "big"])  # across channels
+        self.assertEqual(history.stats()["channels"], {"small": 3, "big": 5})
+
+        history.configure(capacities={"big": 2})
+        self.assertEqual(len(history.recent(10, "big")), 2)
+
+    def test_records_are_compact_and_dict_compatible(self):
+        history = ChatHistory()
+        name = "".join(["stream", "er"])  # built at runtime, so not interned already
+        first = history.append(name, "hi", "chan", FLAG_BOT, timestamp=5.0)
+        second = history.append("".join(["stream", "er"]), "again", "chan")
+        self.assertIs(first.user, second.user)
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertEqual((first["user"], first["message"], first.get("missing", "x")), ("streamer", "hi", "x"))
+        self.assertEqual(first.to_dict(), {"seq": 1, "user": "streamer", "channel": "chan", "message": "hi",
+                                           "timestamp": 5.0, "flags": FLAG_BOT})
+
+    def test_since_returns_only_newer_messages(self):
+        history = ChatHistory()
+        for i in range(10):
+            history.append("u", str(i), "a" if i % 2 else "b")
+        self.assertEqual([m.text for m in history.since(7)], ["7", "8", "9"])
+        self.assertEqual([m.text for m in history.since(4, channel="a")], ["5", "7", "9"])
+        self.assertEqual([m.text for m in history.since(0, limit=2)], ["8", "9"])
+        self.assertEqual(history.since(history.seq), [])
+
+if __name__ == '__main__':
+    unittest.main()
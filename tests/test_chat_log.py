@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from chat_log import ChatLog
+
+class TestChatLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.logs = []
+
+    def tearDown(self):
+        for log in self.logs:
+            log.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def log(self, **settings):
+        settings = dict({"directory": self.directory, "segment_bytes": 4000, "index_interval": 300,
+                         "flush_interval": 30.0, "max_segments": 0}, **settings)
+        log = ChatLog(**settings)
+        self.logs.append(log)
+        return log
+
+    def fill(self, log, count):
+        for i in range(count):
+            log.append("chat", "a" if i % 2 else "b", f"user{i}", f"message {i}", timestamp=1000 + i)
+        self.assertTrue(log.flush())
+
+    def test_batches_are_written_with_one_fsync(self):
+        log = self.log(segment_bytes=1 << 20)
+        with patch("chat_log.os.fsync") as fsync:
+            self.fill(log, 200)
+        self.assertEqual(fsync.call_count, 1)
+        self.assertEqual(log.stats()["records_written"], 200)
+
+    def test_rolls_segments_and_reads_a_time_range(self):
+        log = self.log()
+        self.fill(log, 500)
+        self.assertGreater(log.stats()["segments"], 3)
+        self.assertEqual([e.text for e in log.read_range(1250, 1253)],
+                         ["message 250", "message 251", "message 252", "message 253"])
+        self.assertEqual([e.user for e in log.read_range(1250, 1253, channel="a")], ["user251", "user253"])
+        self.assertEqual(len(log.read_range(0)), 500)
+        self.assertEqual(log.read_range(5000), [])
+
+    def test_only_segments_in_range_are_opened(self):
+        log = self.log()
+        self.fill(log, 500)
+        opened = []
+        real_open = open
+        with patch("builtins.open", side_effect=lambda path, *a, **k: opened.append(path) or real_open(path, *a, **k)):
+            log.read_range(1490, 1495)
+        self.assertEqual(opened, [log.segments[-1].path])
+
+    def test_tail_returns_each_channels_newest_messages(self):
+        log = self.log()
+        self.fill(log, 500)
+        log.append("raid", "a", "raider", "", timestamp=2000)
+        log.flush()
+        recent = log.tail(3, channels=["a", "b"])
+        self.assertEqual([e.text for e in recent["a"]], ["message 495", "message 497", "message 499"])
+        self.assertEqual([e.text for e in recent["b"]], ["message 494", "message 496", "message 498"])
+
+    def test_reopen_cuts_a_torn_write_and_keeps_appending(self):
+        log = self.log()
+        self.fill(log, 100)
+        log.close()
+        self.logs.remove(log)
+        last = sorted(name for name in os.listdir(self.directory) if name.endswith(".log"))[-1]
+        with open(os.path.join(self.directory, last), "ab") as f:
+            f.write(b"\x40\x00\x00\x00half a rec")
+
+        reopened = self.log()
+        self.assertEqual(len(reopened.read_range(0)), 100)
+        reopened.append("chat", "a", "late", "after the restart", timestamp=3000)
+        reopened.flush()
+        self.assertEqual(reopened.tail(2, channels=["a"])["a"][-1].text, "after the restart")
+
+    def test_failed_batch_is_cut_off_so_later_ones_stay_readable(self):
+        log = self.log(segment_bytes=1 << 20)
+        self.fill(log, 10)
+        log.append("chat", "a", "lost", "never synced", timestamp=2000)
+        with patch("chat_log.os.fsync", side_effect=OSError("disk full")):
+            log.flush()
+        self.assertEqual(log.stats()["write_errors"], 1)
+        log.append("chat", "a", "later", "written after the failure", timestamp=2001)
+        self.assertTrue(log.flush())
+
+        self.assertEqual([e.user for e in log.read_range(1008)], ["user8", "user9", "later"])
+        self.assertEqual(log.tail(1, channels=["a"])["a"][0].user, "later")
+        self.assertEqual(os.path.getsize(log.segments[-1].path), log.segments[-1].size)
+
+    def test_old_segments_are_deleted(self):
+        log = self.log(max_segments=2)
+        self.fill(log, 500)
+        self.assertEqual(len([n for n in os.listdir(self.directory) if n.endswith(".log")]), 2)
+        self.assertEqual(log.read_range(0)[-1].text, "message 499")
+
+if __name__ == '__main__':
+    unittest.main()
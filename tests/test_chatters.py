@@ -0,0 +1,83 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chatters import ActiveChatterIndex, by_activity, by_favouritism
+
+class TestActiveChatterIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ActiveChatterIndex(window=60)
+
+    def test_sample_is_partitioned_by_channel(self):
+        self.index.touch("a", "alice", now=100)
+        self.index.touch("b", "bob", now=100)
+        for _ in range(20):
+            self.assertEqual(self.index.sample("a", now=100), "alice")
+            self.assertEqual(self.index.sample("b", now=100), "bob")
+        self.assertIsNone(self.index.sample("missing", now=100))
+
+    def test_expiry_after_window(self):
+        self.index.touch("a", "alice", now=100)
+        self.index.touch("a", "bob", now=150)
+        self.assertEqual(self.index.active("a", now=150), ["bob", "alice"])
+        self.assertEqual(self.index.active("a", now=170), ["bob"])
+        self.assertEqual(self.index.sample("a", now=170), "bob")
+        self.assertIsNone(self.index.sample("a", now=300))
+        self.assertEqual(self.index.stats(), {"a": 0})
+
+    def test_touch_refreshes_recency(self):
+        self.index.touch("a", "alice", now=100)
+        self.index.touch("a", "bob", now=110)
+        self.index.touch("a", "alice", now=150)
+        self.assertEqual(self.index.active("a", now=175), ["alice"])
+
+    def test_swap_remove_keeps_members_consistent(self):
+        for i in range(10):
+            self.index.touch("a", f"user{i}", now=100 + i)
+        self.index.touch("a", "user0", now=200)
+        self.index.touch("a", "user5", now=200)
+        partition = self.index.partitions["a"]
+        partition.expire(150)
+        self.assertEqual(sorted(partition.members), ["user0", "user5"])
+        for user, position in partition.positions.items():
+            self.assertEqual(partition.members[position], user)
+
+    def test_min_messages_and_exclude(self):
+        self.index.touch("a", "lurker", now=100)
+        for _ in range(6):
+            self.index.touch("a", "regular", now=100)
+        self.index.touch("a", "bot", now=100)
+        for _ in range(20):
+            self.assertEqual(self.index.sample("a", min_messages=6, now=100), "regular")
+            self.assertNotEqual(self.index.sample("a", exclude=("bot",), now=100), "bot")
+        self.assertIsNone(self.index.sample("a", min_messages=50, now=100))
+
+    def test_weights(self):
+        self.index.touch("a", "liked", now=100)
+        self.index.touch("a", "disliked", now=100)
+        scores = {"liked": 50, "disliked": -50}
+        weight = by_favouritism(lambda users: {user: scores[user] for user in users})
+        for _ in range(20):
+            self.assertEqual(self.index.sample("a", weight=weight, now=100), "liked")
+
+        scores["liked"] = -50
+        self.assertIsNone(self.index.sample("a", weight=weight, now=100))
+
+    def test_scores_are_looked_up_once_per_pass(self):
+        for i in range(30):
+            self.index.touch("a", f"user{i}", now=100)
+        lookups = []
+        weight = by_favouritism(lambda users: lookups.append(users) or {})
+        self.assertIsNone(self.index.sample("a", weight=weight, now=100))
+        # One lookup for the rejection picks, one for the full pass; unknown users weigh nothing.
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(len(lookups[1]), 30)
+
+    def test_activity_weight(self):
+        weight = by_activity(cap=10)
+        self.assertEqual(weight([("x", 5), ("y", 50)]), [0.5, 1.0])
+
+if __name__ == '__main__':
+    unittest.main()
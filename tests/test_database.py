@@ -0,0 +1,216 @@
+import contextlib
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import database
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_db_file = database.DB_FILE
+        database.DB_FILE = os.path.join(self.tmpdir.name, "test.db")
+        database.USER_STATS.pending.clear()
+        database.USER_STATS.fact_touches.clear()
+        database.create_tables()
+
+    def tearDown(self):
+        database.USER_STATS.pending.clear()
+        database.USER_STATS.fact_touches.clear()
+        database.ENGINE.close_all()
+        database.DB_FILE = self.original_db_file
+        self.tmpdir.cleanup()
+
+class TestStorageEngine(DatabaseTestCase):
+    def test_schema_version_index_and_wal(self):
+        with database.ENGINE.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], database.SCHEMA_VERSION)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            indexes = [row["name"] for row in conn.execute("PRAGMA index_list(users)").fetchall()]
+        self.assertIn("idx_users_last_seen", indexes)
+
+    def test_upgrades_legacy_database(self):
+        database.ENGINE.close_all()
+        database.DB_FILE = os.path.join(self.tmpdir.name, "legacy.db")
+        conn = database.get_db_connection()
+        conn.execute("CREATE TABLE users (username TEXT PRIMARY KEY, message_count INTEGER NOT NULL DEFAULT 0, is_subscriber BOOLEAN NOT NULL DEFAULT 0)")
+        conn.execute("INSERT INTO users (username, message_count) VALUES ('old', 3)")
+        conn.commit()
+        conn.close()
+
+        database.create_tables()
+        database.create_tables()
+        user = database.get_user("old")
+        self.assertEqual(user["message_count"], 3)
+        self.assertEqual(user["favouritism_score"], 0)
+
+    def test_connections_are_reused(self):
+        database.get_user("nobody")
+        database.get_user("nobody")
+        self.assertEqual(database.ENGINE.opened, 1)
+
+class TestUserStatsAggregator(DatabaseTestCase):
+    def test_pending_deltas_visible_before_flush(self):
+        database.create_or_update_user("viewer", message_count_increment=1)
+        database.create_or_update_user("viewer", message_count_increment=1, favouritism_score_increment=3)
+        user = database.get_user("viewer")
+        self.assertEqual(user["message_count"], 2)
+        self.assertEqual(user["favouritism_score"], 3)
+
+        conn = database.get_db_connection()
+        self.assertIsNone(conn.execute("SELECT * FROM users WHERE username = 'viewer'").fetchone())
+        conn.close()
+
+    def test_flush_upserts_and_accumulates(self):
+        database.create_or_update_user("viewer", message_count_increment=5, is_subscriber=True)
+        self.assertEqual(database.flush_user_stats(), 1)
+        database.create_or_update_user("viewer", message_count_increment=2, favouritism_score_increment=-1)
+        database.flush_user_stats()
+        user = database.get_user("viewer")
+        self.assertEqual(user["message_count"], 7)
+        self.assertEqual(user["favouritism_score"], -1)
+        # is_subscriber=None leaves the stored flag alone
+        self.assertEqual(user["is_subscriber"], 1)
+        self.assertIsNotNone(user["last_seen"])
+
+    def test_reader_during_flush_sees_the_batch(self):
+        database.create_or_update_user("viewer", message_count_increment=4)
+        seen = []
+        readers = []
+        real_transaction = database.ENGINE.transaction
+
+        @contextlib.contextmanager
+        def slow_transaction():
+            # The batch has left pending but is not committed yet.
+            reader = threading.Thread(target=lambda: seen.append(database.get_user("viewer")["message_count"]))
+            readers.append(reader)
+            reader.start()
+            reader.join(0.1)
+            with real_transaction() as conn:
+                yield conn
+
+        with patch.object(database.ENGINE, "transaction", slow_transaction):
+            database.flush_user_stats()
+        readers[0].join(5)
+        self.assertEqual(seen, [4])
+
+    def test_readers_do_not_wait_for_the_flush_lock(self):
+        database.create_or_update_user("viewer", message_count_increment=2)
+        database.flush_user_stats()
+        with database.USER_STATS.flush_lock:
+            user = database.get_user("viewer")
+        self.assertIsInstance(user, dict)
+        self.assertEqual(user["message_count"], 2)
+
+    def test_read_racing_a_commit_counts_once(self):
+        database.create_or_update_user("viewer", message_count_increment=3)
+        real_connection = database.ENGINE.connection
+        flushed = []
+
+        @contextlib.contextmanager
+        def connection():
+            # The snapshot still holds the delta; commit it before the row is read.
+            if not flushed:
+                flushed.append(threading.Thread(target=database.flush_user_stats))
+                flushed[0].start()
+                flushed[0].join(5)
+            with real_connection() as conn:
+                yield conn
+
+        with patch.object(database.ENGINE, "connection", connection):
+            self.assertEqual(database.get_user("viewer")["message_count"], 3)
+
+    def test_get_users_reads_many_in_one_call(self):
+        database.create_or_update_user("alice", message_count_increment=2)
+        database.flush_user_stats()
+        database.create_or_update_user("alice", message_count_increment=1)
+        database.create_or_update_user("bob", favouritism_score_increment=5)
+        users = database.get_users(["alice", "bob", "nobody", "alice"], chunk=1)
+        self.assertEqual(sorted(users), ["alice", "bob"])
+        self.assertEqual(users["alice"]["message_count"], 3)
+        self.assertEqual(users["bob"]["favouritism_score"], 5)
+
+    def test_absolute_score_applies_after_pending_deltas(self):
+        database.create_or_update_user("viewer", favouritism_score_increment=4)
+        database.set_favouritism_score("viewer", 50)
+        self.assertEqual(database.get_user("viewer")["favouritism_score"], 50)
+
+class TestUserFacts(DatabaseTestCase):
+    def test_dedupes_and_keeps_insertion_order(self):
+        database.update_user_facts("viewer", ["Lives in Oslo", "Has a cat", "lives in  oslo."], source_message="hi")
+        database.update_user_facts("viewer", ["Plays guitar", "has a cat"])
+        self.assertEqual(database.get_all_user_facts()["viewer"], ["Lives in Oslo", "Has a cat", "Plays guitar"])
+        with database.ENGINE.connection() as conn:
+            row = conn.execute("SELECT source_message FROM user_facts WHERE fact_key = 'lives in oslo'").fetchone()
+        self.assertEqual(row["source_message"], "hi")
+
+    def test_cap_evicts_least_recently_used(self):
+        database.update_user_facts("viewer", [f"fact {i}" for i in range(database.MAX_FACTS_PER_USER)])
+        with database.ENGINE.transaction() as conn:
+            conn.execute("UPDATE user_facts SET last_used = '2000-01-01' WHERE fact_key IN ('fact 0', 'fact 1')")
+        # Using fact 0 in a prompt refreshes it, so fact 1 is the one evicted.
+        self.assertEqual(database.get_user_facts("viewer", limit=1, query="about fact 0"), ["fact 0"])
+        database.touch_user_facts("viewer", ["fact 0"])
+        database.update_user_facts("viewer", ["brand new"])
+        facts = database.get_all_user_facts()["viewer"]
+        self.assertEqual(len(facts), database.MAX_FACTS_PER_USER)
+        self.assertIn("fact 0", facts)
+        self.assertIn("brand new", facts)
+        self.assertNotIn("fact 1", facts)
+
+    def test_get_user_facts_limit_and_recency(self):
+        self.assertEqual(database.get_user_facts("nobody"), [])
+        database.update_user_facts("viewer", ["old fact"])
+        with database.ENGINE.transaction() as conn:
+            conn.execute("UPDATE user_facts SET last_used = '2000-01-01'")
+        database.update_user_facts("viewer", ["new fact"])
+        self.assertEqual(database.get_user_facts("viewer", limit=1), ["new fact"])
+
+    def test_touches_wait_for_the_write_behind_flush(self):
+        database.update_user_facts("viewer", ["Has a cat"])
+        with database.ENGINE.transaction() as conn:
+            conn.execute("UPDATE user_facts SET last_used = '2000-01-01'")
+        database.get_user_facts("viewer")
+        database.touch_user_facts("viewer", ["has a  cat."])
+        with database.ENGINE.connection() as conn:
+            self.assertEqual(conn.execute("SELECT last_used FROM user_facts").fetchone()[0], "2000-01-01")
+        database.flush_user_stats()
+        with database.ENGINE.connection() as conn:
+            self.assertNotEqual(conn.execute("SELECT last_used FROM user_facts").fetchone()[0], "2000-01-01")
+
+    def test_set_user_facts_is_a_diff(self):
+        database.update_user_facts("viewer", ["Has a cat", "Lives in Oslo"])
+        with database.ENGINE.connection() as conn:
+            cat_id = conn.execute("SELECT id FROM user_facts WHERE fact_key = 'has a cat'").fetchone()["id"]
+        result = database.set_user_facts("viewer", ["has a Cat", "Plays guitar"])
+        self.assertEqual(result, {"added": 1, "removed": 1, "updated": 1})
+        self.assertEqual(database.get_all_user_facts()["viewer"], ["has a Cat", "Plays guitar"])
+        with database.ENGINE.connection() as conn:
+            self.assertEqual(conn.execute("SELECT id FROM user_facts WHERE fact_key = 'has a cat'").fetchone()["id"], cat_id)
+
+    def test_bulk_write_covers_many_users(self):
+        written = database.update_user_facts_bulk([
+            ("a", ["Lives in Oslo"], "I live in Oslo"),
+            ("b", [], "nothing here"),
+            ("c", ["Has a dog", "Plays guitar"], "my dog and my guitar"),
+        ])
+        self.assertEqual(written, 3)
+        self.assertEqual(database.get_all_user_facts(), {"a": ["Lives in Oslo"], "c": ["Has a dog", "Plays guitar"]})
+
+    def test_migrates_json_blob(self):
+        database.ENGINE.close_all()
+        database.DB_FILE = os.path.join(self.tmpdir.name, "legacy_facts.db")
+        conn = database.get_db_connection()
+        conn.execute("CREATE TABLE users (username TEXT PRIMARY KEY, message_count INTEGER NOT NULL DEFAULT 0, is_subscriber BOOLEAN NOT NULL DEFAULT 0, facts TEXT)")
+        conn.execute("""INSERT INTO users (username, facts) VALUES ('old', '["Has a dog", "has a dog", "Likes tea"]')""")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        database.create_tables()
+        self.assertEqual(database.get_all_user_facts(), {"old": ["Has a dog", "Likes tea"]})
+        self.assertIsNone(database.get_user("old")["facts"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ import sys
 import os
 import unittest
 import threading
+import shutil
+import tempfile
 from unittest.mock import MagicMock, patch
 
 # Mock sys.argv to avoid input prompts
@@ -34,9 +36,12 @@ class TestEngagement(unittest.TestCase):
             "channels": ["test"],
             "gemini_api_key": "key",
             "personality": "friendly",
-            "auto_chat_freq": 0.2
+            "auto_chat_freq": 0.2,
+            # No executor workers: tests run queued AI jobs with drain()
+            "ai_executor": {"max_concurrency": 0},
+            "chat_log": {"enabled": False}
         }
-        bot.MEMORY = {"chat_history": []}
+        bot.MEMORY.clear()
 
         with patch('bot.create_tables'), \
              patch('bot.IRCBot.connect_and_listen'), \
@@ -46,33 +51,36 @@ class TestEngagement(unittest.TestCase):
 
         self.bot.send_message = MagicMock()
 
+    def test_hedge_pool_follows_ai_concurrency(self):
+        with patch('bot.create_tables'), patch('bot.IRCBot.connect_and_listen'), \
+             patch('bot.IRCBot.auto_chat'), patch('bot.IRCBot.conversation_starter_task'), \
+             patch('bot.configure_model_client') as configure:
+            bot.IRCBot(dict(self.config, ai_executor={"max_concurrency": 5}, model_client={"hedge_workers": 0}))
+            self.assertEqual(configure.call_args.args[0]["hedge_workers"], 10)
+            bot.IRCBot(dict(self.config, model_client={"hedge_workers": 3}))
+            self.assertEqual(configure.call_args.args[0]["hedge_workers"], 3)
+
     def test_lurk_command(self):
         mock_ai.generate_ai_response.return_value = "Have a nice nap!"
 
-        # Test needs to wait for thread
-        with patch('threading.Thread') as mock_thread:
-            self.bot.lurk_command("", "user1", "channel")
+        self.bot.lurk_command("", "user1", "channel")
 
-            # Verify a thread was started
-            mock_thread.assert_called()
-            # Manually run the target to verify logic
-            target = mock_thread.call_args[1]['target']
-            target()
+        # Verify the reply was queued on the AI executor, then run it
+        self.assertEqual(self.bot.ai.queue.depth(), 1)
+        self.bot.ai.queue.drain()
 
-        self.bot.send_message.assert_called_with("Have a nice nap!")
+        self.bot.send_message.assert_called_with("Have a nice nap!", "channel")
         args, _ = mock_ai.generate_ai_response.call_args
         self.assertIn("lurk mode", args[0])
 
     def test_raidmsg_command(self):
         mock_ai.generate_ai_response.return_value = "Raid Power!"
 
-        with patch('threading.Thread') as mock_thread:
-            self.bot.raidmsg_command("", "user1", "channel")
-            mock_thread.assert_called()
-            target = mock_thread.call_args[1]['target']
-            target()
+        self.bot.raidmsg_command("", "user1", "channel")
+        self.assertEqual(self.bot.ai.queue.depth(), 1)
+        self.bot.ai.queue.drain()
 
-        self.bot.send_message.assert_called_with("Raid Power!")
+        self.bot.send_message.assert_called_with("Raid Power!", "channel")
         args, _ = mock_ai.generate_ai_response.call_args
         self.assertIn("hype raid message", args[0])
 
@@ -80,44 +88,138 @@ class TestEngagement(unittest.TestCase):
         line = "@msg-id=sub;display-name=NewSub :tmi.twitch.tv USERNOTICE #channel :Great stream!"
         mock_ai.generate_ai_response.return_value = "Thanks for the sub!"
 
-        with patch('threading.Thread') as mock_thread:
-            self.bot.handle_line(line)
-
-            # Find the call that targets the welcome task
-            # handle_line might start other threads (like fact extraction), so we need to be careful
-            # But in this test environment, we just check if ANY thread was started with our logic
-
-            # Since handle_line calls threading.Thread multiple times potentially,
-            # we need to find the one that corresponds to our logic.
-            # However, for simplicity in unit test, we can just grab the last call
-            # or iterate to find the one calling generate_ai_response when executed.
-
-            # Let's execute all thread targets to be safe
-            for call in mock_thread.call_args_list:
-                target = call[1].get('target')
-                if target:
-                    try:
-                        target()
-                    except:
-                        pass
+        self.bot.handle_line(line)
+        self.bot.ai.queue.drain()
 
-        self.bot.send_message.assert_called_with("Thanks for the sub!")
+        self.bot.send_message.assert_called_with("Thanks for the sub!", "channel")
 
     def test_raid_welcome(self):
         line = "@msg-id=raid;display-name=Raider;msg-param-viewerCount=50 :tmi.twitch.tv USERNOTICE #channel"
         mock_ai.generate_ai_response.return_value = "Welcome raiders!"
 
-        with patch('threading.Thread') as mock_thread:
-            self.bot.handle_line(line)
-            for call in mock_thread.call_args_list:
-                target = call[1].get('target')
-                if target:
-                    try:
-                        target()
-                    except:
-                        pass
-
-        self.bot.send_message.assert_called_with("Welcome raiders!")
+        self.bot.handle_line(line)
+        self.bot.ai.queue.drain()
+
+        self.bot.send_message.assert_called_with("Welcome raiders!", "channel")
+
+    def test_streamed_reply_posts_sentences_in_order(self):
+        self.bot.config["streaming"] = {"enabled": True, "sites": ["ai"], "first_min_chars": 5, "min_chars": 30}
+        mock_ai.stream_ai_response.return_value = iter(["Sure thing. Here is ", "the rest of the answer, ", "in pieces."])
+
+        self.bot.ai_command("tell me more", "user1", "channel")
+        self.bot.ai.queue.drain()
+
+        self.assertEqual([c.args for c in self.bot.send_message.call_args_list],
+                         [("Sure thing.", "channel"), ("Here is the rest of the answer, in pieces.", "channel")])
+        self.assertEqual(self.bot.stream_stats["replies"], 1)
+        self.assertEqual(self.bot.stream_stats["messages"], 2)
+
+    def test_stream_stats_add_up_across_workers(self):
+        self.bot.config["streaming"] = {"first_min_chars": 5, "min_chars": 30}
+        mock_ai.stream_ai_response.side_effect = lambda *a, **k: iter(["One sentence here. ", "And another one."])
+        try:
+            workers = [threading.Thread(target=lambda: [self.bot.stream_reply("hi", "user1", "channel", None, False, 0.0)
+                                                        for _ in range(50)]) for _ in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join(5)
+        finally:
+            mock_ai.stream_ai_response.side_effect = None
+        stats = self.bot.stream_stats_snapshot()
+        self.assertEqual((stats["replies"], stats["messages"]), (200, 400))
+
+    def test_ai_command_sees_only_its_channel_history(self):
+        bot.record_message("alice", "hello from a", "a")
+        bot.record_message("bob", "hello from b", "b")
+        self.bot.ai_command("what's up", "alice", "a")
+        self.bot.ai.queue.drain()
+
+        history = mock_ai.generate_ai_response.call_args.kwargs["history"]
+        self.assertEqual([(m["user"], m["message"]) for m in history], [("alice", "hello from a")])
+        self.bot.send_message.assert_called_with("AI Response", "a")
+        self.assertEqual(bot.get_recent_memory(channel="a")[-1]["user"], "bot")  # the reply is recorded too
+
+    def test_ai_command_pulls_in_relevant_earlier_lines(self):
+        bot.record_message("carol", "the secret boss is hidden behind the waterfall", "test")
+        for i in range(10):
+            bot.record_message(f"viewer{i}", f"filler message number {i}", "test")
+        bot.record_message("dave", "where is that secret boss again?", "test")
+        self.bot.ai_command("where is the secret boss", "dave", "test")
+        self.bot.ai.queue.drain()
+
+        kwargs = mock_ai.generate_ai_response.call_args.kwargs
+        self.assertEqual(kwargs["related"], ["carol: the secret boss is hidden behind the waterfall"])
+        self.assertNotIn("carol", [m["user"] for m in kwargs["history"]])
+
+    def test_chat_log_restores_history_after_restart(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        config = dict(self.config, chat_log={"directory": directory})  # enabled unless turned off
+        with patch('bot.create_tables'), patch('bot.IRCBot.connect_and_listen'), \
+             patch('bot.IRCBot.auto_chat'), patch('bot.IRCBot.conversation_starter_task'):
+            first = bot.IRCBot(config)
+            bot.record_message("alice", "remember the waterfall boss", "test")
+            first.handle_line("@msg-id=raid;display-name=Raider;msg-param-viewerCount=5 :tmi.twitch.tv USERNOTICE #test")
+            first.close_chat_log()
+            bot.MEMORY.clear()
+            second = bot.IRCBot(config)
+        self.addCleanup(second.close_chat_log)
+
+        self.assertEqual([(m["user"], m["message"]) for m in bot.get_recent_memory(channel="test")],
+                         [("alice", "remember the waterfall boss")])
+        self.assertEqual([e.kind for e in bot.CHAT_LOG.read_range(0)], ["chat", "raid"])
+        self.assertEqual(len(bot.RETRIEVAL), 1)  # restored lines are searchable again
+
+    def test_plain_chat_is_least_important_unless_a_game_is_running(self):
+        msg = bot.parse_message(":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #test :just chatting")
+        self.bot.game_manager.has_active_game.return_value = False
+        self.assertEqual(self.bot.route_message(msg)[0][0], bot.PRIORITY_ANALYTICS)
+        self.bot.game_manager.has_active_game.return_value = True
+        self.assertEqual(self.bot.route_message(msg)[0][0], bot.PRIORITY_COMMAND)
+        mention = bot.parse_message(":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #test :hey bot")
+        self.assertEqual(self.bot.route_message(mention)[0][0], bot.PRIORITY_MENTION)
+
+    def test_configured_channel_names_are_normalised(self):
+        with patch('bot.create_tables'), patch('bot.IRCBot.connect_and_listen'), \
+             patch('bot.IRCBot.auto_chat'), patch('bot.IRCBot.conversation_starter_task'):
+            mixed = bot.IRCBot(dict(self.config, channels=["#MyChannel"]))
+        self.assertEqual(mixed.channels, ["mychannel"])
+        mixed.handle_line(":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #mychannel :hello there")
+        mixed.submit_ai = MagicMock()
+        user = {"message_count": 10, "favouritism_score": 1}
+        with patch('bot.get_user', return_value=user), patch('bot.get_users', return_value={"viewer": user}), \
+             patch('bot.threading.Timer'):
+            bot.IRCBot.conversation_starter_task(mixed)
+        self.assertEqual(mixed.submit_ai.call_args.args[2:4], ("viewer", "mychannel"))
+
+    def test_history_is_keyed_like_parsed_channels(self):
+        bot.record_message("alice", "hello", "#Test")
+        self.bot.handle_line(":bob!bob@bob.tmi.twitch.tv PRIVMSG #test :hi alice")
+        self.assertEqual([m["user"] for m in bot.get_recent_memory(channel="test")], ["alice", "bob"])
+        self.assertEqual([m["user"] for m in bot.get_recent_memory(channel="#TEST")], ["alice", "bob"])
+
+    def test_gemini_search_runs_off_the_handler(self):
+        self.bot.config.update(google_search_api_key="key", google_search_engine_id="cx")
+        mock_ai.perform_google_search.reset_mock()
+        mock_ai.perform_google_search.return_value = "Title: Elden Ring\nSnippet: 2022"
+        mock_ai.generate_ai_response.return_value = "It came out in 2022."
+
+        self.bot.gemini_command("when did elden ring come out", "alice", "test")
+        mock_ai.perform_google_search.assert_not_called()
+        self.bot.ai.queue.drain()
+
+        mock_ai.perform_google_search.assert_called_once_with("when did elden ring come out", "key", "cx")
+        self.bot.send_message.assert_called_with("@alice It came out in 2022.", "test")
+
+    def test_snapshot_sends_chat_deltas(self):
+        bot.record_message("alice", "first", "test")
+        full = self.bot.get_status_snapshot()
+        self.assertFalse(full["chat_delta"])
+        bot.record_message("bob", "second", "test")
+        delta = self.bot.get_status_snapshot(since=full["chat_seq"])
+        self.assertTrue(delta["chat_delta"])
+        self.assertEqual([m["message"] for m in delta["chat_history"]], ["second"])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+from facts import FactPipeline, might_contain_fact
+
+class TestPrefilter(unittest.TestCase):
+    def test_accepts_likely_facts(self):
+        for message in [
+            "I live in Norway btw",
+            "my cat just knocked over my drink",
+            "I'm a nurse so I work nights",
+            "just upgraded my gpu to a 4070",
+            "im 24 and still bad at this game",
+            "I main support in ranked",
+        ]:
+            self.assertTrue(might_contain_fact(message), message)
+
+    def test_rejects_fact_free_chatter(self):
+        for message in [
+            "LUL",
+            "PogChamp PogChamp",
+            "what game is this?",
+            "that was an insane play",
+            "chat is wild today",
+            "hey bot how are you",
+            "gg",
+        ]:
+            self.assertFalse(might_contain_fact(message), message)
+
+class TestFactPipeline(unittest.TestCase):
+    def setUp(self):
+        self.extract = MagicMock(side_effect=lambda batch: [["lives in Oslo"] if "Oslo" in text else [] for _, text in batch])
+        self.store = MagicMock()
+        self.pipeline = FactPipeline(self.extract, self.store, max_batch=10)
+
+    def test_filter_batch_and_single_write(self):
+        self.assertFalse(self.pipeline.submit("a", "KEKW"))
+        self.assertTrue(self.pipeline.submit("a", "I live in Oslo"))
+        self.assertTrue(self.pipeline.submit("b", "my dog is called Rex"))
+        self.pipeline.flush()
+
+        self.extract.assert_called_once_with([("a", "I live in Oslo"), ("b", "my dog is called Rex")])
+        self.store.assert_called_once_with([("a", ["lives in Oslo"], "I live in Oslo")])
+        stats = self.pipeline.stats()
+        self.assertEqual(stats["seen"], 3)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["llm_calls"], 1)
+        self.assertEqual(stats["llm_calls_saved"], 2)
+        self.assertEqual(stats["facts_found"], 1)
+
+    def test_dispatch_controls_where_batches_run(self):
+        dispatched = []
+        pipeline = FactPipeline(self.extract, self.store, dispatch=lambda fn, batch: dispatched.append((fn, batch)))
+        pipeline.submit("a", "I live in Oslo")
+        pipeline.flush()
+        self.extract.assert_not_called()
+        fn, batch = dispatched[0]
+        fn(batch)
+        self.store.assert_called_once()
+
+    def test_empty_results_skip_the_write(self):
+        self.pipeline.submit("b", "my dog is called Rex")
+        self.pipeline.flush()
+        self.store.assert_not_called()
+
+class TestExtractFactsBatch(unittest.TestCase):
+    @patch('ai_client.http_client.post')
+    def test_one_request_for_many_users(self, mock_post):
+        items = [{"index": 1, "facts": ["has a dog named Rex"]}, {"index": 7, "facts": ["ignored"]}]
+        mock_post.return_value.json.return_value = {"candidates": [{"content": {"parts": [{"text": json.dumps(items)}]}}]}
+
+        results = ai_client.extract_facts_batch([("a", "I live nowhere"), ("b", "my dog Rex")], {"gemini_api_key": "fake"})
+
+        self.assertEqual(mock_post.call_count, 1)
+        prompt = mock_post.call_args[1]["json"]["contents"][0]["parts"][0]["text"]
+        self.assertIn("1. b: my dog Rex", prompt)
+        self.assertEqual(results, [[], ["has a dog named Rex"]])
+
+if __name__ == '__main__':
+    unittest.main()
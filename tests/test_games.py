@@ -22,5 +22,20 @@ class TestGames(unittest.TestCase):
         # Or mock the thread target.
         pass
 
+    def test_trivia_question_is_fetched_through_submit(self):
+        jobs = []
+        manager = GameManager(self.config, self.callback, submit=lambda fn, on_dropped: jobs.append((fn, on_dropped)))
+        manager.start_game("trivia", "my_channel", "viewer")
+        self.assertEqual(len(jobs), 1)
+        game = manager.active_games["my_channel"]
+        self.assertEqual(jobs[0][0], game.fetch_question)
+        self.assertTrue(game.loading)
+
+    def test_dropped_trivia_fetch_ends_the_game(self):
+        manager = GameManager(self.config, self.callback, submit=lambda fn, on_dropped: False)
+        manager.start_game("trivia", "my_channel", "viewer")
+        self.assertFalse(manager.has_active_game("my_channel"))
+        self.assertEqual(self.callback.call_args.args[1], "my_channel")
+
 if __name__ == '__main__':
     unittest.main()
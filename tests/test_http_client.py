@@ -0,0 +1,147 @@
+import json
+import threading
+import types
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+
+import http_client
+from http_client import HTTPClient
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = set()
+
+    def do_GET(self):
+        self.connections.add(self.client_address)
+        status = 500 if self.path == "/fail" else 200
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.connections.add(self.client_address)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestHTTPClient(unittest.TestCase):
+    def setUp(self):
+        _Handler.connections = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.host = self.base[len("http://"):]
+        self.client = HTTPClient(timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_reused(self):
+        for i in range(5):
+            self.assertEqual(self.client.get(f"{self.base}/{i}").json(), {"path": f"/{i}"})
+        self.assertEqual(self.client.post(f"{self.base}/echo", json={"a": 1}).json(), {"a": 1})
+        self.assertEqual(len(_Handler.connections), 1)
+
+    def test_per_host_stats(self):
+        self.client.get(f"{self.base}/ok")
+        self.client.get(f"{self.base}/fail")
+        stats = self.client.stats()[self.host]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["last_status"], 500)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertGreater(stats["latency_ms"]["max"], 0)
+
+    def test_connection_errors_are_counted(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.client.close()
+        with self.assertRaises(Exception):
+            self.client.get(f"{self.base}/gone", params={"q": "x", "key": "secret-key-123"})
+        self.assertEqual(self.client.stats()[self.host]["errors"], 1)
+        self.assertIsNotNone(self.client.stats()[self.host]["last_error"])
+        self.assertNotIn("secret-key-123", self.client.stats()[self.host]["last_error"])
+
+    def test_configure_rebuilds_sessions(self):
+        self.client.get(f"{self.base}/a")
+        self.client.configure({"pool_maxsize": 2})
+        self.assertEqual(self.client.sessions, {})
+        self.client.get(f"{self.base}/b")
+        self.assertEqual(len(_Handler.connections), 2)
+
+def fake_httpx():
+    """Just enough of httpx's client and exception hierarchy to drive the http2 path without the package."""
+    class HTTPError(Exception): pass
+    class TransportError(HTTPError): pass
+    class TimeoutException(TransportError): pass
+    class ConnectTimeout(TimeoutException): pass
+    class ConnectError(TransportError): pass
+    class HTTPStatusError(HTTPError):
+        def __init__(self, message, response):
+            super().__init__(message)
+            self.response = response
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.text = ""
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise HTTPStatusError(f"HTTP {self.status_code}", response=self)
+            return self
+
+    class Client:
+        def __init__(self, **kwargs):
+            pass
+
+        def request(self, method, url, **kwargs):
+            if url.endswith("/timeout"):
+                raise ConnectTimeout("timed out")
+            if url.endswith("/refused"):
+                raise ConnectError("connection refused")
+            return Response(500 if url.endswith("/fail") else 200)
+
+        def close(self):
+            pass
+
+    return types.SimpleNamespace(HTTPError=HTTPError, TimeoutException=TimeoutException, ConnectTimeout=ConnectTimeout,
+                                 ConnectError=ConnectError, HTTPStatusError=HTTPStatusError, Client=Client,
+                                 Limits=lambda **kwargs: None, Timeout=lambda *args, **kwargs: None)
+
+class TestHTTPXErrors(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(http_client, "httpx", fake_httpx())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = HTTPClient(http2=True)
+
+    def test_errors_surface_as_requests_exceptions(self):
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            self.client.get("https://example.test/timeout")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.get("https://example.test/refused")
+        response = self.client.get("https://example.test/fail")
+        with self.assertRaises(requests.exceptions.HTTPError) as caught:
+            response.raise_for_status()
+        self.assertEqual(caught.exception.response.status_code, 500)
+        self.assertEqual(self.client.get("https://example.test/ok").status_code, 200)
+        self.assertEqual(self.client.stats()["example.test"]["errors"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+from irc import IRCConnection, JoinLimiter, LineFramer, batch_joins, parse_message
+
+class TestLineFramer(unittest.TestCase):
+    def test_lines_split_across_reads(self):
+        framer = LineFramer()
+        self.assertEqual(framer.feed(b"PING :tmi.twi"), [])
+        self.assertEqual(framer.feed(b"tch.tv\r\nPRIVMSG #a :hi\r\nPRIV"), ["PING :tmi.twitch.tv", "PRIVMSG #a :hi"])
+        self.assertEqual(framer.pending(), 4)
+        self.assertEqual(framer.feed(b"MSG #a :yo\r\n"), ["PRIVMSG #a :yo"])
+        self.assertEqual(framer.pending(), 0)
+
+    def test_multibyte_character_split_across_reads(self):
+        framer = LineFramer()
+        data = "PRIVMSG #a :héllo 😂\r\n".encode("utf-8")
+        cut = data.index("😂".encode("utf-8")) + 2
+        self.assertEqual(framer.feed(data[:cut]), [])
+        self.assertEqual(framer.feed(data[cut:]), ["PRIVMSG #a :héllo 😂"])
+
+class TestParseMessage(unittest.TestCase):
+    def test_privmsg_with_colons_in_tags(self):
+        line = "@badge-info=;emotes=25:0-4,6-10;display-name=Viewer :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #streamer :Kappa Kappa what's up: bot?"
+        msg = parse_message(line)
+        self.assertEqual(msg.command, "PRIVMSG")
+        self.assertEqual(msg.user, "viewer")
+        self.assertEqual(msg.channel, "streamer")
+        self.assertEqual(msg.text, "Kappa Kappa what's up: bot?")
+        self.assertEqual(msg.text_lower, "kappa kappa what's up: bot?")
+        self.assertEqual(msg.tags["emotes"], "25:0-4,6-10")
+        self.assertEqual(msg.tag("display-name"), "Viewer")
+
+    def test_escaped_tag_values(self):
+        msg = parse_message("@system-msg=5\\sraiders\\sfrom\\:x :tmi.twitch.tv USERNOTICE #c :hi")
+        self.assertEqual(msg.tag("system-msg"), "5 raiders from;x")
+
+    def test_usernotice_without_trailing(self):
+        msg = parse_message("@msg-id=raid;display-name=Raider;msg-param-viewerCount=50 :tmi.twitch.tv USERNOTICE #channel")
+        self.assertEqual(msg.command, "USERNOTICE")
+        self.assertEqual(msg.channel, "channel")
+        self.assertIsNone(msg.text)
+        self.assertEqual(msg.tag("msg-param-viewerCount"), "50")
+
+    def test_ping_and_numeric(self):
+        ping = parse_message("PING :tmi.twitch.tv")
+        self.assertEqual((ping.command, ping.text, ping.prefix), ("PING", "tmi.twitch.tv", None))
+        welcome = parse_message(":tmi.twitch.tv 001 bot :Welcome, GLHF!")
+        self.assertEqual(welcome.command, "001")
+        self.assertEqual(welcome.params, ["bot"])
+        self.assertIsNone(welcome.channel)
+
+    def test_blank_line(self):
+        self.assertIsNone(parse_message(""))
+
+class TestJoinBatching(unittest.TestCase):
+    def test_batch_joins(self):
+        self.assertEqual(batch_joins(["A", "#b", "c"]), ["JOIN #a,#b,#c\r\n"])
+        lines = batch_joins([f"ch{i}" for i in range(45)], batch_size=20)
+        self.assertEqual([line.count("#") for line in lines], [20, 20, 5])
+
+    def test_join_limiter_window(self):
+        limiter = JoinLimiter(max_joins=20, window=10.0)
+        self.assertEqual(limiter.delay_for(20, now=0.0), 0.0)
+        limiter.record(20, now=0.0)
+        self.assertAlmostEqual(limiter.delay_for(1, now=4.0), 6.0)
+        self.assertEqual(limiter.delay_for(1, now=10.0), 0.0)
+
+class TestIRCConnection(unittest.TestCase):
+    def run_with_server(self, handler, scenario):
+        async def main():
+            server = await asyncio.start_server(handler, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await scenario(port)
+            finally:
+                server.close()
+        return asyncio.run(main())
+
+    def test_login_join_and_keepalive(self):
+        received = []
+        lines = []
+
+        async def handler(reader, writer):
+            writer.write(b"PING :tmi.twitch.tv\r\n:viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #a :hi bot\r\n")
+            while True:
+                data = await reader.readline()
+                if not data:
+                    break
+                received.append(data.decode().strip())
+
+        async def scenario(port):
+            conn = IRCConnection("127.0.0.1", port, "bot", "oauth:x", ["a", "b", "c"], lines.append, use_tls=False, ping_interval=1.0)
+            task = asyncio.ensure_future(conn.run())
+            for _ in range(100):
+                if "PONG :tmi.twitch.tv" in received and lines:
+                    break
+                await asyncio.sleep(0.01)
+            health = conn.health()
+            conn.close()
+            await asyncio.wait_for(task, 2)
+            return health
+
+        health = self.run_with_server(handler, scenario)
+        self.assertEqual(received[:3], ["PASS oauth:x", "NICK bot", "CAP REQ :twitch.tv/tags twitch.tv/commands"])
+        self.assertIn("JOIN #a,#b,#c", received)
+        self.assertIn("PONG :tmi.twitch.tv", received)
+        self.assertEqual(lines, [":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #a :hi bot"])
+        self.assertTrue(health["connected"])
+
+    def test_stalled_connection_reconnects(self):
+        connections = []
+
+        async def handler(reader, writer):
+            # Accept and then go silent, like a half-open link.
+            connections.append(writer)
+            await asyncio.sleep(5)
+
+        async def scenario(port):
+            conn = IRCConnection("127.0.0.1", port, "bot", "oauth:x", ["a"], lambda line: None, use_tls=False, ping_interval=0.1, ping_timeout=0.1)
+            task = asyncio.ensure_future(conn.run())
+            for _ in range(300):
+                if len(connections) >= 2:
+                    break
+                await asyncio.sleep(0.01)
+            health = conn.health()
+            conn.running = False
+            task.cancel()
+            return health
+
+        health = self.run_with_server(handler, scenario)
+        self.assertGreaterEqual(len(connections), 2)
+        self.assertGreaterEqual(health["stalls"], 1)
+        self.assertGreaterEqual(health["reconnects"], 1)
+        self.assertIn("PONG", health["last_error"])
+
+if __name__ == '__main__':
+    unittest.main()
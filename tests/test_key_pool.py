@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+from key_pool import KeyPool, PoolExhausted
+from model_client import ModelClient
+
+def _response(status, text="hi", headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+    response.text = ""
+    response.json.return_value = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    if status >= 400:
+        response.raise_for_status.side_effect = Exception(f"HTTP {status}")
+    return response
+
+class TestKeyPool(unittest.TestCase):
+    def test_spreads_by_remaining_quota_and_latency(self):
+        pool = KeyPool()
+        pool.set_keys([("key-aaaa-1111", 2), ("key-bbbb-2222", 10)])
+        first = pool.acquire(["flash"])
+        first.report(200)
+        self.assertEqual(first.key, "key-aaaa-1111")
+        self.assertEqual(pool.acquire(["flash"]).key, "key-bbbb-2222")  # a has half its quota left
+
+        pool = KeyPool()
+        pool.set_keys([("slow", None), ("fast", None)])
+        with patch("key_pool.time.monotonic", side_effect=[0.0, 0.0, 2.0, 2.0, 2.0, 2.1, 2.2, 2.2]):
+            slow = pool.acquire(["flash"])
+            slow.report(200)
+            fast = pool.acquire(["flash"])
+            fast.report(200)
+            self.assertEqual((slow.key, fast.key), ("slow", "fast"))
+            self.assertEqual(pool.acquire(["flash"]).key, "fast")
+
+    def test_throttled_key_cools_down_then_falls_back_to_next_model(self):
+        pool = KeyPool(cooldown=30)
+        pool.set_keys([("only-key-123", None)])
+        with patch("key_pool.time.monotonic", return_value=100.0):
+            pool.acquire(["flash", "lite"]).report(429)
+            lease = pool.acquire(["flash", "lite"])
+            self.assertEqual(lease.model, "lite")
+            lease.report(429, wait=5)
+            with self.assertRaises(PoolExhausted) as cm:
+                pool.acquire(["flash", "lite"])
+            self.assertEqual(cm.exception.wait, 5)
+            stats = pool.stats()["only...-123"]
+            self.assertEqual((stats["flash"]["throttled"], stats["flash"]["cooling_for"]), (1, 30))
+        with patch("key_pool.time.monotonic", return_value=106.0):
+            self.assertEqual(pool.acquire(["flash", "lite"]).model, "lite")
+
+    def test_quota_is_a_sliding_minute(self):
+        pool = KeyPool(rpm=1)
+        pool.set_keys([("k", None)])
+        with patch("key_pool.time.monotonic", return_value=0.0):
+            pool.acquire(["flash"]).report(200)
+            self.assertFalse(pool.available(["flash"]))
+        with patch("key_pool.time.monotonic", return_value=60.0):
+            self.assertTrue(pool.available(["flash"]))
+
+@patch("model_client.time.sleep")
+@patch("http_client.post")
+class TestPooledRequests(unittest.TestCase):
+    def setUp(self):
+        self.pool = KeyPool()
+        self.patches = [
+            patch("ai_client.KEY_POOL", self.pool),
+            patch("ai_client.MODEL_CLIENT", ModelClient()),
+            patch("ai_client.get_user", return_value={"favouritism_score": 0}),
+            patch("ai_client.get_user_facts", return_value=[]),
+        ]
+        for p in self.patches:
+            p.start()
+        self.config = {"gemini_api_key": "first-key-0001", "personality": "p", "gemini_api_keys": ["second-key-0002"]}
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_config_keys(self, mock_post, mock_sleep):
+        self.assertEqual(ai_client.api_keys(self.config), [("first-key-0001", None), ("second-key-0002", None)])
+        config = {"gemini_api_key": "'first-key-0001'", "gemini_api_keys": ["second-key-0002", {"key": "first-key-0001", "rpm": 5}]}
+        self.assertEqual(ai_client.api_keys(config), [("second-key-0002", None), ("first-key-0001", 5)])
+
+    def test_429_rotates_to_another_key_without_tripping_the_breaker(self, mock_post, mock_sleep):
+        mock_post.side_effect = lambda url, **kwargs: _response(429 if kwargs["headers"]["x-goog-api-key"] == "first-key-0001" else 200, "from second")
+        self.assertEqual(ai_client.generate_ai_response("q", "u", self.config), "from second")
+        self.assertEqual(ai_client.generate_ai_response("q", "u", self.config), "from second")
+        self.assertEqual(mock_post.call_count, 3)  # the throttled key sat out the second call
+        self.assertFalse(any("key" in call.args[0] for call in mock_post.call_args_list))  # only ever in the header
+
+        stats = ai_client.MODEL_CLIENT.stats()
+        self.assertEqual(stats["key_rotations"], 1)
+        self.assertEqual(stats["breaker"]["consecutive_failures"], 0)
+        keys = self.pool.stats()
+        self.assertEqual(keys["firs...0001"]["gemini-2.0-flash"]["throttled"], 1)
+        self.assertEqual(keys["seco...0002"]["gemini-2.0-flash"]["requests"], 2)
+
+    def test_every_key_throttled_uses_the_fallback_model(self, mock_post, mock_sleep):
+        mock_post.side_effect = lambda url, **kwargs: _response(429 if "flash:" in url else 200, "lite")
+        self.assertEqual(ai_client.generate_ai_response("q", "u", self.config), "lite")
+        self.assertIn("/gemini-2.0-flash-lite:", mock_post.call_args.args[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+from ai_executor import PRIORITY_BACKGROUND, PRIORITY_REPLY
+from model_client import CircuitBreaker, ModelClient, ModelUnavailable, retry_after
+
+def _response(status, body=None, headers=None, text=""):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+    response.text = text
+    response.json.return_value = body or {}
+    if status >= 400:
+        response.raise_for_status.side_effect = Exception(f"HTTP {status}")
+    return response
+
+OK = _response(200, {"candidates": [{"content": {"parts": [{"text": "hi"}]}}]})
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_probes_and_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        with patch("model_client.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow(important=True))
+            self.assertFalse(breaker.allow(important=False))
+            breaker.record_failure()
+            self.assertEqual(breaker.state, "open")
+            self.assertFalse(breaker.allow(important=True))
+        with patch("model_client.time.monotonic", return_value=111.0):
+            self.assertFalse(breaker.allow(important=False))
+            self.assertTrue(breaker.allow(important=True))
+            self.assertEqual(breaker.state, "half_open")
+            self.assertFalse(breaker.allow(important=True))  # one probe at a time
+            breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow(important=False))
+
+class TestRetryAfter(unittest.TestCase):
+    def test_header_and_google_retry_delay(self):
+        self.assertEqual(retry_after(_response(429, headers={"Retry-After": "3"})), 3.0)
+        body = '{"error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "7s"}]}}'
+        self.assertEqual(retry_after(_response(429, text=body)), 7.0)
+        self.assertIsNone(retry_after(_response(503)))
+
+@patch("model_client.time.sleep")
+@patch("http_client.post")
+class TestModelClient(unittest.TestCase):
+    def test_retries_transient_errors_honouring_retry_after(self, mock_post, mock_sleep):
+        mock_post.side_effect = [_response(429, headers={"Retry-After": "2"}), _response(503), OK]
+        client = ModelClient(base_delay=0.1)
+        self.assertEqual(client.post("http://api/x", {}), OK.json.return_value)
+        waits = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertGreaterEqual(waits[0], 2.0)
+        self.assertLessEqual(waits[1], 0.2)
+        self.assertEqual(client.stats()["retries"], 2)
+        self.assertEqual(client.stats()["breaker"]["state"], "closed")
+
+    def test_gives_up_and_opens_breaker(self, mock_post, mock_sleep):
+        mock_post.return_value = _response(500)
+        client = ModelClient(max_retries=2, failure_threshold=3)
+        with self.assertRaises(ModelUnavailable):
+            client.post("http://api/x", {})
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(client.stats()["breaker"]["state"], "open")
+        with self.assertRaises(ModelUnavailable):
+            client.post("http://api/x", {})
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(client.stats()["fast_fails"], 1)
+
+    def test_long_retry_after_and_client_errors_are_not_retried(self, mock_post, mock_sleep):
+        client = ModelClient(max_retry_after=5)
+        mock_post.return_value = _response(429, headers={"Retry-After": "60"})
+        with self.assertRaises(ModelUnavailable):
+            client.post("http://api/x", {})
+        mock_post.return_value = _response(400)
+        with self.assertRaises(Exception):
+            client.post("http://api/x", {})
+        self.assertEqual(mock_post.call_count, 2)
+        mock_sleep.assert_not_called()
+
+    def test_background_calls_are_shed_while_unhealthy(self, mock_post, mock_sleep):
+        mock_post.return_value = _response(500)
+        client = ModelClient(max_retries=0)
+        with self.assertRaises(ModelUnavailable):
+            client.post("http://api/x", {})
+        with patch("model_client.current_job", return_value=(PRIORITY_BACKGROUND, None)):
+            with self.assertRaises(ModelUnavailable):
+                client.post("http://api/x", {})
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(client.stats()["shed"], 1)
+
+    def test_retries_stop_at_the_job_deadline(self, mock_post, mock_sleep):
+        mock_post.return_value = _response(503, headers={"Retry-After": "5"})
+        client = ModelClient()
+        with patch("model_client.current_job", return_value=(PRIORITY_REPLY, time.monotonic() + 1)):
+            with self.assertRaises(ModelUnavailable):
+                client.post("http://api/x", {})
+        self.assertEqual(mock_post.call_count, 1)
+
+    def test_slow_reply_is_hedged(self, mock_post, mock_sleep):
+        release = threading.Event()
+        calls = []
+
+        def post(url, **kwargs):
+            calls.append(url)
+            if len(calls) == 1:
+                release.wait(5)  # the first copy stalls
+            return OK
+
+        mock_post.side_effect = post
+        client = ModelClient(hedge_min_delay=0.05)
+        client.latencies.extend([0.01] * 50)
+        with patch("model_client.current_job", return_value=(PRIORITY_REPLY, None)):
+            self.assertEqual(client.post("http://api/x", {}), OK.json.return_value)
+        release.set()
+        stats = client.stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+
+    def test_hedge_pool_is_resized_by_configure(self, mock_post, mock_sleep):
+        client = ModelClient(hedge_workers=2)
+        self.assertEqual(client.hedge_pool._max_workers, 2)
+        old = client.hedge_pool
+        client.configure({"hedge_workers": 6})
+        self.assertEqual(client.hedge_pool._max_workers, 6)
+        client.configure({"max_retries": 1})
+        self.assertIsNot(client.hedge_pool, old)
+        self.assertEqual(client.hedge_pool._max_workers, 6)
+
+class TestGenerateAIResponseFailure(unittest.TestCase):
+    @patch('ai_client.get_user_facts', return_value=[])
+    @patch('ai_client.get_user', return_value={"favouritism_score": 0})
+    @patch('http_client.post', return_value=_response(400))
+    def test_failure_returns_empty_string(self, mock_post, mock_get_user, mock_get_user_facts):
+        with patch("ai_client.MODEL_CLIENT", ModelClient(max_retries=0)):
+            self.assertEqual(ai_client.generate_ai_response("q", "user", {"gemini_api_key": "k", "personality": "p"}), "")
+
+if __name__ == '__main__':
+    unittest.main()
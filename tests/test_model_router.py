@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+from games import TriviaGame
+from model_router import DEFAULT_ROUTES, MockBackend, generation_config, route_for
+
+MOCK_CONFIG = {"gemini_api_key": "fake", "model_backend": "mock", "personality": "a very long personality " * 20}
+
+class TestRouteFor(unittest.TestCase):
+    def test_overrides_merge_over_defaults(self):
+        config = {"model_routes": {"classify": {"model": "gemini-2.0-flash", "generation": {"topK": 1}}}}
+        route = route_for("classify", config)
+        self.assertEqual(route["model"], "gemini-2.0-flash")
+        self.assertEqual(route["generation"], {"temperature": 0.0, "topK": 1})
+        self.assertTrue(route["lean"])
+        self.assertEqual(DEFAULT_ROUTES["classify"]["model"], "gemini-2.0-flash-lite")
+        self.assertEqual(route_for("unknown", {})["model"], DEFAULT_ROUTES["reply"]["model"])
+
+    def test_generation_config_for_json_routes(self):
+        generation = generation_config(route_for("trivia", {}), maxOutputTokens=50)
+        self.assertEqual(generation["responseMimeType"], "application/json")
+        self.assertEqual(generation["responseSchema"]["required"], ["question", "answer"])
+        self.assertEqual(generation["maxOutputTokens"], 50)
+        self.assertNotIn("responseMimeType", generation_config(route_for("reply", {})))
+
+class TestRunTask(unittest.TestCase):
+    def setUp(self):
+        ai_client.MOCK_BACKEND.reset()
+
+    def tearDown(self):
+        ai_client.MOCK_BACKEND.reset()
+
+    @patch('ai_client.get_user')
+    def test_utility_tasks_are_lean_and_use_their_model(self, mock_get_user):
+        results = ai_client.classify_sentiment_batch([("a", "love it"), ("b", "meh")], MOCK_CONFIG)
+        self.assertEqual(results, [{"sentiment": "positive", "topics": ["mock"]}, None])
+
+        task, model, payload = ai_client.MOCK_BACKEND.calls[0]
+        self.assertEqual((task, model), ("classify", "gemini-2.0-flash-lite"))
+        text = payload["contents"][0]["parts"][0]["text"]
+        self.assertNotIn("personality", text)
+        self.assertIn("0. love it", text)
+        self.assertEqual(payload["generationConfig"]["responseSchema"], ai_client.SENTIMENT_BATCH_SCHEMA)
+        mock_get_user.assert_not_called()
+        self.assertEqual(ai_client.route_stats()["classify"]["model"], "gemini-2.0-flash-lite")
+
+    def test_fenced_and_broken_json(self):
+        ai_client.MOCK_BACKEND.responses["extract"] = "```json\n[{\"index\": 0, \"facts\": [\"has a cat\"]}]\n```"
+        self.assertEqual(ai_client.extract_facts_batch([("a", "my cat")], MOCK_CONFIG), [["has a cat"]])
+        ai_client.MOCK_BACKEND.responses["classify"] = "not json"
+        self.assertIsNone(ai_client.run_task("classify", "x", MOCK_CONFIG))
+
+    def test_trivia_game_uses_the_trivia_route(self):
+        ai_client.MOCK_BACKEND.responses["trivia"] = {"question": "Capital of France?", "answer": "Paris"}
+        game = TriviaGame.__new__(TriviaGame)
+        game.config, game.channel, game.is_active = MOCK_CONFIG, "chan", True
+        game.send_message_callback = MagicMock()
+        game.fetch_question()
+        self.assertEqual((game.question, game.answer), ("Capital of France?", "paris"))
+        self.assertEqual(ai_client.MOCK_BACKEND.calls[0][:2], ("trivia", "gemini-2.0-flash-lite"))
+
+class TestRoutedReplies(unittest.TestCase):
+    @patch('ai_client.get_user_facts', return_value=[])
+    @patch('ai_client.get_user', return_value={"favouritism_score": 0})
+    @patch('http_client.post')
+    def test_reply_and_summary_models_come_from_config(self, mock_post, mock_get_user, mock_get_user_facts):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}
+        config = {"gemini_api_key": "k", "personality": "p",
+                  "model_routes": {"summarize": {"model": "gemini-2.5-pro", "generation": {"temperature": 0.2}}}}
+
+        self.assertEqual(ai_client.generate_ai_response("hi", "u", config), "ok")
+        self.assertIn("/gemini-2.0-flash:generateContent", mock_post.call_args.args[0])
+        ai_client.generate_ai_response("summarize chat", "u", config, task="summarize")
+        self.assertIn("/gemini-2.5-pro:generateContent", mock_post.call_args.args[0])
+        generation = mock_post.call_args.kwargs["json"]["generationConfig"]
+        self.assertEqual(generation["temperature"], 0.2)
+        self.assertIn("maxOutputTokens", generation)
+
+    @patch('ai_client.get_user_facts', return_value=[])
+    @patch('ai_client.get_user', return_value={"favouritism_score": 0})
+    def test_mock_backend_streams_one_delta(self, mock_get_user, mock_get_user_facts):
+        backend = MockBackend()
+        backend.responses["reply"] = "Canned reply."
+        with patch("ai_client.MOCK_BACKEND", backend):
+            self.assertEqual(list(ai_client.stream_ai_response("hi", "u", MOCK_CONFIG)), ["Canned reply."])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from outbound import OutboundScheduler, TokenBucket, chunk_message
+
+class TestChunkMessage(unittest.TestCase):
+    def test_chunks_fit_in_bytes(self):
+        text = "héllo wörld 😂 " * 60
+        chunks = chunk_message(text, max_bytes=100)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk.encode("utf-8")), 100)
+        self.assertEqual(" ".join(chunks).split(), text.split())
+
+    def test_long_word_is_cut_on_character_boundary(self):
+        chunks = chunk_message("😂" * 30, max_bytes=10)
+        self.assertEqual(chunks[0], "😂😂")
+        self.assertEqual("".join(chunks), "😂" * 30)
+
+    def test_short_and_blank(self):
+        self.assertEqual(chunk_message("hi"), ["hi"])
+        self.assertEqual(chunk_message("😂😂", max_bytes=4), ["😂", "😂"])
+        with self.assertRaises(ValueError):
+            chunk_message("😂", max_bytes=3)
+        self.assertEqual(chunk_message("   "), [])
+
+class TestTokenBucket(unittest.TestCase):
+    def test_tokens_return_after_period(self):
+        bucket = TokenBucket(2, 30.0)
+        self.assertEqual(bucket.take(now=0.0), 0.0)
+        self.assertEqual(bucket.take(now=1.0), 0.0)
+        self.assertAlmostEqual(bucket.take(now=5.0), 25.0)
+        self.assertEqual(bucket.take(now=30.0), 0.0)
+
+class TestOutboundScheduler(unittest.TestCase):
+    def setUp(self):
+        self.writes = []
+        self.written = threading.Event()
+        self.scheduler = OutboundScheduler(self.record, max_bytes=500)
+
+    def record(self, data):
+        self.writes.append(data)
+        self.written.set()
+
+    def wait_for(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if sum(w.count(b"\r\n") for w in self.writes) >= count:
+                return
+            time.sleep(0.01)
+
+    def test_per_channel_order_and_single_write(self):
+        for i in range(5):
+            self.scheduler.enqueue("a", f"chunk {i}")
+        self.scheduler.enqueue("b", "other")
+        self.scheduler.start()
+        self.wait_for(6)
+        self.scheduler.stop()
+        lines = b"".join(self.writes).decode().split("\r\n")
+        self.assertEqual([l for l in lines if l.startswith("PRIVMSG #a")], [f"PRIVMSG #a :chunk {i}" for i in range(5)])
+        self.assertIn("PRIVMSG #b :other", lines)
+        # The first pass sends one due chunk per channel in one write.
+        self.assertEqual(self.writes[0].count(b"\r\n"), 2)
+        self.assertEqual(self.scheduler.stats()["sent"], 6)
+
+    def test_rate_limit_holds_messages(self):
+        self.scheduler.bucket = TokenBucket(2, 60.0)
+        for i in range(4):
+            self.scheduler.enqueue("a", f"m{i}")
+        self.scheduler.start()
+        self.wait_for(2)
+        time.sleep(0.1)
+        self.scheduler.stop()
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(stats["depth"], 2)
+        self.assertGreaterEqual(stats["throttled"], 1)
+
+    def test_typing_delay_spaces_chunks(self):
+        self.scheduler.enqueue("a", "first", delay=0.05)
+        self.scheduler.enqueue("a", "second", delay=0.05)
+        start = time.monotonic()
+        self.scheduler.start()
+        self.wait_for(2)
+        elapsed = time.monotonic() - start
+        self.scheduler.stop()
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual(b"".join(self.writes), b"PRIVMSG #a :first\r\nPRIVMSG #a :second\r\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+from prompt_builder import PromptBuilder, clean_lines, estimate_tokens, is_emote_only, max_output_tokens
+
+class TestCleanLines(unittest.TestCase):
+    def test_emote_only_lines(self):
+        self.assertTrue(is_emote_only("KEKW KEKW"))
+        self.assertTrue(is_emote_only("pokiHype catJAM !!!"))
+        self.assertFalse(is_emote_only("LUL that was close"))
+
+    def test_drops_emotes_and_duplicates_keeping_latest(self):
+        lines = ["a: hello there", "b: KEKW", "c: first!", "d: Hello  there", "", "e: PogChamp pokiHype"]
+        self.assertEqual(clean_lines(lines), ["c: first!", "d: Hello  there"])
+
+class TestPromptBuilder(unittest.TestCase):
+    def setUp(self):
+        self.builder = PromptBuilder()
+        self.config = {"personality": "friendly", "max_response_length": 300,
+                       "personality_traits": {"likes": ["cats"], "dislikes": ["lag"]}}
+
+    def test_personality_segment_cached_until_config_changes(self):
+        self.builder.build("hi", "u", self.config)
+        self.builder.build("hi again", "u", self.config)
+        self.assertEqual(self.builder.stats()["static_builds"], 1)
+        self.config["personality_traits"]["likes"].append("dogs")
+        built = self.builder.build("hi", "u", self.config)
+        self.assertEqual(self.builder.stats()["static_builds"], 2)
+        self.assertIn("Likes: cats, dogs", built.text)
+        self.assertIn("ideally under 300 characters", built.text)
+
+    def test_growing_trait_lists_are_capped_to_newest(self):
+        self.config["personality_traits"]["likes"] = [f"topic number {i}" for i in range(500)]
+        built = self.builder.build("hi", "u", self.config)
+        self.assertIn("topic number 499", built.text)
+        self.assertNotIn("topic number 0,", built.text)
+        self.assertLessEqual(estimate_tokens(self.builder.personality_segment(self.config, 250)), 250)
+
+    def test_budget_trims_history_before_captions_and_facts(self):
+        self.config["prompt_budget"] = {"total": 200, "captions": 100, "history": 100, "facts": 50}
+        history = [f"viewer{i}: message number {i} about the game" for i in range(50)]
+        captions = [f"caption line {i} spoken aloud" for i in range(50)]
+        built = self.builder.build("u says: what now?", "u", self.config, facts=["has a cat"],
+                                   captions=captions, history=history, site="ai")
+        self.assertIn("Known facts about u: has a cat", built.text)
+        self.assertIn("caption line 49", built.text)
+        self.assertNotIn("caption line 0\n", built.text)
+        self.assertLess(built.sections["history"], built.sections["captions"])
+        self.assertTrue(built.text.endswith("\nu says: what now?"))
+        self.assertLessEqual(built.tokens, 200 + 10)
+        self.assertEqual(built.max_output_tokens, max_output_tokens(300))
+        self.assertEqual(self.builder.stats()["sites"]["ai"]["calls"], 1)
+
+class TestGenerateAIResponsePrompt(unittest.TestCase):
+    @patch('ai_client.touch_user_facts')
+    @patch('ai_client.get_user_facts', return_value=["likes tea"])
+    @patch('ai_client.get_user', return_value={"favouritism_score": 3})
+    @patch('http_client.post')
+    def test_history_and_output_limit_sent(self, mock_post, mock_get_user, mock_get_user_facts, mock_touch):
+        mock_post.return_value.json.return_value = {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}
+        monitor = MagicMock()
+        monitor.get_context.return_value = "we're heading to the boss\nLUL"
+        config = {"gemini_api_key": "fake", "personality": "friendly", "max_response_length": 450}
+        history = [{"user": "a", "message": "KEKW"}, {"user": "b", "message": "nice shot"}]
+
+        ai_client.generate_ai_response("c says: hey", "c", config, context_monitor=monitor, history=history, site="mention")
+
+        sent = mock_post.call_args[1]["json"]
+        text = sent["contents"][0]["parts"][0]["text"]
+        self.assertIn("Recent spoken context (spoken by the streamer):\nwe're heading to the boss\n", text)
+        self.assertIn("b: nice shot\nc says: hey", text)
+        self.assertNotIn("KEKW", text)
+        self.assertIn("Known facts about c: likes tea", text)
+        mock_touch.assert_called_once_with("c", ["likes tea"])
+        self.assertEqual(sent["generationConfig"]["maxOutputTokens"], max_output_tokens(450))
+
+if __name__ == '__main__':
+    unittest.main()
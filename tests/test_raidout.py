@@ -12,9 +12,10 @@ class TestRaidOut(unittest.TestCase):
             "channels": ["mychannel"],
             "gemini_api_key": "key",
             "personality": "friendly",
-            "auto_chat_freq": 0.2
+            "auto_chat_freq": 0.2,
+            "chat_log": {"enabled": False}
         }
-        bot.MEMORY = {"chat_history": []}
+        bot.MEMORY.clear()
 
         with patch('bot.TwitchEventSub'), \
              patch('bot.create_tables'), \
@@ -25,8 +26,8 @@ class TestRaidOut(unittest.TestCase):
             self.bot.sock = MagicMock()
             self.bot.send_message = MagicMock()
 
-    @patch('bot.requests.post')
-    @patch('bot.requests.get')
+    @patch('bot.http_client.post')
+    @patch('bot.http_client.get')
     @patch('bot.generate_ai_response')
     def test_raidout_sequence_api_delayed(self, mock_ai, mock_get, mock_post):
         mock_ai.return_value = "Hype Message!"
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+from ai_client import ResponseCache, normalize_prompt
+from model_client import ModelClient
+
+CONFIG = {"personality": "friendly"}
+
+class TestResponseCache(unittest.TestCase):
+    def test_normalized_prompts_share_a_key(self):
+        cache = ResponseCache()
+        self.assertEqual(normalize_prompt("  What GAME is this?? "), "what game is this")
+        self.assertEqual(cache.key("ai", "what game is this", CONFIG), cache.key("ai", "What game, is THIS?", CONFIG))
+        self.assertNotEqual(cache.key("ai", "hi", CONFIG), cache.key("roast", "hi", CONFIG))
+        self.assertNotEqual(cache.key("ai", "hi", CONFIG), cache.key("ai", "hi", {"personality": "grumpy"}))
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache()
+        key = cache.key("gemini", "q", CONFIG)
+        with patch("ai_client.time.monotonic", return_value=100.0):
+            cache.put(key, "answer", ttl=10)
+            self.assertEqual(cache.get(key), "answer")
+        with patch("ai_client.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_byte_bound_evicts_least_recently_used(self):
+        cache = ResponseCache(max_bytes=10)
+        a, b, c = (cache.key("ai", p, CONFIG) for p in "abc")
+        cache.put(a, "aaaa", ttl=60)
+        cache.put(b, "bbbb", ttl=60)
+        cache.get(a)
+        cache.put(c, "cccc", ttl=60)
+        self.assertEqual(cache.get(a), "aaaa")
+        self.assertIsNone(cache.get(b))
+        stats = cache.stats()
+        self.assertEqual(stats["bytes"], 8)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], {"ai": 2})
+        self.assertEqual(stats["misses"], {"ai": 1})
+
+    def test_invalidate_retires_old_keys(self):
+        cache = ResponseCache()
+        old = cache.key("roast", "bob", CONFIG)
+        cache.put(old, "burn", ttl=60)
+        cache.invalidate()
+        self.assertIsNone(cache.get(cache.key("roast", "bob", CONFIG)))
+        self.assertNotEqual(old, cache.key("roast", "bob", CONFIG))
+
+class TestGenerateAIResponseCaching(unittest.TestCase):
+    def setUp(self):
+        ai_client.RESPONSE_CACHE.invalidate()
+        self.config = {
+            "gemini_api_key": "fake",
+            "personality": "friendly",
+            "response_cache": {"enabled": True, "sites": {"gemini": 60, "ai": 0}},
+        }
+
+    def tearDown(self):
+        ai_client.RESPONSE_CACHE.invalidate()
+
+    def reply(self, text):
+        response = MagicMock()
+        response.json.return_value = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+        return response
+
+    @patch('ai_client.get_user_facts', return_value=[])
+    @patch('ai_client.get_user', return_value={"favouritism_score": 0})
+    @patch('http_client.post')
+    def test_opted_in_site_is_served_from_cache(self, mock_post, mock_get_user, mock_get_user_facts):
+        mock_post.return_value = self.reply("It's Elden Ring")
+        first = ai_client.generate_ai_response("prompt 1", "a", self.config, cache_key="what game is this", cache_site="gemini")
+        second = ai_client.generate_ai_response("prompt 2", "b", self.config, cache_key="What game is this?", cache_site="gemini")
+        self.assertEqual(first, second)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('ai_client.get_user_facts', return_value=[])
+    @patch('ai_client.get_user', return_value={"favouritism_score": 0})
+    @patch('http_client.post')
+    def test_sites_without_ttl_and_failures_are_not_cached(self, mock_post, mock_get_user, mock_get_user_facts):
+        mock_post.return_value = self.reply("hello")
+        ai_client.generate_ai_response("p", "a", self.config, cache_key="hi", cache_site="ai")
+        ai_client.generate_ai_response("p", "a", self.config, cache_key="hi", cache_site="ai")
+        self.assertEqual(mock_post.call_count, 2)
+
+        mock_post.side_effect = Exception("boom")
+        with patch("ai_client.MODEL_CLIENT", ModelClient(max_retries=0)):
+            self.assertEqual(ai_client.generate_ai_response("p", "a", self.config, cache_key="q", cache_site="gemini"), "")
+        self.assertEqual(ai_client.RESPONSE_CACHE.stats()["entries"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from prompt_builder import PromptBuilder
+from retrieval import RetrievalIndex, terms
+
+FILLER = ["what a play", "gg everyone", "the music is great today", "anyone else hungry", "lets go team"]
+
+class TestRetrievalIndex(unittest.TestCase):
+    def index(self, **settings):
+        return RetrievalIndex(n_features=1 << 12, min_score=0.5, **settings)
+
+    def test_terms(self):
+        self.assertEqual(terms("The Boss is at 50% HP, isn't it?"), ["boss", "50", "hp", "isn't"])
+
+    def test_finds_relevant_old_lines_in_the_same_channel(self):
+        index = self.index()
+        index.add("alice: the malenia fight is brutal, waterfowl dance every time", "a")
+        index.add("carol: malenia waterfowl dance in channel b", "b")
+        for i in range(50):
+            index.add(f"viewer{i}: {FILLER[i % len(FILLER)]}", "a")
+        index.add("malenia has a scarlet rot phase too")  # a caption, visible everywhere
+
+        found = index.search("how do you dodge waterfowl dance from malenia?", "a", k=2)
+        self.assertEqual(found, ["alice: the malenia fight is brutal, waterfowl dance every time",
+                                 "malenia has a scarlet rot phase too"])
+        self.assertEqual(index.search("pizza toppings", "a"), [])
+        self.assertEqual(index.search("the", "a"), [])  # stopwords only
+
+    def test_exclude_and_budget(self):
+        index = self.index()
+        lines = [f"u: talking about speedrun route number {i} with some extra words" for i in range(5)]
+        for i, line in enumerate(lines):
+            index.add(line, "a")
+            for filler in FILLER:
+                index.add(f"v{i}: {filler}", "a")
+        found = index.search("speedrun route", "a", k=5, exclude=lines[:2])
+        self.assertEqual(found, lines[2:])
+        self.assertEqual(len(index.search("speedrun route", "a", k=5, budget=40)), 2)
+
+    def test_emote_only_lines_are_not_indexed(self):
+        index = self.index()
+        self.assertFalse(index.add("KEKW KEKW", "a"))
+        self.assertEqual(len(index), 0)
+
+    def test_compaction_keeps_frequencies_consistent(self):
+        index = self.index(max_docs=40)
+        texts = [f"u{i}: {FILLER[i % len(FILLER)]} round {i % 7}" for i in range(120)]
+        for text in texts:
+            index.add(text, "a")
+        self.assertLessEqual(len(index), 50)
+        fresh = self.index()
+        for text in index.texts:
+            fresh.add(text, "a")
+        np.testing.assert_array_equal(index.df, fresh.df)
+        self.assertAlmostEqual(index.total_len, fresh.total_len)
+        self.assertEqual(index.search("music round", "a", k=3), fresh.search("music round", "a", k=3))
+
+class TestRelatedSection(unittest.TestCase):
+    def test_related_lines_are_trimmed_first(self):
+        builder = PromptBuilder()
+        config = {"personality": "p", "prompt_budget": {"total": 120, "related": 100, "history": 100}}
+        built = builder.build("question?", "u", config, history=["a: recent line"],
+                              related=["b: an earlier relevant line " * 10, "c: another one " * 10])
+        self.assertIn("a: recent line", built.text)
+        self.assertLess(built.sections["related"], 2)
+        built = builder.build("question?", "u", {"personality": "p"}, related=["b: earlier line"])
+        self.assertIn("Earlier in chat (possibly relevant):\nb: earlier line", built.text)
+
+if __name__ == '__main__':
+    unittest.main()
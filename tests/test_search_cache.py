@@ -0,0 +1,136 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ai_client
+import database
+import search_cache
+from search_cache import SearchCache, normalize_query
+
+class TestNormalizeQuery(unittest.TestCase):
+    def test_equivalent_queries(self):
+        self.assertEqual(normalize_query("What is Elden Ring?"), "what is elden ring")
+        self.assertEqual(normalize_query("hey bot, what is  ELDEN ring"), "what is elden ring")
+        self.assertEqual(normalize_query("node.js vs c++"), "node.js vs c++")
+
+class TestSearchCache(unittest.TestCase):
+    def test_hit_after_first_fetch(self):
+        cache = SearchCache(ttl=60)
+        fetch = MagicMock(return_value=("results", True))
+        self.assertEqual(cache.get("Elden Ring?", fetch), "results")
+        self.assertEqual(cache.get("elden ring", fetch), "results")
+        fetch.assert_called_once()
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["api_calls_today"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_failures_and_expired_entries_refetch(self):
+        cache = SearchCache(ttl=60)
+        self.assertEqual(cache.get("q", lambda: ("Search failed: 500", False)), "Search failed: 500")
+        fetch = MagicMock(return_value=("ok", True))
+        with patch("search_cache.time.time", return_value=1000.0):
+            cache.get("q", fetch)
+        with patch("search_cache.time.time", return_value=1061.0):
+            cache.get("q", fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_concurrent_identical_queries_share_one_request(self):
+        cache = SearchCache(ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "shared", True
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("trending topic", fetch))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        while cache.stats()["coalesced"] < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["shared"] * 5)
+
+    def test_quota_serves_stale_then_refuses(self):
+        cache = SearchCache(ttl=60, daily_quota=1)
+        with patch("search_cache.time.time", return_value=1000.0):
+            cache.get("a", lambda: ("old", True))
+        with patch("search_cache.time.time", return_value=2000.0):
+            self.assertEqual(cache.get("a", lambda: ("new", True)), "old")
+            self.assertTrue(cache.get("b", lambda: ("new", True)).startswith("Search failed:"))
+        stats = cache.stats()
+        self.assertEqual(stats["stale_served"], 1)
+        self.assertEqual(stats["quota_remaining"], 0)
+
+class TestPersistentSearchCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_db_file = database.DB_FILE
+        database.DB_FILE = os.path.join(self.tmpdir.name, "test.db")
+        database.create_tables()
+
+    def tearDown(self):
+        database.ENGINE.close_all()
+        database.DB_FILE = self.original_db_file
+        self.tmpdir.cleanup()
+
+    def test_survives_restart(self):
+        SearchCache(persist=True).get("Elden Ring", lambda: ("stored", True))
+        fetch = MagicMock(return_value=("fresh", True))
+        restarted = SearchCache(persist=True)
+        self.assertEqual(restarted.get("elden ring", fetch), "stored")
+        fetch.assert_not_called()
+        self.assertEqual(restarted.stats()["persisted_hits"], 1)
+        self.assertEqual(database.prune_search_cache(float("inf")), 1)
+
+    def test_sqlite_is_used_outside_the_lock(self):
+        cache = SearchCache(persist=True)
+        held = []
+        real_load, real_save = search_cache.load_search_result, search_cache.save_search_result
+
+        def check(real):
+            return lambda *args: held.append(cache.lock.locked()) or real(*args)
+
+        with patch("search_cache.load_search_result", check(real_load)), \
+             patch("search_cache.save_search_result", check(real_save)):
+            cache.get("a", lambda: ("stored", True))
+        self.assertEqual(held, [False, False])
+
+    def test_expired_rows_are_pruned_periodically(self):
+        with patch("search_cache.time.time", return_value=1000.0):
+            SearchCache(ttl=60, persist=True, keep_stale=100).get("old", lambda: ("old", True))
+        cache = SearchCache(ttl=60, persist=True, keep_stale=100)
+        with patch("search_cache.time.time", return_value=2000.0):
+            cache.get("new", lambda: ("new", True))
+            cache.get("newer", lambda: ("newer", True))
+        self.assertIsNone(database.load_search_result("|old"))
+        self.assertIsNotNone(database.load_search_result("|new"))
+        self.assertEqual(cache.last_prune, 2000.0)
+
+class TestPerformGoogleSearch(unittest.TestCase):
+    def setUp(self):
+        self.original_cache = ai_client.SEARCH_CACHE
+        ai_client.SEARCH_CACHE = SearchCache()
+
+    def tearDown(self):
+        ai_client.SEARCH_CACHE = self.original_cache
+
+    @patch('ai_client.http_client.get')
+    def test_repeated_search_hits_cache(self, mock_get):
+        mock_get.return_value.json.return_value = {"items": [{"title": "T", "snippet": "S", "link": "L"}]}
+        first = ai_client.perform_google_search("what game is this", "key", "cx")
+        second = ai_client.perform_google_search("What game is this?", "key", "cx")
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+        ai_client.perform_google_search("what game is this", "key", "other-engine")
+        self.assertEqual(mock_get.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 import json
+import os
+import tempfile
+import ai_client
 import bot
+from sentiment import SentimentAnalyzer
 
 class TestSentiment(unittest.TestCase):
     def setUp(self):
@@ -11,19 +16,19 @@ class TestSentiment(unittest.TestCase):
             "gemini_api_key": "fake"
         }
 
-    @patch('bot.generate_ai_response')
-    def test_markdown_json(self, mock_ai):
-        # AI returns markdown wrapped JSON
-        mock_ai.return_value = "```json\n{\"sentiment\": \"positive\", \"topics\": [\"coding\"]}\n```"
+    @patch('bot.run_task')
+    def test_classification_updates_likes(self, mock_ai):
+        # The classify route returns parsed JSON
+        mock_ai.return_value = {"sentiment": "positive", "topics": ["coding"]}
 
         bot.analyze_sentiment_and_update_preferences("I love coding", "user1", self.config)
 
         self.assertIn("coding", self.config["personality_traits"]["likes"])
 
-    @patch('bot.generate_ai_response')
-    def test_plain_text_error(self, mock_ai):
-        # AI returns error text
-        mock_ai.return_value = "Hmm... I couldn't come up with a response!"
+    @patch('bot.run_task')
+    def test_unparseable_response(self, mock_ai):
+        # run_task returns None when the model's output isn't JSON
+        mock_ai.return_value = None
 
         # Should catch exception and log, not crash
         try:
@@ -31,5 +36,172 @@ class TestSentiment(unittest.TestCase):
         except Exception:
             self.fail("analyze_sentiment_and_update_preferences raised Exception unexpectedly!")
 
+class TestBatchedSentiment(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            "personality_traits": {"likes": ["games"], "dislikes": []},
+            "gemini_api_key": "fake"
+        }
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_patch = patch('bot.CONFIG_FILE', os.path.join(self.tmpdir.name, "config.json"))
+        self.config_patch.start()
+
+    def tearDown(self):
+        self.config_patch.stop()
+        self.tmpdir.cleanup()
+
+    @patch('bot.create_or_update_user')
+    def test_apply_results_in_bulk(self, mock_update):
+        deltas = bot.apply_sentiment_results([
+            ("alice", "positive", ["games", "music"]),
+            ("alice", "positive", ["music"]),
+            ("bob", "negative", ["lag"]),
+            ("carol", "neutral", ["weather"]),
+            ("bob", "positive", []),
+        ], self.config)
+
+        self.assertEqual(deltas, {"alice": 2, "bob": 0})
+        mock_update.assert_called_once_with("alice", favouritism_score_increment=2)
+        self.assertEqual(self.config["personality_traits"]["likes"], ["games", "music"])
+        self.assertEqual(self.config["personality_traits"]["dislikes"], ["lag"])
+        with open(bot.CONFIG_FILE) as f:
+            self.assertEqual(json.load(f)["personality_traits"]["likes"], ["games", "music"])
+
+    @patch('ai_client.http_client.post')
+    def test_batch_classification_is_one_request(self, mock_post):
+        items = [{"index": 0, "sentiment": "positive", "topics": ["art"]}, {"index": 2, "sentiment": "negative", "topics": []}]
+        mock_post.return_value.json.return_value = {"candidates": [{"content": {"parts": [{"text": json.dumps(items)}]}}]}
+
+        results = ai_client.classify_sentiment_batch([("a", "love the art"), ("b", "ok"), ("c", "boo")], self.config)
+
+        self.assertEqual(mock_post.call_count, 1)
+        sent = mock_post.call_args[1]["json"]
+        self.assertEqual(sent["generationConfig"]["responseMimeType"], "application/json")
+        self.assertIn("2. boo", sent["contents"][0]["parts"][0]["text"])
+        self.assertEqual(results, [{"sentiment": "positive", "topics": ["art"]}, None, {"sentiment": "negative", "topics": []}])
+
+    @patch('ai_client.http_client.post')
+    def test_batch_classification_survives_bad_output(self, mock_post):
+        mock_post.return_value.json.return_value = {"candidates": [{"content": {"parts": [{"text": "not json"}]}}]}
+        self.assertEqual(ai_client.classify_sentiment_batch([("a", "hi")], self.config), [None])
+
+class TestLexiconSentiment(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = SentimentAnalyzer()
+
+    def label(self, text):
+        return self.analyzer.score(text).label
+
+    def test_emotes_are_case_sensitive(self):
+        self.assertEqual(self.label("PogChamp"), "positive")
+        self.assertEqual(self.label("ResidentSleeper"), "negative")
+        self.assertEqual(self.analyzer.score("pogchamp").hits, 0)
+
+    def test_slang_negation_and_but(self):
+        self.assertEqual(self.label("that play was goated"), "positive")
+        self.assertEqual(self.label("this is mid"), "negative")
+        self.assertEqual(self.label("not bad at all"), "positive")
+        self.assertEqual(self.label("i dont like this"), "negative")
+        self.assertEqual(self.label("the game is good but the lag is terrible"), "negative")
+
+    def test_emphasis_raises_intensity(self):
+        plain = self.analyzer.score("this is good").compound
+        self.assertGreater(self.analyzer.score("this is GOOD").compound, plain)
+        self.assertGreater(self.analyzer.score("this is good!!").compound, plain)
+        self.assertGreater(self.analyzer.score("this is really good").compound, plain)
+        self.assertEqual(self.label("loooove it"), "positive")
+
+    def test_unknown_text_has_no_confidence(self):
+        result = self.analyzer.score("what time does the stream start")
+        self.assertEqual(result.label, "neutral")
+        self.assertEqual(result.confidence, 0.0)
+        self.assertGreater(self.analyzer.score("PogChamp PogChamp that was insane").confidence, 0.9)
+
+    def test_extra_lexicon(self):
+        analyzer = SentimentAnalyzer(extra_emotes={"myChannelHype": 3.0})
+        self.assertEqual(analyzer.score("myChannelHype").label, "positive")
+
+class TestSentimentRouting(unittest.TestCase):
+    def setUp(self):
+        config = {
+            "bot_username": "bot",
+            "bot_token": "token",
+            "channels": ["test"],
+            "gemini_api_key": "key",
+            "personality": "friendly",
+            "auto_chat_freq": 0.2,
+            "sentiment_analysis_probability": 0,
+            "work_queue": {"workers": 0},
+            "ai_executor": {"max_concurrency": 0},
+            "chat_log": {"enabled": False}
+        }
+        with patch('bot.TwitchEventSub'), \
+             patch('bot.create_tables'), \
+             patch('bot.IRCBot.auto_chat'), \
+             patch('bot.IRCBot.conversation_starter_task'):
+            self.bot = bot.IRCBot(config)
+        self.bot.sentiment_batcher.stop()
+        self.bot.sentiment_batcher.add = MagicMock()
+
+    def message(self, text):
+        msg = MagicMock()
+        msg.user = "viewer"
+        msg.text = text
+        return msg
+
+    @patch('bot.create_or_update_user')
+    def test_confident_messages_apply_locally(self, mock_update):
+        self.bot.handle_sentiment(self.message("PogChamp that was insane"))
+        mock_update.assert_called_once_with("viewer", favouritism_score_increment=1)
+        self.bot.sentiment_batcher.add.assert_not_called()
+        self.assertEqual(self.bot.sentiment_stats["applied_locally"], 1)
+
+    @patch('bot.create_or_update_user')
+    def test_lukewarm_messages_leave_favouritism_alone(self, mock_update):
+        self.bot.handle_sentiment(self.message("nice"))  # positive, confidence ~0.63
+        mock_update.assert_not_called()
+        self.bot.sentiment_batcher.add.assert_not_called()
+        self.bot.config["sentiment"] = {"apply_above": 0.5}
+        self.bot.handle_sentiment(self.message("nice"))
+        mock_update.assert_called_once_with("viewer", favouritism_score_increment=1)
+
+    @patch('bot.create_or_update_user')
+    def test_counters_are_safe_across_workers(self, mock_update):
+        threads = [threading.Thread(target=lambda: [self.bot.handle_sentiment(self.message("hi chat")) for _ in range(500)])
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.bot.sentiment_stats["scored"], 2000)
+
+    @patch('bot.create_or_update_user')
+    def test_low_confidence_is_escalated(self, mock_update):
+        self.bot.handle_sentiment(self.message("honestly the new patch changed how the boss works"))
+        mock_update.assert_not_called()
+        self.bot.sentiment_batcher.add.assert_called_once_with(("viewer", "honestly the new patch changed how the boss works"))
+        # Short neutral chatter is not worth a model call.
+        self.bot.handle_sentiment(self.message("hi chat"))
+        self.assertEqual(self.bot.sentiment_batcher.add.call_count, 1)
+        self.assertEqual(self.bot.sentiment_stats["scored"], 2)
+
+    @patch('bot.create_or_update_user')
+    def test_sampled_messages_go_to_the_model_for_topics(self, mock_update):
+        self.bot.config["sentiment_analysis_probability"] = 1
+        self.bot.handle_sentiment(self.message("PogChamp that was insane"))
+        mock_update.assert_not_called()
+        self.assertEqual(self.bot.sentiment_stats["escalated_topics"], 1)
+
+    def test_shutdown_classifies_partial_batches_inline(self):
+        del self.bot.sentiment_batcher.add  # back to the real method
+        self.bot.sentiment_batcher.add(("viewer", "what a weird fight"))
+        self.bot.fact_pipeline.batcher.add(("viewer", "I live in Oslo"))
+        self.bot.classify_sentiment_batch = MagicMock()
+        self.bot.fact_pipeline.process = MagicMock()
+        self.bot.flush_batches()
+        self.bot.classify_sentiment_batch.assert_called_once_with([("viewer", "what a weird fight")])
+        self.bot.fact_pipeline.process.assert_called_once_with([("viewer", "I live in Oslo")])
+        self.assertEqual(self.bot.ai.queue.depth(), 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import ai_client
+import http_client
+from model_client import ModelClient
+from outbound import SentenceChunker
+
+def _event(text):
+    return "data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}) + "\r\n\r\n"
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """Fake streamGenerateContent: sends events as chunked SSE, pausing after each one."""
+    protocol_version = "HTTP/1.1"
+    events = []
+    pause = 0.0
+    sent = 0
+    requests = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        _StreamHandler.requests.append((self.path, json.loads(self.rfile.read(length))))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, text in enumerate(self.events):
+                data = _event(text).encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+                _StreamHandler.sent = i + 1
+                time.sleep(self.pause)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+class TestSentenceChunker(unittest.TestCase):
+    def test_first_sentence_released_early_then_batched(self):
+        chunker = SentenceChunker(first_min=10, min_chars=40, max_chars=60)
+        ready = []
+        for delta in ["Hello the", "re friend! How", " are you doing today? I am", " fine. Thanks for asking me. "]:
+            ready.extend(chunker.feed(delta))
+        self.assertEqual(ready, ["Hello there friend!", "How are you doing today? I am fine. Thanks for asking me."])
+        self.assertEqual(chunker.feed("Bye now."), [])
+        self.assertEqual(chunker.finish(), ["Bye now."])
+
+    def test_long_text_without_breaks_is_cut_at_a_space(self):
+        chunker = SentenceChunker(first_min=10, min_chars=40, max_chars=20)
+        ready = chunker.feed("word " * 10)
+        self.assertTrue(all(len(chunk) <= 20 for chunk in ready))
+        self.assertEqual(" ".join(ready + chunker.finish()), ("word " * 10).strip())
+
+class TestStreamAIResponse(unittest.TestCase):
+    def setUp(self):
+        _StreamHandler.events = []
+        _StreamHandler.pause = 0.0
+        _StreamHandler.sent = 0
+        _StreamHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_address[1]}/models"
+        self.patches = [
+            patch("ai_client.API_BASE", base),
+            patch("ai_client.get_user", return_value={"favouritism_score": 0}),
+            patch("ai_client.get_user_facts", return_value=[]),
+            patch("ai_client.http_client.CLIENT", http_client.HTTPClient(timeout=5)),
+        ]
+        for p in self.patches:
+            p.start()
+        self.config = {"gemini_api_key": "fake", "personality": "friendly", "max_response_length": 450}
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_first_delta_arrives_before_generation_finishes(self):
+        _StreamHandler.events = ["Quick answer first. ", "Then the slow part."]
+        _StreamHandler.pause = 0.5
+        started = time.monotonic()
+        stream = ai_client.stream_ai_response("q", "user", self.config)
+        first = next(stream)
+        first_at = time.monotonic() - started
+        rest = list(stream)
+
+        self.assertEqual(first, "Quick answer first. ")
+        self.assertLess(first_at, 0.4)
+        self.assertEqual(rest, ["Then the slow part."])
+        path, body = _StreamHandler.requests[0]
+        self.assertIn("/gemini-2.0-flash:streamGenerateContent?", path)
+        self.assertIn("alt=sse", path)
+        self.assertIn("maxOutputTokens", body["generationConfig"])
+
+    def test_cutoff_stops_reading_at_response_length(self):
+        self.config["max_response_length"] = 60
+        _StreamHandler.events = ["This sentence is short. ", "This one pushes past the limit. ", "Never read."] + ["x"] * 20
+        _StreamHandler.pause = 0.05
+        text = "".join(ai_client.stream_ai_response("q", "user", self.config)).strip()
+
+        self.assertEqual(text, "This sentence is short. This one pushes past the limit.")
+        self.assertLess(_StreamHandler.sent, len(_StreamHandler.events))
+        self.assertGreaterEqual(ai_client.stream_stats()["cutoffs"], 1)
+
+    def test_unreachable_api_yields_nothing(self):
+        client = ModelClient(max_retries=0)
+        with patch("ai_client.API_BASE", "http://127.0.0.1:9/models"), patch("ai_client.MODEL_CLIENT", client):
+            self.assertEqual(list(ai_client.stream_ai_response("q", "user", self.config)), [])
+        self.assertEqual(client.stats()["breaker"]["consecutive_failures"], 2)
+
+    def test_failed_stream_falls_back_to_plain_request(self):
+        client = ModelClient(max_retries=0)
+        reply = {"candidates": [{"content": {"parts": [{"text": "Plain answer."}]}}]}
+        with patch("ai_client.http_client.stream_lines", side_effect=ConnectionError("reset")), \
+             patch("ai_client.MODEL_CLIENT", client), \
+             patch("http_client.post") as mock_post:
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.json.return_value = reply
+            self.assertEqual(list(ai_client.stream_ai_response("q", "user", self.config)), ["Plain answer."])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import bot
+from workqueue import (PriorityWorkQueue, ShardedWorkQueue, PRIORITY_MODERATION, PRIORITY_COMMAND,
+                       PRIORITY_MENTION, PRIORITY_ANALYTICS)
+
+class TestPriorityWorkQueue(unittest.TestCase):
+    def test_runs_in_priority_then_arrival_order(self):
+        queue = PriorityWorkQueue(max_depth=10, workers=0)
+        ran = []
+        queue.put(PRIORITY_ANALYTICS, ran.append, "sentiment")
+        queue.put(PRIORITY_MENTION, ran.append, "mention")
+        queue.put(PRIORITY_COMMAND, ran.append, "cmd1")
+        queue.put(PRIORITY_COMMAND, ran.append, "cmd2")
+        queue.put(PRIORITY_MODERATION, ran.append, "mod")
+        queue.drain()
+        self.assertEqual(ran, ["mod", "cmd1", "cmd2", "mention", "sentiment"])
+        self.assertEqual(queue.stats()["processed"], 5)
+
+    def test_sheds_lowest_priority_first(self):
+        queue = PriorityWorkQueue(max_depth=3, workers=0)
+        ran = []
+        queue.put(PRIORITY_ANALYTICS, ran.append, "old-sentiment")
+        queue.put(PRIORITY_ANALYTICS, ran.append, "new-sentiment")
+        queue.put(PRIORITY_MENTION, ran.append, "mention")
+        self.assertTrue(queue.put(PRIORITY_MODERATION, ran.append, "mod"))
+        # A full queue of more important work rejects the newcomer.
+        queue.put(PRIORITY_COMMAND, ran.append, "cmd")
+        self.assertFalse(queue.put(PRIORITY_ANALYTICS, ran.append, "late-sentiment"))
+        queue.drain()
+        self.assertEqual(ran, ["mod", "cmd", "mention"])
+        self.assertEqual(queue.stats()["dropped"], {"analytics": 3})
+
+    def test_lag_metrics(self):
+        queue = PriorityWorkQueue(max_depth=5, workers=0)
+        queue.put(PRIORITY_COMMAND, lambda: None)
+        stats = queue.stats()
+        self.assertEqual(stats["depth"], 1)
+        self.assertEqual(stats["queued"], {"command": 1})
+        queue.drain()
+        stats = queue.stats()
+        self.assertEqual(stats["depth"], 0)
+        self.assertGreaterEqual(stats["lag_ms"]["max"], 0)
+
+class TestShardedWorkQueue(unittest.TestCase):
+    def test_a_channel_is_handled_in_order_one_at_a_time(self):
+        queue = ShardedWorkQueue(max_depth=100, workers=4)
+        seen = {"a": [], "b": []}
+        running = {"a": 0, "b": 0}
+        overlaps = []
+
+        def handle(channel, i):
+            running[channel] += 1
+            overlaps.append(running[channel] > 1)
+            time.sleep(0.001)
+            seen[channel].append(i)
+            running[channel] -= 1
+
+        queue.start()
+        try:
+            for i in range(50):
+                queue.put("a", PRIORITY_ANALYTICS, handle, "a", i)
+                queue.put("b", PRIORITY_ANALYTICS, handle, "b", i)
+            deadline = time.monotonic() + 5
+            while queue.stats()["processed"] < 100 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            queue.stop()
+        self.assertEqual(seen, {"a": list(range(50)), "b": list(range(50))})
+        self.assertFalse(any(overlaps))
+
+    def test_each_shard_holds_the_full_depth(self):
+        queue = ShardedWorkQueue(max_depth=3, workers=4)
+        self.assertTrue(all(queue.put("a", PRIORITY_COMMAND, lambda: None) for _ in range(3)))
+        self.assertFalse(queue.put("a", PRIORITY_ANALYTICS, lambda: None))
+
+    def test_stats_add_up_across_shards(self):
+        queue = ShardedWorkQueue(max_depth=8, workers=2)
+        for channel in ("a", "b", "c", "d"):
+            queue.put(channel, PRIORITY_COMMAND, lambda: None)
+        stats = queue.stats()
+        self.assertEqual((stats["depth"], stats["max_depth"], stats["shards"]), (4, 16, 2))
+        self.assertEqual(stats["queued"], {"command": 4})
+        queue.drain()
+        self.assertEqual(queue.stats()["processed"], 4)
+
+class TestIngestRouting(unittest.TestCase):
+    def setUp(self):
+        config = {
+            "bot_username": "bot",
+            "bot_token": "token",
+            "channels": ["test"],
+            "gemini_api_key": "key",
+            "personality": "friendly",
+            "auto_chat_freq": 0.2,
+            "sentiment_analysis_probability": 0,
+            "moderation": {"banned_words": ["badword"], "link_filtering": True, "caps_filtering": True},
+            "work_queue": {"max_depth": 50, "workers": 0},
+            "chat_log": {"enabled": False}
+        }
+        with patch('bot.TwitchEventSub'), \
+             patch('bot.create_tables'), \
+             patch('bot.IRCBot.auto_chat'), \
+             patch('bot.IRCBot.conversation_starter_task'):
+            self.bot = bot.IRCBot(config)
+        self.bot.work_queue.put = MagicMock()
+
+    def routed(self, text):
+        self.bot.ingest_line(f"@badges=;emotes=25:0-4 :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #test :{text}")
+        channel, priority = self.bot.work_queue.put.call_args[0][:2]
+        self.assertEqual(channel, "test")
+        return priority
+
+    def test_priorities(self):
+        self.assertEqual(self.routed("this has a badword in it"), PRIORITY_MODERATION)
+        self.assertEqual(self.routed("!ai hello"), PRIORITY_COMMAND)
+        self.assertEqual(self.routed("hey BOT how are you"), PRIORITY_MENTION)
+        # Plain chat is shed first, unless a game is running and it may be an answer.
+        self.assertEqual(self.routed("42"), PRIORITY_ANALYTICS)
+        self.bot.game_manager.start_game("guess", "test", "viewer")
+        self.assertEqual(self.routed("42"), PRIORITY_COMMAND)
+
+    def test_ping_is_left_to_the_transport(self):
+        self.assertEqual(self.bot.route_message(bot.parse_message("PING :tmi.twitch.tv")), [])
+
+    def test_ingest_does_not_run_handlers(self):
+        self.bot.handle_privmsg = MagicMock()
+        self.routed("!ai hello")
+        self.bot.handle_privmsg.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
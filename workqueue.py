@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+PRIORITY_MODERATION = 1
+PRIORITY_COMMAND = 2
+PRIORITY_MENTION = 3
+PRIORITY_ANALYTICS = 4
+
+PRIORITY_NAMES = {
+    PRIORITY_MODERATION: "moderation",
+    PRIORITY_COMMAND: "command",
+    PRIORITY_MENTION: "mention",
+    PRIORITY_ANALYTICS: "analytics",
+}
+
+class PriorityWorkQueue:
+    """Bounded priority queue drained by a small pool of worker threads.
+
+    Lower priority numbers run first; equal priorities run in arrival order.
+    When the queue is full, the oldest item of the least important class is
+    shed to make room, unless the incoming item is itself less important, in
+    which case it is the one dropped.
+    """
+
+    def __init__(self, max_depth=500, workers=4, name="work", names=PRIORITY_NAMES):
+        self.max_depth = max_depth
+        self.workers = workers
+        self.name = name
+        self.names = names
+        self.heap = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.running = False
+        self.threads = []
+        self.processed = 0
+        self.dropped = {}
+        self.lag_last = 0.0
+        self.lag_avg = 0.0
+        self.lag_max = 0.0
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def put(self, priority, fn, *args, **kwargs):
+        """Enqueue fn(*args, **kwargs). Returns False if the item was shed instead."""
+        entry = (priority, next(self.counter), time.monotonic(), fn, args, kwargs)
+        with self.cond:
+            if len(self.heap) >= self.max_depth:
+                victim = min(self.heap, key=lambda e: (-e[0], e[1]))
+                if victim[0] < priority:
+                    self._count_drop(priority)
+                    return False
+                self.heap.remove(victim)
+                heapq.heapify(self.heap)
+                self._count_drop(victim[0])
+            heapq.heappush(self.heap, entry)
+            self.cond.notify()
+        return True
+
+    def drain(self):
+        """Run everything currently queued on the calling thread, in priority order."""
+        while True:
+            with self.cond:
+                if not self.heap:
+                    return
+                entry = heapq.heappop(self.heap)
+            self._run(entry)
+
+    def depth(self):
+        with self.cond:
+            return len(self.heap)
+
+    def stats(self):
+        with self.cond:
+            depth = len(self.heap)
+            by_priority = {}
+            for entry in self.heap:
+                name = self.names.get(entry[0], str(entry[0]))
+                by_priority[name] = by_priority.get(name, 0) + 1
+            oldest = min((e[2] for e in self.heap), default=None)
+        return {
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "queued": by_priority,
+            "processed": self.processed,
+            "dropped": dict(self.dropped),
+            "lag_ms": {
+                "last": round(self.lag_last * 1000, 1),
+                "avg": round(self.lag_avg * 1000, 1),
+                "max": round(self.lag_max * 1000, 1),
+                "oldest": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0,
+            },
+        }
+
+    def _count_drop(self, priority):
+        name = self.names.get(priority, str(priority))
+        self.dropped[name] = self.dropped.get(name, 0) + 1
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while self.running and not self.heap:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                entry = heapq.heappop(self.heap)
+            self._run(entry)
+
+    def _run(self, entry):
+        priority, _, enqueued_at, fn, args, kwargs = entry
+        lag = time.monotonic() - enqueued_at
+        self.lag_last = lag
+        self.lag_avg = lag if not self.processed else self.lag_avg * 0.9 + lag * 0.1
+        self.lag_max = max(self.lag_max, lag)
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"[ERROR] {self.name} task {getattr(fn, '__name__', fn)} failed: {e}")
+            traceback.print_exc()
+        finally:
+            self.processed += 1
+
+class ShardedWorkQueue:
+    """PriorityWorkQueue split into single-worker shards keyed by channel.
+
+    Each key always lands on the same shard, so one channel's messages are
+    handled one at a time in priority-then-arrival order, while different
+    channels still run in parallel. max_depth bounds each shard, so a single
+    busy channel keeps the whole backlog. With workers=0 nothing runs until
+    drain().
+    """
+
+    def __init__(self, max_depth=500, workers=4, name="work", names=PRIORITY_NAMES):
+        count = max(workers, 1)
+        self.shards = [
+            PriorityWorkQueue(max_depth=max_depth, workers=1 if workers else 0, name=f"{name}-{i}", names=names)
+            for i in range(count)
+        ]
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    def stop(self):
+        for shard in self.shards:
+            shard.stop()
+
+    def shard_for(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def put(self, key, priority, fn, *args, **kwargs):
+        """Enqueue fn(*args, **kwargs) on key's shard. Returns False if the item was shed instead."""
+        return self.shard_for(key).put(priority, fn, *args, **kwargs)
+
+    def drain(self):
+        for shard in self.shards:
+            shard.drain()
+
+    def depth(self):
+        return sum(shard.depth() for shard in self.shards)
+
+    def stats(self):
+        shards = [shard.stats() for shard in self.shards]
+        queued, dropped = {}, {}
+        for stats in shards:
+            for name, count in stats["queued"].items():
+                queued[name] = queued.get(name, 0) + count
+            for name, count in stats["dropped"].items():
+                dropped[name] = dropped.get(name, 0) + count
+        lags = [stats["lag_ms"] for stats in shards]
+        return {
+            "depth": sum(stats["depth"] for stats in shards),
+            "max_depth": sum(stats["max_depth"] for stats in shards),
+            "shards": len(shards),
+            "queued": queued,
+            "processed": sum(stats["processed"] for stats in shards),
+            "dropped": dropped,
+            "lag_ms": {
+                "last": max(lag["last"] for lag in lags),
+                "avg": round(sum(lag["avg"] for lag in lags) / len(lags), 1),
+                "max": max(lag["max"] for lag in lags),
+                "oldest": max(lag["oldest"] for lag in lags),
+            },
+        }